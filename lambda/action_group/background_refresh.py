@@ -0,0 +1,42 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class BackgroundRefresher(ABC):
+    """
+    Base class of caches loaded from the database: once the TTL has expired, refresh() runs
+    in a background thread while callers keep reading the previous data.
+    """
+
+    name = "cache"
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.refreshed_at = None
+        self._refreshing = threading.Lock()
+
+    @abstractmethod
+    def refresh(self) -> None:
+        """Load the data, replacing the previous data once it is complete"""
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Failed to refresh {self.name}: {str(e)}")
+        finally:
+            # On failure too, so that a broken query is retried after the TTL, not on every request
+            self.refreshed_at = time.time()
+            self._refreshing.release()
+
+    def start_refresh(self) -> bool:
+        """Refresh in a background thread unless a refresh is already running"""
+        if not self._refreshing.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return True
+
+    def refresh_if_stale(self) -> None:
+        if self.refreshed_at is None or time.time() - self.refreshed_at >= self.ttl_seconds:
+            self.start_refresh()
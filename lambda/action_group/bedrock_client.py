@@ -0,0 +1,250 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from metrics import emit_metrics
+
+# Error codes that mean "try again later" rather than "the request is wrong"
+RETRYABLE_ERROR_CODES = (
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+)
+
+
+class BedrockThrottledError(Exception):
+    """Raised when every configured model is throttled or has an open circuit breaker"""
+
+
+class TokenBucket:
+    """Client-side rate limiter sized to the account quota of the model invocations"""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second
+        )
+        self.updated_at = now
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, waiting at most timeout seconds. Returns False on timeout."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate_per_second
+            if waited + wait > timeout:
+                return False
+            self.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive throttled calls and rejects calls until
+    reset_timeout has passed. Then one trial call is let through (half-open).
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # Let a single trial call through and re-arm the timeout for the others
+                self.opened_at = self.clock()
+                return True
+            return state == "closed"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class ResilientBedrockClient:
+    """
+    Wraps a bedrock-runtime client with a token bucket, exponential backoff with full jitter
+    and a circuit breaker per model. When a model stays throttled, the call fails over to the
+    next model id or inference profile in model_ids. Exposes invoke_model like the wrapped client.
+    """
+
+    def __init__(
+        self,
+        client,
+        model_ids: List[str],
+        token_bucket: Optional[TokenBucket] = None,
+        max_retries: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        breaker_threshold: int = 5,
+        breaker_reset_timeout: float = 30.0,
+        acquire_timeout: float = 5.0,
+        sleep: Callable[[float], None] = time.sleep,
+        jitter: Callable[[float, float], float] = random.uniform,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.model_ids = list(model_ids)
+        self.token_bucket = token_bucket
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self.sleep = sleep
+        self.jitter = jitter
+        self.breakers = {
+            model_id: CircuitBreaker(breaker_threshold, breaker_reset_timeout, clock)
+            for model_id in self.model_ids
+        }
+        self._breaker_settings = (breaker_threshold, breaker_reset_timeout, clock)
+        self.counters = {
+            "invocations": 0,
+            "retries": 0,
+            "throttles": 0,
+            "failovers": 0,
+            "rate_limited": 0,
+            "circuit_open_skips": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def _candidates(self, model_id: Optional[str]) -> List[str]:
+        """Requested model first, then the remaining failover models in configured order"""
+        if not model_id:
+            return list(self.model_ids)
+        if model_id not in self.breakers:
+            self.breakers[model_id] = CircuitBreaker(*self._breaker_settings)
+        return [model_id] + [m for m in self.model_ids if m != model_id]
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: a random delay between 0 and the capped exponential backoff"""
+        return self.jitter(0, min(self.max_delay, self.base_delay * (2**attempt)))
+
+    def invoke_model(self, body: str, modelId: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        self._count("invocations")
+        candidates = self._candidates(modelId)
+
+        for index, candidate in enumerate(candidates):
+            breaker = self.breakers[candidate]
+            if not breaker.allow_request():
+                print(f"Circuit open for {candidate}, skipping")
+                self._count("circuit_open_skips")
+                continue
+
+            if index > 0:
+                print(f"Failing over to {candidate}")
+                self._count("failovers")
+
+            for attempt in range(self.max_retries + 1):
+                if self.token_bucket and not self.token_bucket.acquire(self.acquire_timeout):
+                    self._count("rate_limited")
+                    raise BedrockThrottledError(
+                        "Client-side Bedrock rate limit exceeded, try again later"
+                    )
+                try:
+                    response = self.client.invoke_model(body=body, modelId=candidate, **kwargs)
+                    breaker.record_success()
+                    return response
+                except ClientError as e:
+                    if e.response["Error"]["Code"] not in RETRYABLE_ERROR_CODES:
+                        raise
+                    self._count("throttles")
+                    breaker.record_failure()
+                    if attempt == self.max_retries or not breaker.allow_request():
+                        break
+                    self._count("retries")
+                    self.sleep(self._backoff(attempt))
+
+        raise BedrockThrottledError(
+            f"All Bedrock models are throttled or unavailable: {', '.join(candidates)}"
+        )
+
+    def emit_counters(self) -> None:
+        """Publish the counters accumulated since the last call and reset them"""
+        with self._lock:
+            counters = dict(self.counters)
+            for name in self.counters:
+                self.counters[name] = 0
+        emit_metrics(counters, {"Component": "BedrockClient"})
+
+
+def create_bedrock_client(client, default_model_id: str):
+    """
+    Wrap the bedrock-runtime client as configured by the BEDROCK_* environment variables.
+    BEDROCK_MODEL_IDS is a comma separated failover list of model ids or inference profiles.
+    """
+    model_ids = [
+        m.strip()
+        for m in os.environ.get("BEDROCK_MODEL_IDS", default_model_id).split(",")
+        if m.strip()
+    ]
+    if default_model_id not in model_ids:
+        model_ids.insert(0, default_model_id)
+
+    token_bucket = None
+    rate = os.environ.get("BEDROCK_REQUESTS_PER_SECOND")
+    if rate:
+        token_bucket = TokenBucket(
+            float(rate), float(os.environ.get("BEDROCK_BURST", max(1.0, float(rate))))
+        )
+
+    return ResilientBedrockClient(
+        client,
+        model_ids,
+        token_bucket=token_bucket,
+        max_retries=int(os.environ.get("BEDROCK_MAX_RETRIES", 3)),
+        breaker_threshold=int(os.environ.get("BEDROCK_BREAKER_THRESHOLD", 5)),
+        breaker_reset_timeout=float(os.environ.get("BEDROCK_BREAKER_RESET_SECONDS", 30)),
+    )
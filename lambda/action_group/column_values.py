@@ -0,0 +1,185 @@
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from background_refresh import BackgroundRefresher
+from metrics import emit_metrics
+from schema_model import PRIMARY_KEY, UNIQUE, SchemaSource, as_compact_schema, table_key
+
+TEXT_TYPES = {"character varying", "character", "text", "USER-DEFINED"}
+
+# Estimated distinct values per column: a negative n_distinct is a fraction of the row count.
+# most_common_vals is returned as JSON text so that the values survive the Data API unchanged.
+COLUMN_STATS_QUERY = """
+SELECT
+    s.schemaname AS table_schema,
+    s.tablename AS table_name,
+    s.attname AS column_name,
+    CASE WHEN s.n_distinct < 0 THEN -s.n_distinct * GREATEST(c.reltuples, 0) ELSE s.n_distinct END AS distinct_estimate,
+    array_to_json(s.most_common_vals::text::text[])::text AS most_common_values
+FROM pg_stats s
+JOIN pg_namespace n ON n.nspname = s.schemaname
+JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+WHERE s.schemaname NOT IN ('pg_catalog', 'information_schema')
+ORDER BY distinct_estimate
+"""
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def qualified_name(key: str) -> str:
+    return ".".join(quote_identifier(part) for part in key.split("."))
+
+
+class ColumnValueDictionary(BackgroundRefresher):
+    """
+    Stored values of low-cardinality text columns, used to ground the literals of generated
+    SQL. Candidate columns are picked from pg_stats.n_distinct. Values come from the
+    most-common-values statistics when they cover the column, otherwise from a bounded number
+    of GROUP BY queries per refresh. Columns passed as columns, e.g. the slots of intent
+    templates, are always loaded, and dropped when they have more than max_values values.
+    Refreshes run in a background thread once the TTL expires, while the previous
+    dictionaries keep being served.
+    """
+
+    name = "value dictionaries"
+
+    def __init__(
+        self,
+        fetch: Callable[[str], List[Dict[str, Any]]],
+        schema: SchemaSource,
+        ttl_seconds: int = 3600,
+        max_distinct: int = 50,
+        max_values: int = 20,
+        max_columns: int = 100,
+        max_queries: int = 10,
+        max_value_length: int = 60,
+        columns: Iterable[Tuple[str, str]] = (),
+    ):
+        super().__init__(ttl_seconds)
+        self.fetch = fetch
+        self.max_distinct = max_distinct
+        self.max_values = max_values
+        self.max_columns = max_columns
+        self.max_queries = max_queries
+        self.max_value_length = max_value_length
+        self.required_columns = set(columns)
+        self.values = {}
+        self.set_schema(schema)
+
+    def set_schema(self, schema: SchemaSource) -> None:
+        """Pick the text and unique columns of the schema, e.g. after a schema change"""
+        self.text_columns = set()
+        self.unique_columns = set()
+        for table in as_compact_schema(schema):
+            for column in table.columns():
+                key = (table.key, column.name)
+                if column.data_type in TEXT_TYPES:
+                    self.text_columns.add(key)
+                if column.flags & (PRIMARY_KEY | UNIQUE):
+                    self.unique_columns.add(key)
+
+    def candidates(self, stats: List[Dict[str, Any]]) -> List[Tuple[Tuple[str, str], float, List[str]]]:
+        """Low-cardinality text columns as (column, distinct estimate, most common values)"""
+        candidates = []
+        for row in stats:
+            column = (table_key(row), row["column_name"])
+            distinct = float(row.get("distinct_estimate") or 0)
+            if (
+                column not in self.text_columns
+                or column in self.unique_columns
+                or not 0 < distinct <= self.max_distinct
+            ):
+                continue
+            common = row.get("most_common_values")
+            if isinstance(common, str):
+                common = json.loads(common)
+            candidates.append((column, distinct, common or []))
+        return candidates[: self.max_columns]
+
+    def load_values(self, column: Tuple[str, str], limit: Optional[int] = None) -> List[str]:
+        """The most frequent values of a column, at most limit, by default max_values"""
+        table, name = column
+        rows = self.fetch(
+            f"SELECT {quote_identifier(name)} AS value, COUNT(*) AS frequency "
+            f"FROM {qualified_name(table)} WHERE {quote_identifier(name)} IS NOT NULL "
+            f"GROUP BY 1 ORDER BY 2 DESC LIMIT {limit or self.max_values}"
+        )
+        return [str(row["value"]) for row in rows]
+
+    def refresh(self) -> None:
+        started = time.monotonic()
+        values = {}
+        queries = 0
+        stats = self.fetch(COLUMN_STATS_QUERY) if self.max_columns else []
+        for column, distinct, common in self.candidates(stats):
+            if column in self.required_columns:
+                continue
+            if len(common) >= distinct:
+                column_values = common
+            elif queries < self.max_queries:
+                queries += 1
+                column_values = self.load_values(column)
+            else:
+                continue
+            column_values = [v for v in column_values if len(v) <= self.max_value_length]
+            if column_values:
+                values[column] = column_values[: self.max_values]
+        for column in sorted(self.required_columns):
+            # One more value than kept tells complete dictionaries from truncated ones
+            queries += 1
+            column_values = self.load_values(column, self.max_values + 1)
+            if len(column_values) <= self.max_values:
+                values[column] = [v for v in column_values if len(v) <= self.max_value_length]
+
+        self.values = values
+        elapsed = time.monotonic() - started
+        print(f"Refreshed value dictionaries of {len(values)} columns with {queries} queries")
+        emit_metrics(
+            {"DictionaryColumns": len(values), "DictionaryQueries": queries, "DictionaryRefreshMs": elapsed * 1000},
+            {"Component": "ColumnValues"},
+            units={"DictionaryRefreshMs": "Milliseconds"},
+        )
+
+    def size_bytes(self) -> int:
+        """Estimated memory of the dictionaries and of the column sets"""
+        values = self.values
+        size = sys.getsizeof(values) + sum(sys.getsizeof(c) for c in (self.text_columns, self.unique_columns))
+        for column, column_values in values.items():
+            size += sys.getsizeof(column) + sys.getsizeof(column_values)
+            size += sum(sys.getsizeof(v) for v in column_values)
+        return size
+
+    def get(self) -> Dict[Tuple[str, str], List[str]]:
+        """Current dictionaries, triggering a background refresh when they are stale"""
+        self.refresh_if_stale()
+        return self.values
+
+
+def create_column_value_dictionary(
+    fetch: Callable[[str], List[Dict[str, Any]]],
+    schema: SchemaSource,
+    columns: Iterable[Tuple[str, str]] = (),
+) -> Optional[ColumnValueDictionary]:
+    """
+    Create the dictionaries configured by the COLUMN_VALUES_* environment variables, also
+    loading columns, e.g. the intent template slots
+    """
+    if os.environ.get("COLUMN_VALUES_ENABLED", "false").lower() != "true":
+        return None
+
+    dictionary = ColumnValueDictionary(
+        fetch,
+        schema,
+        ttl_seconds=int(os.environ.get("COLUMN_VALUES_TTL_SECONDS", 3600)),
+        max_distinct=int(os.environ.get("COLUMN_VALUES_MAX_DISTINCT", 50)),
+        max_values=int(os.environ.get("COLUMN_VALUES_MAX_VALUES", 20)),
+        max_queries=int(os.environ.get("COLUMN_VALUES_MAX_QUERIES", 10)),
+        columns=columns,
+    )
+    dictionary.start_refresh()
+    return dictionary
@@ -0,0 +1,231 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from metrics import emit_metrics
+
+# Session attribute naming the target database of a request, one of the routing table names
+DATABASE_ATTRIBUTE = "database"
+DEFAULT_DATABASE = "default"
+
+
+class UnknownDatabaseError(Exception):
+    """Raised when a request names a database that is not in the routing table"""
+
+
+@dataclass(frozen=True)
+class DatabaseTarget:
+    """A database reachable through the Data API with the read-only secret"""
+
+    name: str
+    cluster_arn: str
+    secret_arn: str
+    database: str
+    # Aurora reader endpoint serving /execute queries over a direct connection
+    reader_endpoint: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.cluster_arn}/{self.database}"
+
+    @property
+    def region(self) -> Optional[str]:
+        """Region of the cluster ARN, None for the region of the function"""
+        parts = self.cluster_arn.split(":")
+        return parts[3] if len(parts) > 3 and parts[3] else None
+
+
+class GeneratedQueryCache:
+    """LRU of SQL generated per normalized question, cleared when the schema changes"""
+
+    def __init__(self, max_entries: int = 0):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    def get(self, question: str) -> Optional[str]:
+        if not self.max_entries:
+            return None
+        key = self.normalize(question)
+        with self._lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, question: str, sql: str) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self.entries[self.normalize(question)] = sql
+            self.entries.move_to_end(self.normalize(question))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+
+class DatabaseContext:
+    """
+    Everything the action group keeps per database: the Data API client, the schema snapshot
+    and the components built from it. Components that are not enabled stay None.
+    """
+
+    def __init__(self, target: DatabaseTarget, rds_data, generated_cache_size: int = 0):
+        self.target = target
+        self.rds_data = rds_data
+        self.schema = None
+        self.schema_index = None
+        self.schema_watcher = None
+        self.self_corrector = None
+        self.intents = None
+        self.column_values = None
+        self.table_stats = None
+        self.few_shot = None
+        self.reader = None
+        self.generated = GeneratedQueryCache(generated_cache_size)
+
+    def size_bytes(self) -> int:
+        """
+        Estimated memory of the schema snapshot, the generated queries and the enabled caches:
+        few-shot pairs, column values, table statistics and the values of intent slots
+        """
+        size = sum(sys.getsizeof(q) + sys.getsizeof(s) for q, s in self.generated.entries.items())
+        caches = [self.schema, self.few_shot, self.column_values, self.table_stats]
+        if self.intents is not None and self.intents.column_values is not self.column_values:
+            caches.append(self.intents.column_values)
+        return size + sum(cache.size_bytes() for cache in caches if cache is not None)
+
+
+class DatabaseRouter:
+    """Resolves the target database of a request from its session attributes"""
+
+    def __init__(self, default: DatabaseTarget, routes: Optional[Dict[str, DatabaseTarget]] = None):
+        self.default = default
+        self.routes = routes or {}
+
+    def resolve(self, event: Dict[str, Any]) -> DatabaseTarget:
+        name = (event.get("sessionAttributes") or {}).get(DATABASE_ATTRIBUTE) or (
+            event.get("promptSessionAttributes") or {}
+        ).get(DATABASE_ATTRIBUTE)
+        if not name or name == self.default.name:
+            return self.default
+        if name not in self.routes:
+            raise UnknownDatabaseError(name)
+        return self.routes[name]
+
+
+class DatabaseCache:
+    """
+    LRU of loaded database contexts, bounded by count and by the estimated size of their
+    schema snapshots. The least recently used contexts are evicted first, the one in use
+    never is. Hits, misses and evictions are published as metrics.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[DatabaseTarget], DatabaseContext],
+        max_entries: int = 8,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.load = load
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, target: DatabaseTarget) -> DatabaseContext:
+        with self._lock:
+            context = self.entries.get(target.key)
+            if context is not None:
+                self.entries.move_to_end(target.key)
+                self._emit({"DatabaseCacheHits": 1})
+                return context
+
+        print(f"Loading database {target.name} ({target.key})")
+        context = self.load(target)
+        with self._lock:
+            self.entries[target.key] = context
+            # Caches filled in the background have grown since their contexts were loaded
+            for key, cached in self.entries.items():
+                self.sizes[key] = cached.size_bytes()
+            evicted = self._evict(keep=target.key)
+            self._emit({"DatabaseCacheMisses": 1, "DatabaseCacheEvictions": evicted})
+        return context
+
+    def resized(self, context: DatabaseContext) -> None:
+        """Update the size of a context, e.g. after its schema was refreshed"""
+        with self._lock:
+            if context.target.key in self.entries:
+                self.sizes[context.target.key] = context.size_bytes()
+                self._evict(keep=context.target.key)
+
+    def total_bytes(self) -> int:
+        return sum(self.sizes.values())
+
+    def _evict(self, keep: str) -> int:
+        evicted = 0
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_entries or self.total_bytes() > self.max_bytes
+        ):
+            key = next(k for k in self.entries if k != keep)
+            self.entries.pop(key)
+            self.sizes.pop(key)
+            evicted += 1
+            print(f"Evicted database {key} from the cache")
+        return evicted
+
+    def _emit(self, metrics: Dict[str, int]) -> None:
+        emit_metrics(
+            {**metrics, "CachedDatabases": len(self.entries), "DatabaseCacheBytes": self.total_bytes()},
+            {"Component": "DatabaseCache"},
+            units={"DatabaseCacheBytes": "Bytes"},
+        )
+
+
+def create_database_router() -> DatabaseRouter:
+    """
+    The default database from CLUSTER_ARN, READONLY_SECRET_ARN, DB_NAME and READER_ENDPOINT,
+    and the routing table from DATABASE_ROUTES, e.g. {"analytics": {"database": "analytics"}}.
+    Routes default to the cluster, secret and reader endpoint of the default database.
+    """
+    default = DatabaseTarget(
+        DEFAULT_DATABASE,
+        os.environ["CLUSTER_ARN"],
+        os.environ["READONLY_SECRET_ARN"],
+        os.environ["DB_NAME"],
+        os.environ.get("READER_ENDPOINT") or None,
+    )
+    routes = {}
+    for name, route in json.loads(os.environ.get("DATABASE_ROUTES") or "{}").items():
+        routes[name] = DatabaseTarget(
+            name,
+            route.get("cluster_arn", default.cluster_arn),
+            route.get("secret_arn", default.secret_arn),
+            route.get("database", default.database),
+            route.get("reader_endpoint", default.reader_endpoint),
+        )
+    return DatabaseRouter(default, routes)
+
+
+def create_database_cache(load: Callable[[DatabaseTarget], DatabaseContext]) -> DatabaseCache:
+    return DatabaseCache(
+        load,
+        max_entries=int(os.environ.get("DATABASE_CACHE_MAX_ENTRIES", 8)),
+        max_bytes=int(os.environ.get("DATABASE_CACHE_MAX_MB", 256)) * 1024 * 1024,
+    )
+
+
+def generated_query_cache_size() -> int:
+    return int(os.environ.get("GENERATED_QUERY_CACHE_SIZE", 0))
@@ -0,0 +1,286 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from typing import List, Optional, Tuple
+
+from metrics import emit_metrics
+from schema_index import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, e.g. provided by a Lambda layer
+    np = None
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "by", "with", "at", "is",
+    "are", "was", "were", "be", "do", "doe", "me", "my", "we", "our", "you", "i", "it",
+    "what", "which", "who", "show", "list", "give", "find", "can", "all", "their", "there",
+}
+
+
+def question_features(question: str) -> List[str]:
+    """Word unigrams and bigrams of a question, without stopwords"""
+    words = [t for t in tokenize(question) if t not in STOPWORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return list(dict.fromkeys(features))
+
+
+class FewShotStore:
+    """
+    Bounded store of successfully executed (question, SQL) pairs with an inverted TF-IDF index.
+    Lookups score only the postings of the question's features, with NumPy when available.
+    The oldest pairs are evicted in batches once max_pairs is exceeded.
+    """
+
+    def __init__(self, max_pairs: int = 50000, max_df: float = 0.2):
+        self.max_pairs = max_pairs
+        self.max_df = max_df  # features in a larger share of the pairs are skipped at lookup
+        self.questions = []
+        self.sqls = []
+        self.base = 0  # id of questions[0], ids grow with every added pair
+        self.vocab = {}
+        self.postings = []  # feature id -> array of pair ids
+        self.inv_norms = array("f")  # 1 / sqrt(number of features) per pair
+        self.seen = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def size_bytes(self) -> int:
+        """Estimated memory of the pairs, the vocabulary and the postings"""
+        with self._lock:
+            return (
+                sum(sys.getsizeof(c) for c in (self.questions, self.sqls, self.vocab, self.postings, self.inv_norms, self.seen))
+                + sum(sys.getsizeof(s) for strings in (self.questions, self.sqls, self.vocab, self.seen) for s in strings)
+                + sum(sys.getsizeof(p) for p in self.postings)
+            )
+
+    def add(self, question: str, sql: str) -> bool:
+        """Add a pair, or update the SQL of a known question. Returns True for new pairs."""
+        key = " ".join(tokenize(question))
+        with self._lock:
+            if key in self.seen:
+                self.sqls[self.seen[key] - self.base] = sql
+                return False
+
+            pair_id = self.base + len(self.questions)
+            features = question_features(question)
+            for feature in features:
+                feature_id = self.vocab.get(feature)
+                if feature_id is None:
+                    feature_id = self.vocab[feature] = len(self.postings)
+                    self.postings.append(array("i"))
+                self.postings[feature_id].append(pair_id)
+            self.questions.append(question)
+            self.sqls.append(sql)
+            self.inv_norms.append(1 / math.sqrt(len(features) or 1))
+            self.seen[key] = pair_id
+
+            if len(self.questions) > self.max_pairs:
+                self._evict(max(1, self.max_pairs // 10) + len(self.questions) - self.max_pairs - 1)
+            return True
+
+    def _evict(self, count: int) -> None:
+        """Drop the count oldest pairs and compact the postings (amortized over the batch)"""
+        self.base += count
+        del self.questions[:count]
+        del self.sqls[:count]
+        del self.inv_norms[:count]
+        self.seen = {k: v for k, v in self.seen.items() if v >= self.base}
+        # Features of evicted pairs only are dropped and the feature ids renumbered, so that the
+        # vocabulary stays bounded by the stored pairs
+        vocab, postings = {}, []
+        for feature, feature_id in self.vocab.items():
+            kept = array("i", (i for i in self.postings[feature_id] if i >= self.base))
+            if kept:
+                vocab[feature] = len(postings)
+                postings.append(kept)
+        self.vocab = vocab
+        self.postings = postings
+
+    def lookup(self, question: str, k: int = 3, min_score: float = 0.2) -> List[Tuple[str, str, float]]:
+        """The k most similar stored pairs as (question, sql, cosine score), best first"""
+        with self._lock:
+            n = len(self.questions)
+            feature_ids = [self.vocab[f] for f in question_features(question) if f in self.vocab]
+            feature_ids = [f for f in feature_ids if len(self.postings[f])]
+            if not n or not feature_ids:
+                return []
+
+            idf = [math.log((n + 1) / (len(self.postings[f]) + 1)) + 1 for f in feature_ids]
+            query_norm = math.sqrt(sum(w * w for w in idf))
+
+            # Common features cost the most postings and barely change the ranking. They still
+            # count in the query norm, so the scores of the remaining matches stay comparable.
+            selective = [
+                (f, w) for f, w in zip(feature_ids, idf) if len(self.postings[f]) <= self.max_df * n
+            ]
+            if selective:
+                feature_ids, idf = [list(t) for t in zip(*selective)]
+
+            if np is not None:
+                ids = np.concatenate(
+                    [np.frombuffer(self.postings[f], dtype=np.int32) for f in feature_ids]
+                ) - self.base
+                weights = np.repeat(
+                    np.array(idf, dtype=np.float32), [len(self.postings[f]) for f in feature_ids]
+                )
+                scores = np.bincount(ids, weights=weights, minlength=n)
+                scores *= np.frombuffer(self.inv_norms, dtype=np.float32)
+                scores /= query_norm
+                top = np.argpartition(-scores, min(k, n) - 1)[:k]
+                ranked = sorted(((float(scores[i]), int(i)) for i in top), reverse=True)
+            else:
+                accumulated = {}
+                for f, w in zip(feature_ids, idf):
+                    for pair_id in self.postings[f]:
+                        accumulated[pair_id] = accumulated.get(pair_id, 0.0) + w
+                ranked = sorted(
+                    (
+                        (score * self.inv_norms[pair_id - self.base] / query_norm, pair_id - self.base)
+                        for pair_id, score in accumulated.items()
+                    ),
+                    reverse=True,
+                )[:k]
+
+            return [
+                (self.questions[i], self.sqls[i], score)
+                for score, i in ranked
+                if score > 0 and score >= min_score
+            ]
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(zip(self.questions, self.sqls))
+
+    def to_snapshot(self) -> bytes:
+        return json.dumps({"version": 1, "pairs": self.pairs()}).encode("utf-8")
+
+    def load_snapshot(self, data: bytes) -> int:
+        """Merge the pairs of a snapshot into the store, returns the number of new pairs"""
+        snapshot = json.loads(data.decode("utf-8"))
+        return sum(self.add(question, sql) for question, sql in snapshot["pairs"])
+
+
+class SnapshotSync:
+    """
+    Shares the store between execution environments through a snapshot object in S3:
+    merges the remote snapshot at most every sync_seconds and writes back after save_every
+    new pairs. Concurrent writers may drop each other's latest pairs, which only costs examples.
+    """
+
+    def __init__(self, store: FewShotStore, s3_client, bucket: str, key: str, sync_seconds: int = 300, save_every: int = 20):
+        self.store = store
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.sync_seconds = sync_seconds
+        self.save_every = save_every
+        self.etag = None
+        self.synced_at = 0.0
+        self.unsaved = 0
+
+    def maybe_load(self) -> None:
+        if time.time() - self.synced_at < self.sync_seconds:
+            return
+        self.synced_at = time.time()
+        try:
+            kwargs = {"IfNoneMatch": self.etag} if self.etag else {}
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.key, **kwargs)
+            self.etag = response["ETag"]
+            added = self.store.load_snapshot(response["Body"].read())
+            print(f"Loaded few-shot snapshot, {added} new pairs")
+        except Exception as e:
+            # NotModified, NoSuchKey or access errors: keep serving from memory
+            print(f"Few-shot snapshot not loaded: {str(e)}")
+
+    def pair_added(self) -> None:
+        self.unsaved += 1
+        if self.unsaved < self.save_every:
+            return
+        self.synced_at = 0.0
+        self.maybe_load()
+        try:
+            response = self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=self.store.to_snapshot())
+            self.etag = response.get("ETag")
+            self.unsaved = 0
+        except Exception as e:
+            print(f"Few-shot snapshot not saved: {str(e)}")
+
+
+class FewShotRetriever:
+    """Few-shot examples for /generate, learned from the successful /execute calls"""
+
+    def __init__(self, store: FewShotStore, k: int = 3, min_score: float = 0.2, sync: Optional[SnapshotSync] = None):
+        self.store = store
+        self.k = k
+        self.min_score = min_score
+        self.sync = sync
+
+    def examples(self, question: str) -> List[Tuple[str, str]]:
+        if self.sync:
+            self.sync.maybe_load()
+        started = time.perf_counter()
+        matches = self.store.lookup(question, self.k, self.min_score)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"Few-shot lookup: {len(matches)} matches out of {len(self.store)} pairs "
+            f"in {elapsed_ms:.3f} ms"
+        )
+        emit_metrics(
+            {"FewShotLookups": 1, "FewShotHits": int(bool(matches)), "FewShotLookupMs": elapsed_ms},
+            {"Component": "FewShot"},
+            units={"FewShotLookupMs": "Milliseconds"},
+        )
+        return [(q, sql) for q, sql, _ in matches]
+
+    def size_bytes(self) -> int:
+        return self.store.size_bytes()
+
+    def record_success(self, question: str, sql: str) -> None:
+        if self.store.add(question, sql) and self.sync:
+            self.sync.pair_added()
+
+
+def snapshot_key(database: Optional[str] = None) -> str:
+    """S3 key of the snapshot, e.g. few_shot/snapshot.json or few_shot/snapshot-analytics.json"""
+    key = os.environ.get("FEW_SHOT_SNAPSHOT_KEY", "few_shot/snapshot.json")
+    if not database:
+        return key
+    stem, dot, extension = key.rpartition(".")
+    return f"{stem}-{database}.{extension}" if dot else f"{key}-{database}"
+
+
+def create_few_shot_retriever(database: Optional[str] = None) -> Optional[FewShotRetriever]:
+    """
+    Create the retriever configured by the FEW_SHOT_* environment variables. Each routed
+    database gets its own store and snapshot key, the default database keeps the plain key.
+    """
+    if os.environ.get("FEW_SHOT_ENABLED", "false").lower() != "true":
+        return None
+
+    store = FewShotStore(int(os.environ.get("FEW_SHOT_MAX_PAIRS", 50000)))
+    sync = None
+    if os.environ.get("FEW_SHOT_SNAPSHOT_BUCKET"):
+        import boto3
+
+        sync = SnapshotSync(
+            store,
+            boto3.client("s3"),
+            os.environ["FEW_SHOT_SNAPSHOT_BUCKET"],
+            snapshot_key(database),
+            sync_seconds=int(os.environ.get("FEW_SHOT_SYNC_SECONDS", 300)),
+        )
+        sync.maybe_load()
+
+    return FewShotRetriever(
+        store,
+        k=int(os.environ.get("FEW_SHOT_K", 3)),
+        min_score=float(os.environ.get("FEW_SHOT_MIN_SCORE", 0.2)),
+        sync=sync,
+    )
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+from bedrock_client import BedrockThrottledError
+from metrics import emit_metrics
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies in seconds"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class HedgedInvoker:
+    """
+    Sends a second, hedge request when the first one has not returned within a delay derived
+    from a latency percentile, and returns the first valid result. The slower call is ignored.
+    Without a valid result, the first invalid one is returned as an unhedged call would, else
+    the error of the calls, a throttling error first. At most max_hedge_rate of the requests
+    are hedged to keep the extra cost bounded.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        default_delay: float = 2.0,
+        min_samples: int = 20,
+        max_hedge_rate: float = 0.1,
+        hedge_model_id: Optional[str] = None,
+        tracker: Optional[LatencyTracker] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+    ):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.hedge_model_id = hedge_model_id
+        self.tracker = tracker if tracker is not None else LatencyTracker()
+        self.executor = executor or ThreadPoolExecutor(max_workers=4)
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        """Delay after which a hedge is sent, default_delay until enough samples are seen"""
+        if len(self.tracker) < self.min_samples:
+            return self.default_delay
+        return self.tracker.percentile(self.percentile)
+
+    def _allow_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges < self.max_hedge_rate * self.requests:
+                self.hedges += 1
+                return True
+            return False
+
+    def _timed(self, fn: Callable[[str], Any], model_id: str):
+        started = time.monotonic()
+        result = fn(model_id)
+        return result, time.monotonic() - started
+
+    def invoke(
+        self,
+        fn: Callable[[str], Any],
+        model_id: str,
+        is_valid: Callable[[Any], bool] = lambda result: True,
+    ) -> Any:
+        """Call fn(model_id), hedged with fn(hedge_model_id or model_id) when it is slow"""
+        with self._lock:
+            self.requests += 1
+
+        started = time.monotonic()
+        delay = self.hedge_delay()
+        primary = self.executor.submit(self._timed, fn, model_id)
+        done, _ = wait([primary], timeout=delay)
+
+        if done or not self._allow_hedge():
+            result, latency = primary.result()
+            self.tracker.record(latency)
+            emit_metrics({"Requests": 1, "Hedges": 0}, {"Component": "Hedging"})
+            return result
+
+        hedge_model_id = self.hedge_model_id or model_id
+        print(f"No response after {delay:.2f}s, sending hedge request to {hedge_model_id}")
+        hedge = self.executor.submit(self._timed, fn, hedge_model_id)
+        pending = {primary: "primary", hedge: "hedge"}
+        invalid = []
+        errors = []
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    result, latency = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if not is_valid(result):
+                    print(f"Invalid {source} response")
+                    invalid.append(result)
+                    continue
+
+                if source == "primary":
+                    self.tracker.record(latency)
+                for loser in pending:
+                    # The losing call cannot be aborted once started, its result is ignored
+                    loser.cancel()
+                    if source == "hedge":
+                        loser.add_done_callback(self._record_saving(started))
+                emit_metrics(
+                    {"Requests": 1, "Hedges": 1, "HedgeWins": int(source == "hedge")},
+                    {"Component": "Hedging"},
+                )
+                return result
+
+        emit_metrics({"Requests": 1, "Hedges": 1, "HedgeWins": 0}, {"Component": "Hedging"})
+        if invalid:
+            return invalid[0]
+        raise next((e for e in errors if isinstance(e, BedrockThrottledError)), errors[-1])
+
+    def _record_saving(self, started: float) -> Callable:
+        """Latency saved by a winning hedge is known once the primary call finishes"""
+        won_at = time.monotonic()
+
+        def callback(future):
+            if future.cancelled() or future.exception():
+                return
+            _, latency = future.result()
+            self.tracker.record(latency)
+            saved_ms = (started + latency - won_at) * 1000
+            emit_metrics(
+                {"HedgeLatencySavedMs": max(0.0, saved_ms)},
+                {"Component": "Hedging"},
+                units={"HedgeLatencySavedMs": "Milliseconds"},
+            )
+
+        return callback
+
+
+def create_hedged_invoker() -> Optional[HedgedInvoker]:
+    """Create the hedged invoker configured by the HEDGE_* environment variables"""
+    if os.environ.get("HEDGE_ENABLED", "false").lower() != "true":
+        return None
+
+    return HedgedInvoker(
+        percentile=float(os.environ.get("HEDGE_PERCENTILE", 95)),
+        default_delay=float(os.environ.get("HEDGE_DEFAULT_DELAY_MS", 2000)) / 1000,
+        min_samples=int(os.environ.get("HEDGE_MIN_SAMPLES", 20)),
+        max_hedge_rate=float(os.environ.get("HEDGE_MAX_RATE", 0.1)),
+        hedge_model_id=os.environ.get("HEDGE_MODEL_ID") or None,
+    )
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+STATUS_IN_PROGRESS = "IN_PROGRESS"
+STATUS_COMPLETED = "COMPLETED"
+
+# Responses asking for a retry, never stored besides the 5xx ones
+RETRYABLE_STATUS_CODES = {429}
+
+
+class IdempotencyInProgressError(Exception):
+    """Raised when a duplicate invocation is still being processed by another call"""
+
+
+def idempotency_key(event: Dict[str, Any]) -> str:
+    """
+    Build the idempotency key of an action group invocation from the session id, the api path
+    and a hash of the request content. Agent retries of the same action share the same key.
+    """
+    api_path = event.get("apiPath", "")
+    payload = json.dumps(
+        {
+            "actionGroup": event.get("actionGroup", ""),
+            "apiPath": api_path,
+            "httpMethod": event.get("httpMethod", ""),
+            "parameters": event.get("parameters", []),
+            "requestBody": event.get("requestBody", {}),
+            # e.g. the target database of the request
+            "sessionAttributes": event.get("sessionAttributes", {}),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{event.get('sessionId', '')}#{api_path}#{digest}"
+
+
+class InMemoryIdempotencyStore:
+    """
+    Idempotency records kept in the memory of the execution environment.
+    Only deduplicates retries that land on the same warm Lambda environment.
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str, expires_at: float) -> Optional[Dict[str, Any]]:
+        """Insert an in-progress record, or return the live record already stored for the key"""
+        with self._lock:
+            record = self._records.get(key)
+            if record and record["expires_at"] > time.time():
+                return dict(record)
+            self._records[key] = {"status": STATUS_IN_PROGRESS, "expires_at": expires_at}
+            return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(key)
+            if record and record["expires_at"] > time.time():
+                return dict(record)
+            return None
+
+    def complete(self, key: str, response: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self._records[key] = {
+                "status": STATUS_COMPLETED,
+                "response": response,
+                "expires_at": expires_at,
+            }
+            # Drop expired records so the store does not grow unbounded in a warm environment
+            now = time.time()
+            for expired in [k for k, r in self._records.items() if r["expires_at"] <= now]:
+                del self._records[expired]
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._records.pop(key, None)
+
+
+class DynamoDBIdempotencyStore:
+    """
+    Idempotency records kept in a DynamoDB table with partition key "idempotency_key" and
+    TTL attribute "expires_at". Any DynamoDB-compatible endpoint works, e.g. DynamoDB Local
+    for local runs through the endpoint_url of the client.
+    """
+
+    def __init__(self, table_name: str, client):
+        self.table_name = table_name
+        self.client = client
+
+    def try_acquire(self, key: str, expires_at: float) -> Optional[Dict[str, Any]]:
+        """Insert an in-progress record, or return the live record already stored for the key"""
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    "idempotency_key": {"S": key},
+                    "status": {"S": STATUS_IN_PROGRESS},
+                    "expires_at": {"N": str(int(expires_at))},
+                },
+                # DynamoDB TTL deletes expired items lazily, so expired records are overwritten
+                ConditionExpression="attribute_not_exists(idempotency_key) OR expires_at < :now",
+                ExpressionAttributeValues={":now": {"N": str(int(time.time()))}},
+            )
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+        return self.get(key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={"idempotency_key": {"S": key}},
+            ConsistentRead=True,
+        )
+        item = response.get("Item")
+        if not item or float(item["expires_at"]["N"]) <= time.time():
+            return None
+
+        record = {"status": item["status"]["S"], "expires_at": float(item["expires_at"]["N"])}
+        if "response" in item:
+            record["response"] = json.loads(item["response"]["S"])
+        return record
+
+    def complete(self, key: str, response: Dict[str, Any], expires_at: float) -> None:
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                "idempotency_key": {"S": key},
+                "status": {"S": STATUS_COMPLETED},
+                "response": {"S": json.dumps(response, default=str)},
+                "expires_at": {"N": str(int(expires_at))},
+            },
+        )
+
+    def release(self, key: str) -> None:
+        self.client.delete_item(
+            TableName=self.table_name, Key={"idempotency_key": {"S": key}}
+        )
+
+
+class IdempotencyLayer:
+    """
+    Runs each action group invocation at most once per key. Duplicates of a completed call
+    get the stored response, duplicates of an in-flight call wait for its result.
+    """
+
+    def __init__(
+        self,
+        store,
+        ttl_seconds: int = 300,
+        in_progress_seconds: int = 60,
+        wait_seconds: float = 20,
+        poll_interval: float = 0.2,
+    ):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.in_progress_seconds = in_progress_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_interval = poll_interval
+
+    def run(
+        self,
+        key: str,
+        fn: Callable[[], Dict[str, Any]],
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Return the stored response for the key, or call fn and store its response.
+        Responses with a 5xx or 429 status are not stored so that a later retry runs again.
+        deadline is the epoch time by which a waiting duplicate has to give up.
+        """
+        record = self.store.try_acquire(key, time.time() + self.in_progress_seconds)
+
+        if record is not None:
+            if record["status"] == STATUS_COMPLETED:
+                print(f"Idempotency hit, returning stored response for {key}")
+                return record["response"]
+            print(f"Idempotency in progress, waiting for {key}")
+            return self._wait_for_result(key, fn, deadline)
+
+        return self._execute(key, fn)
+
+    def _execute(self, key: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            response = fn()
+        except Exception:
+            self.store.release(key)
+            raise
+
+        status_code = response.get("response", {}).get("httpStatusCode", 200)
+        try:
+            if status_code < 500 and status_code not in RETRYABLE_STATUS_CODES:
+                self.store.complete(key, response, time.time() + self.ttl_seconds)
+            else:
+                self.store.release(key)
+        except Exception as e:
+            # e.g. a response above the DynamoDB item size limit, the caller still gets it
+            print(f"Failed to store idempotency record for {key}: {str(e)}")
+        return response
+
+    def _wait_for_result(
+        self, key: str, fn: Callable[[], Dict[str, Any]], deadline: Optional[float]
+    ) -> Dict[str, Any]:
+        wait_until = time.time() + self.wait_seconds
+        if deadline is not None:
+            wait_until = min(wait_until, deadline)
+
+        while time.time() < wait_until:
+            time.sleep(self.poll_interval)
+            record = self.store.get(key)
+            if record is None:
+                # The original call failed or its in-progress record expired, take over
+                if self.store.try_acquire(key, time.time() + self.in_progress_seconds) is None:
+                    return self._execute(key, fn)
+                continue
+            if record["status"] == STATUS_COMPLETED:
+                return record["response"]
+
+        raise IdempotencyInProgressError(f"Request {key} is already in progress")
+
+
+def create_idempotency_layer() -> Optional[IdempotencyLayer]:
+    """Create the idempotency layer configured by the IDEMPOTENCY_* environment variables"""
+    store_type = os.environ.get("IDEMPOTENCY_STORE", "none").lower()
+
+    if store_type == "none":
+        return None
+    if store_type == "memory":
+        store = InMemoryIdempotencyStore()
+    elif store_type == "dynamodb":
+        import boto3
+
+        client = boto3.client(
+            "dynamodb", endpoint_url=os.environ.get("IDEMPOTENCY_DYNAMODB_ENDPOINT")
+        )
+        store = DynamoDBIdempotencyStore(os.environ["IDEMPOTENCY_TABLE"], client)
+    else:
+        raise ValueError(f"Unknown IDEMPOTENCY_STORE: {store_type}")
+
+    return IdempotencyLayer(
+        store,
+        ttl_seconds=int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 300)),
+        in_progress_seconds=int(os.environ.get("IDEMPOTENCY_IN_PROGRESS_SECONDS", 60)),
+        wait_seconds=float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", 20)),
+    )
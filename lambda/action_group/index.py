@@ -1,19 +1,70 @@
 import json
 import boto3
 import os
+import time
 # from typing import Dict, Any, Optional, Union
 from typing import Dict, Any, Optional
 from enum import Enum
 from dataclasses import dataclass
+from botocore.config import Config
+
+from bedrock_client import BedrockThrottledError, create_bedrock_client
+from column_values import create_column_value_dictionary
+from database_context import (
+    DEFAULT_DATABASE,
+    DatabaseContext,
+    UnknownDatabaseError,
+    create_database_cache,
+    create_database_router,
+    generated_query_cache_size,
+)
+from few_shot import create_few_shot_retriever
+from hedging import create_hedged_invoker
+from intent_templates import create_intent_engine, intent_columns
+from metrics import emit_metrics
+from model_router import create_model_router
+from read_routing import create_reader_executor
+from schema_index import SchemaIndex
+from schema_model import CompactSchema
+from schema_render import render_schema
+from schema_watcher import create_schema_watcher
+from self_correction import create_self_corrector, normalize_sql, referenced_tables
+from table_stats import create_table_statistics
+from token_budget import (
+    TokenEstimator,
+    fit_prompt,
+    prompt_token_budget,
+    record_token_usage,
+)
+from idempotency import (
+    IdempotencyInProgressError,
+    create_idempotency_layer,
+    idempotency_key,
+)
+from warmer import DEFAULT_HOLD_MS, fan_out, is_warmup_event
 
-schema = None
 bedrock_runtime = None
-
-rds_data = boto3.client("rds-data")
-
-CLUSTER_ARN = os.environ["CLUSTER_ARN"]
-READONLY_SECRET_ARN = os.environ["READONLY_SECRET_ARN"]
-DB_NAME = os.environ["DB_NAME"]
+idempotency = None
+hedger = None
+router = None
+token_estimator = TokenEstimator()
+database_router = None
+databases = None
+# Context of the database targeted by the current request: schema snapshot and caches
+db = None
+
+rds_data_clients = {}
+# False after the first request of this execution environment
+cold_start = True
+
+# API paths served by this function: "all", or "generate"/"execute" when the stack deploys
+# them as separate functions. The execute function skips schema and Bedrock initialization.
+ACTION_GROUP_MODE = os.environ.get("ACTION_GROUP_MODE", "all")
+SERVED_PATHS = {
+    "all": ("/generate", "/execute"),
+    "generate": ("/generate",),
+    "execute": ("/execute",),
+}[ACTION_GROUP_MODE]
 
 
 class ErrorType(Enum):
@@ -23,7 +74,10 @@ class ErrorType(Enum):
     INVALID_QUERY = ("Invalid query", 400)
     DATABASE_ERROR = ("Database error", 500)
     UNKNOWN_PATH = ("Unknown path", 404)
+    UNKNOWN_DATABASE = ("Unknown database", 400)
     SERVER_ERROR = ("Server error", 500)
+    REQUEST_IN_PROGRESS = ("Request in progress", 409)
+    THROTTLED = ("Model throttled", 429)
 
     def __init__(self, message: str, status_code: int):
         self.message = message
@@ -91,16 +145,28 @@ class BedrockResponseBuilder:
 
 
 # Function to get database schema and cache it
-def get_database_schema():
+def get_database_schema(relations=None, database=None):
     """
     Fetch database schema from PostgreSQL and cache it in memory.
+    With relations, e.g. {"academics.courses"}, only the rows of those tables are fetched.
     """
-
-    print(f"Fetching schema from database: {DB_NAME}")
+    database = database or db
+
+    print(f"Fetching schema from database: {database.target.database}")
+    relation_filter = ""
+    parameters = None
+    if relations:
+        relation_filter = (
+            "AND t.table_schema || '.' || t.table_name = ANY(string_to_array(:relations, ','))"
+        )
+        parameters = [
+            {"name": "relations", "value": {"stringValue": ",".join(sorted(relations))}}
+        ]
 
     # Query to get comprehensive schema information
-    schema_query = """
+    schema_query = f"""
     SELECT
+        t.table_schema,
         t.table_name,
         t.table_type,
         c.column_name,
@@ -110,22 +176,28 @@ def get_database_schema():
         tc.constraint_type,
         kcu.constraint_name
     FROM information_schema.tables t
-    LEFT JOIN information_schema.columns c ON t.table_name = c.table_name
-    LEFT JOIN information_schema.key_column_usage kcu ON c.table_name = kcu.table_name
+    LEFT JOIN information_schema.columns c ON t.table_schema = c.table_schema
+        AND t.table_name = c.table_name
+    LEFT JOIN information_schema.key_column_usage kcu ON c.table_schema = kcu.table_schema
+        AND c.table_name = kcu.table_name
         AND c.column_name = kcu.column_name
-    LEFT JOIN information_schema.table_constraints tc ON kcu.constraint_name = tc.constraint_name
-    WHERE t.table_schema = 'public'
-    ORDER BY t.table_name, c.ordinal_position;
+    LEFT JOIN information_schema.table_constraints tc ON kcu.constraint_schema = tc.constraint_schema
+        AND kcu.constraint_name = tc.constraint_name
+    WHERE t.table_schema NOT IN ('pg_catalog', 'information_schema', 'agent_meta')
+    {relation_filter}
+    ORDER BY t.table_schema, t.table_name, c.ordinal_position;
     """
 
     # Execute schema query
-    response = execute_query(schema_query, as_json=True)
+    response = execute_query(schema_query, parameters, as_json=True, database=database)
 
     schema_obj = json.loads(response["formattedRecords"])
     return schema_obj
 
 
-def generate_message(bedrock_runtime, model_id, system_prompt, messages, max_tokens):
+def generate_message(
+    bedrock_runtime, model_id, system_prompt, messages, max_tokens, is_valid=None
+):
 
     body = json.dumps(
         {
@@ -136,16 +208,37 @@ def generate_message(bedrock_runtime, model_id, system_prompt, messages, max_tok
         }
     )
 
-    response = bedrock_runtime.invoke_model(body=body, modelId=model_id)
-    response_body = json.loads(response.get("body").read())
+    def invoke(invoke_model_id):
+        response = bedrock_runtime.invoke_model(body=body, modelId=invoke_model_id)
+        return json.loads(response.get("body").read())
+
+    if hedger is None:
+        return invoke(model_id)
+
+    # Hedged mode: a slow request is raced by a second one and the first valid response wins
+    return hedger.invoke(invoke, model_id, is_valid or has_sql_text)
 
-    return response_body
 
+def response_sql(response_body):
+    return normalize_sql(response_body["content"][0]["text"])
 
-def invoke_llm(messages):
-    model_id = os.environ["model_id"]
 
-    response = generate_message(bedrock_runtime, model_id, "", messages, 300)
+def has_sql_text(response_body):
+    """Check that a model response contains a single SELECT/WITH statement"""
+    try:
+        text = response_sql(response_body)
+        return text.lower().startswith(("select", "with")) and validate_query(text)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return False
+
+
+def invoke_llm(messages, model_id=None, max_tokens=300):
+    model_id = model_id or os.environ["model_id"]
+
+    try:
+        response = generate_message(bedrock_runtime, model_id, "", messages, max_tokens)
+    finally:
+        bedrock_runtime.emit_counters()
 
     return response
 
@@ -200,13 +293,31 @@ def validate_query(sql_query):
     return True
 
 
-def generate_query(question):
-    if not schema:
-        raise ValueError("Schema not initialized")
+# Used when no similar question has been answered yet
+DEFAULT_EXAMPLES = [
+    ("How many students do we have?", "SELECT COUNT(*) FROM academics.students"),
+    (
+        "How many courses does each department offer?",
+        "SELECT d.name, COUNT(c.course_id) FROM academics.departments d "
+        "LEFT JOIN academics.courses c ON c.department_id = d.department_id GROUP BY d.name",
+    ),
+]
 
-    # Validate input before processing
-    validated_question = validate_input(question)
-    # Construct the prompt with schema context
+
+def render_examples(examples):
+    return "\n\n    ".join(
+        f'<question>"{question}"</question>\n    <sql>{sql}</sql>' for question, sql in examples
+    )
+
+
+TABLE_STATS_INSTRUCTION = """
+        9. The first entry of a table may be a note starting with -- that gives its estimated row count,
+           primary key and indexed columns. On large tables, filter on indexed columns, avoid correlated
+           subqueries and add a LIMIT when listing rows."""
+
+
+def build_prompt(schema_text, validated_question, examples=None, table_stats=False):
+    # Construct the prompt with schema context, table_stats when the schema has statistics notes
     contexts = f"""
     <Instructions>
         Read database schema inside the <database_schema></database_schema> tags which
@@ -218,16 +329,12 @@ def generate_query(question):
         5. Be careful to not query for columns that do not exist.
         6. Pay attention to which column is in which table.
         7. Qualify column names with the table name when needed.
-        8. Return only the sql query without any tags.
+        8. Return only the sql query without any tags.{TABLE_STATS_INSTRUCTION if table_stats else ""}
     </Instructions>
-    <database_schema>{schema}</database_schema>
+    <database_schema>{schema_text}</database_schema>
 
     <examples>
-    <question>"How many users do we have?"</question>
-    <sql>SELECT SUM(users) FROM customers</sql>
-
-    <question>"How many users do we have for Mobile?"</question>
-    <sql>SELECT SUM(users) FROM customer WHERE source_medium='Mobile'</sql>
+    {render_examples(examples or DEFAULT_EXAMPLES)}
     </examples>
 
     <question>{validated_question}</question>
@@ -243,6 +350,99 @@ def generate_query(question):
     Question: {validated_question}
     Assistant:
     """
+    return prompt
+
+
+def refresh_schema(database):
+    """Re-introspect the relations changed by DDL since the schema was loaded"""
+    try:
+        change = database.schema_watcher.check()
+        if change is None or not (change.full or change.relations):
+            return
+        if change.full:
+            schema = CompactSchema.from_rows(get_database_schema(database=database))
+        else:
+            schema = database.schema.replace(
+                change.relations, get_database_schema(change.relations, database)
+            )
+    except Exception as e:
+        # A stale schema is better than a failed request
+        print(f"Failed to refresh schema: {str(e)}")
+        return
+
+    database.schema = schema
+    database.schema_index = SchemaIndex(schema)
+    database.generated.clear()
+    if database.column_values is not None:
+        database.column_values.set_schema(schema)
+    if database.table_stats is not None:
+        database.table_stats.start_refresh()
+    databases.resized(database)
+
+
+def few_shot_question(question):
+    """
+    The user's question of the agent turn, the key under which /execute stores a successful
+    pair and /generate looks up similar ones. Pairs end up in the prompts of other sessions,
+    so only questions passing validate_input are used.
+    """
+    try:
+        return validate_input(question)
+    except ValueError:
+        return None
+
+
+def generate_query(question, deadline=None, database=None, user_question=None):
+    database = database or db
+    if database.schema_watcher is not None:
+        refresh_schema(database)
+
+    if not database.schema:
+        raise ValueError("Schema not initialized")
+
+    # Validate input before processing
+    validated_question = validate_input(question)
+
+    # Frequent questions are answered from SQL templates without calling the model
+    intents = database.intents
+    if intents is not None:
+        template_query = intents.answer(validated_question)
+        if template_query:
+            return template_query
+
+    cached_query = database.generated.get(validated_question)
+    if cached_query:
+        print(f"Generated query cache hit for database {database.target.name}")
+        return cached_query
+
+    # Similar questions answered before replace the static examples
+    # Looked up by the question of the user, like the pairs are stored, not by the agent's
+    # rewording of it in the prompt parameter
+    few_shot = database.few_shot
+    examples = None
+    if few_shot:
+        examples = few_shot.examples(few_shot_question(user_question) or validated_question)
+
+    # Stored values of low-cardinality columns ground the literals of the query
+    values = database.column_values.get() if database.column_values else None
+    # Row estimates and indexes steer the model to efficient query shapes
+    notes = database.table_stats.notes() if database.table_stats else None
+
+    # Drop schema detail until the prompt fits the token budget
+    schema = database.schema
+    schema_index = database.schema_index
+    prompt, trim_level, estimated_tokens = fit_prompt(
+        schema,
+        validated_question,
+        lambda schema_text: build_prompt(
+            schema_text, validated_question, examples, table_stats=bool(notes)
+        ),
+        token_estimator,
+        prompt_token_budget(),
+        schema_index,
+        values,
+        notes,
+    )
 
     messages = [
         {
@@ -252,21 +452,72 @@ def generate_query(question):
             ],
         }
     ]
-    llm_response = invoke_llm(messages)
+
+    # Simple questions go to a faster model with a smaller max_tokens
+    decision = router.route(validated_question, schema_index) if router else None
+    model_id = decision.model_id if decision else None
+    max_tokens = decision.max_tokens if decision else 300
+
+    started = time.monotonic()
+    llm_response = invoke_llm(messages, model_id, max_tokens)
+    generation_seconds = time.monotonic() - started
+    if intents is not None:
+        intents.record_generation(generation_seconds)
+    if decision is not None:
+        router.record(decision, generation_seconds, has_sql_text(llm_response))
+
+    record_token_usage(
+        token_estimator,
+        prompt,
+        estimated_tokens,
+        trim_level,
+        llm_response.get("usage", {}),
+    )
 
     print(llm_response)
     print(llm_response["content"][0]["text"])
 
-    return llm_response["content"][0]["text"]
+    # Normalized like the hedged path checks it, so that hedging does not change results
+    generated_query = response_sql(llm_response)
+    if database.self_corrector is None:
+        database.generated.put(validated_question, generated_query)
+        return generated_query
+
+    # Check the query with EXPLAIN and let the model fix it within this invocation,
+    # instead of failing in /execute and costing the agent another round trip
+    def regenerate(correction_messages):
+        response = invoke_llm(correction_messages, model_id, max_tokens)
+        return response_sql(response)
+
+    def table_definitions(sql):
+        tables = referenced_tables(sql, schema_index.tables) or schema_index.related_tables(
+            validated_question
+        )
+        return render_schema(
+            schema, tables=tables or None, column_values=values, table_notes=notes
+        )
+
+    generated_query, _, valid = database.self_corrector.run(
+        generated_query,
+        messages,
+        regenerate,
+        table_definitions,
+        deadline,
+        generation_seconds,
+    )
+    if valid:
+        database.generated.put(validated_question, generated_query)
+    return generated_query
 
 
-def execute_query(query, parameters=None, as_json=False):
+def execute_query(query, parameters=None, as_json=False, database=None):
+    database = database or db
     try:
         # Base request parameters
         request_params = {
-            "resourceArn": CLUSTER_ARN,
-            "secretArn": READONLY_SECRET_ARN,
-            "database": DB_NAME,
+            "resourceArn": database.target.cluster_arn,
+            "secretArn": database.target.secret_arn,
+            "database": database.target.database,
             "sql": query,
         }
 
@@ -278,7 +529,7 @@ def execute_query(query, parameters=None, as_json=False):
             request_params["formatRecordsAs"] = "JSON"
 
         # Execute the query
-        response = rds_data.execute_statement(**request_params)
+        response = database.rds_data.execute_statement(**request_params)
         return response
 
     except Exception as e:
@@ -286,7 +537,61 @@ def execute_query(query, parameters=None, as_json=False):
         raise
 
 
-def handle_generate(properties, action_group):
+def execute_read_query(query, database=None):
+    """Run an /execute query on a reader when one is configured and in sync, else on the writer"""
+    database = database or db
+    if database.reader is not None:
+        results = database.reader.execute(query)
+        if results is not None:
+            return results
+    return execute_query(query, database=database)
+
+
+def fetch_records(query, database=None):
+    """Run a query and return its records as a list of dicts"""
+    return json.loads(
+        execute_query(query, as_json=True, database=database)["formattedRecords"]
+    )
+
+
+def rds_data_client(region):
+    if region not in rds_data_clients:
+        rds_data_clients[region] = boto3.client("rds-data", region_name=region)
+    return rds_data_clients[region]
+
+
+def load_database(target):
+    """Load the schema of a database and build the components that depend on it"""
+    database = DatabaseContext(
+        target, rds_data_client(target.region), generated_query_cache_size()
+    )
+
+    def fetch(query):
+        return fetch_records(query, database=database)
+
+    if "/generate" in SERVED_PATHS:
+        # The version is read first, so that DDL during introspection is seen later
+        database.schema_watcher = create_schema_watcher(fetch)
+        # One object per table instead of one dict per column and constraint row
+        database.schema = CompactSchema.from_rows(get_database_schema(database=database))
+        database.schema_index = SchemaIndex(database.schema)
+        database.self_corrector = create_self_corrector(
+            lambda query: execute_query(query, database=database), validate_query
+        )
+        # One dictionary serves the prompt and the intent slots when both are enabled
+        database.column_values = create_column_value_dictionary(fetch, database.schema, intent_columns())
+        database.intents = create_intent_engine(fetch, database.schema, database.column_values)
+        database.table_stats = create_table_statistics(fetch)
+    database.reader = create_reader_executor(
+        target.reader_endpoint, target.secret_arn, target.database
+    )
+    database.few_shot = create_few_shot_retriever(
+        None if target.name == DEFAULT_DATABASE else target.name
+    )
+    return database
+
+
+def handle_generate(properties, action_group, deadline=None, question=None):
     try:
         # Find the prompt property
         for prop in properties:
@@ -301,7 +606,7 @@ def handle_generate(properties, action_group):
                 "Prompt parameter is required",
             )
 
-        generated_query = generate_query(prompt)
+        generated_query = generate_query(prompt, deadline, user_question=question)
         print(f"Generated query: {generated_query}")
 
         if not validate_query(generated_query):
@@ -316,6 +621,11 @@ def handle_generate(properties, action_group):
             action_group, "/generate", {"query": generated_query}
         )
 
+    except BedrockThrottledError as e:
+        print(f"Bedrock throttled: {str(e)}")
+        return BedrockResponseBuilder.error(
+            ErrorType.THROTTLED, action_group, "/generate", str(e)
+        )
     except Exception as e:
         print(f"Error in generate: {str(e)}")
         return BedrockResponseBuilder.error(
@@ -323,7 +633,7 @@ def handle_generate(properties, action_group):
         )
 
 
-def handle_execute(properties, action_group):
+def handle_execute(properties, action_group, question=None):
     try:
         query = None
         for prop in properties:
@@ -349,7 +659,11 @@ def handle_execute(properties, action_group):
         # Execute the query
         try:
 
-            results = execute_query(query)
+            results = execute_read_query(query)
+
+            user_question = few_shot_question(question) if db.few_shot else None
+            if user_question:
+                db.few_shot.record_success(user_question, query)
 
             return BedrockResponseBuilder.success(
                 action_group, "/execute", {"results": results}
@@ -368,14 +682,98 @@ def handle_execute(properties, action_group):
 
 
 try:
-    schema = get_database_schema()
-    bedrock_runtime = boto3.client("bedrock-runtime")
+    if "/generate" in SERVED_PATHS:
+        router = create_model_router(os.environ["model_id"])
+        # Retries are done by the wrapper, with backoff, circuit breaker and model failover
+        bedrock_runtime = create_bedrock_client(
+            boto3.client(
+                "bedrock-runtime",
+                config=Config(retries={"max_attempts": 1, "mode": "standard"}),
+            ),
+            os.environ["model_id"],
+        )
+        hedger = create_hedged_invoker()
+    database_router = create_database_router()
+    databases = create_database_cache(load_database)
+    # The default database is loaded at cold start, routed ones on their first request
+    db = databases.get(database_router.default)
+    idempotency = create_idempotency_layer()
 except Exception as e:
     print(f"Failed to initialize: {str(e)}")
     raise
 
 
+def handle_warmup(event, context):
+    """
+    Keep the default database and execution environments warm: one trivial query, a check
+    for schema changes and optionally concurrent invocations of this function. No Bedrock call.
+    """
+    started = time.time()
+    try:
+        execute_query("SELECT 1", database=db)
+        if db.reader is not None:
+            db.reader.execute("SELECT 1")
+        if db.schema_watcher is not None:
+            refresh_schema(db)
+    except Exception as e:
+        # The next warmup or request tries again
+        print(f"Warmup query failed: {str(e)}")
+
+    invoked = 0
+    concurrency = int(event.get("concurrency", 1))
+    if concurrency > 1 and context is not None:
+        invoked = fan_out(
+            context.invoked_function_arn,
+            concurrency - 1,
+            int(event.get("holdMs", DEFAULT_HOLD_MS)),
+        )
+    else:
+        # Stay busy while the other warmup invocations run
+        time.sleep(int(event.get("holdMs", 0)) / 1000)
+
+    emit_metrics({"Warmups": 1, "WarmupColdStarts": int(cold_start)})
+    return {
+        "warmed": True,
+        "coldStart": cold_start,
+        "invoked": invoked,
+        "durationMs": int((time.time() - started) * 1000),
+    }
+
+
+def route_request(api_path, properties, action_group, deadline=None, question=None):
+    if api_path in ("/generate", "/execute") and api_path not in SERVED_PATHS:
+        return BedrockResponseBuilder.error(
+            ErrorType.UNKNOWN_PATH,
+            action_group,
+            api_path,
+            f"{api_path} is not served by the {ACTION_GROUP_MODE} function",
+        )
+
+    # Route to appropriate handler based on API path
+    if api_path == "/generate":
+        return handle_generate(properties, action_group, deadline, question)
+    elif api_path == "/execute":
+        return handle_execute(properties, action_group, question)
+    else:
+        return BedrockResponseBuilder.error(
+            ErrorType.SERVER_ERROR,
+            action_group,
+            api_path,
+            {"error": f"Unknown API path: {api_path}"},
+        )
+
+
 def handler(event, context):
+    global db, cold_start
+
+    if is_warmup_event(event):
+        db = databases.get(database_router.default)
+        try:
+            return handle_warmup(event, context)
+        finally:
+            cold_start = False
+
+    cold_start = False
     try:
         print(event)
         request_body = event.get("requestBody", {})
@@ -384,18 +782,36 @@ def handler(event, context):
         properties = json_content.get("properties", [])
         api_path = event.get("apiPath", "")
         action_group = event.get("actionGroup", "")
+        question = event.get("inputText")
 
-        # Route to appropriate handler based on API path
-        if api_path == "/generate":
-            return handle_generate(properties, action_group)
-        elif api_path == "/execute":
-            return handle_execute(properties, action_group)
-        else:
+        try:
+            db = databases.get(database_router.resolve(event))
+        except UnknownDatabaseError as e:
             return BedrockResponseBuilder.error(
-                ErrorType.SERVER_ERROR,
-                action_group,
-                api_path,
-                {"error": f"Unknown API path: {api_path}"},
+                ErrorType.UNKNOWN_DATABASE, action_group, api_path, str(e)
+            )
+
+        # Leave a margin to return a response before the function times out
+        deadline = None
+        if context is not None:
+            deadline = time.time() + context.get_remaining_time_in_millis() / 1000 - 1
+
+        if idempotency is None:
+            return route_request(api_path, properties, action_group, deadline, question)
+
+        # Agent retries of the same invocation return the stored response instead of
+        # generating and running the query again
+        try:
+            return idempotency.run(
+                idempotency_key(event),
+                lambda: route_request(
+                    api_path, properties, action_group, deadline, question
+                ),
+                deadline,
+            )
+        except IdempotencyInProgressError as e:
+            return BedrockResponseBuilder.error(
+                ErrorType.REQUEST_IN_PROGRESS, action_group, api_path, str(e)
             )
 
     except Exception as e:
@@ -0,0 +1,267 @@
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from column_values import ColumnValueDictionary
+from metrics import emit_metrics
+from schema_model import SchemaSource
+
+
+@dataclass
+class Slot:
+    """A template parameter whose value must be one of the values of a column"""
+
+    table: str
+    column: str
+
+
+@dataclass
+class IntentTemplate:
+    """Parameterized SQL for a frequent question, matched on the whole normalized question"""
+
+    name: str
+    patterns: List[str]
+    sql: str
+    slots: Dict[str, Slot] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.compiled = [re.compile(p) for p in self.patterns]
+
+
+@dataclass
+class IntentMatch:
+    name: str
+    sql: str
+    values: Dict[str, str]
+
+
+DEPARTMENT = Slot("academics.departments", "name")
+POSITION = Slot("staff.employees", "position")
+
+TEMPLATES = [
+    IntentTemplate(
+        name="department_count",
+        patterns=[
+            r"(what is the )?(total )?number of departments",
+            r"how many departments (are there|do we have|exist)",
+            r"count (all )?(the )?departments",
+        ],
+        sql="SELECT COUNT(*) AS department_count FROM academics.departments",
+    ),
+    IntentTemplate(
+        name="students_per_department",
+        patterns=[
+            r"how many students (are )?(enrolled )?(are )?(there )?(in|per|by) (each|every) (major )?department",
+            r"(count|number of) (the )?students (in|per|by) (each )?(major )?department",
+        ],
+        sql=(
+            "SELECT d.name AS department, COUNT(s.student_id) AS student_count "
+            "FROM academics.departments d LEFT JOIN academics.students s "
+            "ON s.major_department_id = d.department_id GROUP BY d.name ORDER BY student_count DESC"
+        ),
+    ),
+    IntentTemplate(
+        name="students_in_department",
+        patterns=[
+            r"how many students (are )?(enrolled |majoring )?in (the )?(?P<department>.+?)( department)?",
+        ],
+        sql=(
+            "SELECT COUNT(s.student_id) AS student_count FROM academics.students s "
+            "JOIN academics.departments d ON s.major_department_id = d.department_id "
+            "WHERE d.name = {department}"
+        ),
+        slots={"department": DEPARTMENT},
+    ),
+    IntentTemplate(
+        name="courses_in_department",
+        patterns=[
+            r"(list|show|show me|what are|which are|get) (all )?(the )?courses "
+            r"(in|of|offered by|from) (the )?(?P<department>.+?)( department)?( with (their )?credits)?",
+        ],
+        sql=(
+            "SELECT c.code, c.title, c.credits FROM academics.courses c "
+            "JOIN academics.departments d ON c.department_id = d.department_id "
+            "WHERE d.name = {department} ORDER BY c.code"
+        ),
+        slots={"department": DEPARTMENT},
+    ),
+    IntentTemplate(
+        name="employees_by_position",
+        patterns=[
+            r"(count|how many) (the )?(number of )?employees (are there )?(by|per|for each|in each) position",
+            r"number of employees (by|per|for each) position",
+        ],
+        sql=(
+            "SELECT position, COUNT(*) AS employee_count FROM staff.employees "
+            "GROUP BY position ORDER BY employee_count DESC"
+        ),
+    ),
+    IntentTemplate(
+        name="employee_count_with_position",
+        patterns=[
+            r"how many (employees are |employees have position |)(?P<position>.+?)s? (are there|do we have)",
+        ],
+        sql="SELECT COUNT(*) AS employee_count FROM staff.employees WHERE position = {position}",
+        slots={"position": POSITION},
+    ),
+    IntentTemplate(
+        name="employees_with_position",
+        patterns=[
+            r"(list|show|show me) (all )?(the )?employees with (the )?position (?P<position>.+)",
+        ],
+        sql=(
+            "SELECT first_name, last_name, email, hire_date FROM staff.employees "
+            "WHERE position = {position} ORDER BY last_name, first_name"
+        ),
+        slots={"position": POSITION},
+    ),
+    IntentTemplate(
+        name="active_research_projects",
+        patterns=[
+            r"(list|show|show me|which|what|what are|get) (are )?(all )?(the )?(currently )?"
+            r"(active|ongoing|current) (research )?projects( are there)?",
+        ],
+        sql=(
+            "SELECT title, start_date, end_date, funding_amount FROM research.projects "
+            "WHERE start_date <= CURRENT_DATE AND (end_date IS NULL OR end_date >= CURRENT_DATE) "
+            "ORDER BY start_date"
+        ),
+    ),
+    IntentTemplate(
+        name="active_research_project_count",
+        patterns=[
+            r"how many (research )?projects are (currently )?(active|ongoing)",
+            r"how many (currently )?(active|ongoing|current) (research )?projects (are there|do we have)",
+        ],
+        sql=(
+            "SELECT COUNT(*) AS project_count FROM research.projects "
+            "WHERE start_date <= CURRENT_DATE AND (end_date IS NULL OR end_date >= CURRENT_DATE)"
+        ),
+    ),
+]
+
+
+def normalize_question(question: str) -> str:
+    """Lower case, straight quotes and punctuation removed, single spaces"""
+    question = question.lower().replace("’", "'")
+    question = re.sub(r"[?!.,;:\"()]", " ", question)
+    question = re.sub(r"(^|\s)'|'(\s|$)", " ", question)
+    return " ".join(question.split())
+
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class IntentEngine:
+    """
+    Answers frequent questions from parameterized SQL templates without calling the model.
+    Slot values are accepted only when they are known values of their column, and are
+    inlined as the stored value. Everything else falls back to the model.
+    """
+
+    def __init__(
+        self, templates: List[IntentTemplate], column_values: ColumnValueDictionary, smoothing: float = 0.1
+    ):
+        self.templates = templates
+        self.column_values = column_values
+        self.smoothing = smoothing
+        self.generation_seconds = None
+        self._lock = threading.Lock()
+
+    def resolve(self, slot: Slot, text: str) -> Optional[str]:
+        stored = self.column_values.get().get((slot.table, slot.column))
+        if not stored:
+            return None
+        values = {value.lower(): value for value in stored}
+        text = text.strip()
+        for candidate in (text, re.sub(r"^the ", "", text), text.rstrip("s")):
+            if candidate in values:
+                return values[candidate]
+        return None
+
+    def match(self, question: str) -> Optional[IntentMatch]:
+        normalized = normalize_question(question)
+        for template in self.templates:
+            for pattern in template.compiled:
+                found = pattern.fullmatch(normalized)
+                if not found:
+                    continue
+                values = {}
+                for name, slot in template.slots.items():
+                    value = self.resolve(slot, found.group(name) or "")
+                    if value is None:
+                        break
+                    values[name] = value
+                else:
+                    sql = template.sql.format(**{k: sql_literal(v) for k, v in values.items()})
+                    return IntentMatch(template.name, sql, values)
+        return None
+
+    def answer(self, question: str) -> Optional[str]:
+        """SQL for the question when it matches an intent, with hit and saved latency metrics"""
+        started = time.monotonic()
+        try:
+            found = self.match(question)
+        except Exception as e:
+            # A failing value lookup must not fail the request, the model can still answer
+            print(f"Intent matching failed: {str(e)}")
+            found = None
+        elapsed = time.monotonic() - started
+
+        metrics = {"IntentLookups": 1, "IntentHits": int(found is not None)}
+        dimensions = {"Component": "IntentTemplates"}
+        if found is not None:
+            saved = max(0.0, (self.generation_seconds or 0.0) - elapsed)
+            metrics["LatencySavedMs"] = saved * 1000
+            print(f"Intent {found.name} matched in {elapsed * 1000:.2f} ms: {found.sql}")
+        emit_metrics(metrics, dimensions, units={"LatencySavedMs": "Milliseconds"})
+        return found.sql if found else None
+
+    def record_generation(self, seconds: float) -> None:
+        """Track the model generation latency that a template hit saves"""
+        with self._lock:
+            if self.generation_seconds is None:
+                self.generation_seconds = seconds
+            else:
+                self.generation_seconds += self.smoothing * (seconds - self.generation_seconds)
+
+
+def slot_columns(templates: List[IntentTemplate]) -> Set[Tuple[str, str]]:
+    """The (table, column) pairs whose values the slots of the templates are checked against"""
+    return {(slot.table, slot.column) for template in templates for slot in template.slots.values()}
+
+
+def intent_columns() -> Set[Tuple[str, str]]:
+    """Slot columns to load into the column value dictionary, none when intents are disabled"""
+    if os.environ.get("INTENT_TEMPLATES_ENABLED", "false").lower() != "true":
+        return set()
+    return slot_columns(TEMPLATES)
+
+
+def create_intent_engine(
+    fetch: Callable[[str], List[Dict[str, Any]]],
+    schema: SchemaSource,
+    column_values: Optional[ColumnValueDictionary] = None,
+) -> Optional[IntentEngine]:
+    """
+    Create the intent engine configured by the INTENT_* environment variables. Slot values
+    come from column_values, created with intent_columns(), or from a dictionary of the slot
+    columns only when the column value dictionaries are disabled.
+    """
+    if os.environ.get("INTENT_TEMPLATES_ENABLED", "false").lower() != "true":
+        return None
+    if column_values is None:
+        column_values = ColumnValueDictionary(
+            fetch,
+            schema,
+            ttl_seconds=int(os.environ.get("INTENT_VALUES_TTL_SECONDS", 900)),
+            max_values=1000,
+            max_columns=0,
+            columns=slot_columns(TEMPLATES),
+        )
+        column_values.start_refresh()
+    return IntentEngine(TEMPLATES, column_values)
@@ -0,0 +1,41 @@
+import json
+import os
+import time
+from typing import Dict, Optional
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "BedrockAgentAurora")
+
+
+def emit_metrics(
+    metrics: Dict[str, float],
+    dimensions: Optional[Dict[str, str]] = None,
+    unit: str = "Count",
+    units: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    Print metrics in CloudWatch Embedded Metric Format, so CloudWatch Logs turns the
+    log line into metrics without any extra API calls from the Lambda function.
+    units overrides the unit of single metrics, e.g. {"LatencyMs": "Milliseconds"}.
+    """
+    if not metrics:
+        return
+
+    dimensions = dimensions or {}
+    units = units or {}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [list(dimensions.keys())],
+                    "Metrics": [
+                        {"Name": name, "Unit": units.get(name, unit)} for name in metrics
+                    ],
+                }
+            ],
+        },
+        **dimensions,
+        **metrics,
+    }
+    print(json.dumps(record))
@@ -0,0 +1,157 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+from metrics import emit_metrics
+from schema_index import SchemaIndex
+
+AGGREGATION_PATTERN = re.compile(
+    r"\b(how many|count|number of|total|sum|average|avg|mean|max(imum)?|min(imum)?|"
+    r"most|least|top|rank|per|each|group(ed)? by|more than|less than|at least|ratio|percent(age)?)\b"
+)
+TEMPORAL_PATTERN = re.compile(
+    r"\b(before|after|since|until|between|during|current(ly)?|active|recent|latest|last|"
+    r"year|month|week|day|date|semester|\d{4})\b"
+)
+
+
+@dataclass
+class QueryFeatures:
+    """Cheap local features of a question used to estimate the complexity of its SQL"""
+
+    table_count: int
+    aggregation_count: int
+    temporal_count: int
+    word_count: int
+
+    @property
+    def score(self) -> float:
+        return (
+            2 * max(0, self.table_count - 1)
+            + self.aggregation_count
+            + self.temporal_count
+            + self.word_count / 15
+        )
+
+
+@dataclass
+class RoutingDecision:
+    """Model and token budget chosen for a question"""
+
+    tier: str
+    model_id: str
+    max_tokens: int
+    features: QueryFeatures
+
+
+def extract_features(question: str, schema_index: Optional[SchemaIndex]) -> QueryFeatures:
+    question_lower = question.lower()
+    return QueryFeatures(
+        table_count=(len(schema_index.referenced_tables(question)) if schema_index else 0),
+        aggregation_count=len(AGGREGATION_PATTERN.findall(question_lower)),
+        temporal_count=len(TEMPORAL_PATTERN.findall(question_lower)),
+        word_count=len(question.split()),
+    )
+
+
+class ModelRouter:
+    """
+    Sends simple questions (a single table, few aggregations) to a fast, cheap model and
+    complex ones to the large model, with max_tokens sized to the expected SQL length.
+    Keeps per-model latency and validation-failure statistics to tune the thresholds.
+    """
+
+    def __init__(
+        self,
+        simple_model_id: str,
+        complex_model_id: str,
+        simple_max_score: float = 3.0,
+        base_tokens: int = 120,
+        tokens_per_table: int = 80,
+        tokens_per_clause: int = 40,
+        max_tokens: int = 600,
+    ):
+        self.simple_model_id = simple_model_id
+        self.complex_model_id = complex_model_id
+        self.simple_max_score = simple_max_score
+        self.base_tokens = base_tokens
+        self.tokens_per_table = tokens_per_table
+        self.tokens_per_clause = tokens_per_clause
+        self.max_tokens = max_tokens
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def expected_tokens(self, features: QueryFeatures) -> int:
+        """Output token budget: the SQL grows with every joined table and extra clause"""
+        tokens = (
+            self.base_tokens
+            + self.tokens_per_table * max(1, features.table_count)
+            + self.tokens_per_clause * (features.aggregation_count + features.temporal_count)
+        )
+        return min(self.max_tokens, tokens)
+
+    def route(self, question: str, schema_index: Optional[SchemaIndex]) -> RoutingDecision:
+        features = extract_features(question, schema_index)
+        simple = features.table_count <= 1 and features.score <= self.simple_max_score
+        decision = RoutingDecision(
+            tier="simple" if simple else "complex",
+            model_id=self.simple_model_id if simple else self.complex_model_id,
+            max_tokens=self.expected_tokens(features),
+            features=features,
+        )
+        print(
+            "Routing decision: "
+            + json.dumps({**asdict(decision), "score": round(features.score, 2)})
+        )
+        return decision
+
+    def record(self, decision: RoutingDecision, latency: float, valid: bool) -> None:
+        """Record the outcome of a routed request and publish it as metrics"""
+        with self._lock:
+            stats = self.stats.setdefault(
+                decision.model_id, {"requests": 0, "validation_failures": 0, "latency": 0.0}
+            )
+            stats["requests"] += 1
+            stats["validation_failures"] += int(not valid)
+            stats["latency"] += latency
+
+        emit_metrics(
+            {
+                "RoutedRequests": 1,
+                "ValidationFailures": int(not valid),
+                "GenerationLatencyMs": latency * 1000,
+            },
+            {"Component": "ModelRouter", "Tier": decision.tier, "ModelId": decision.model_id},
+            units={"GenerationLatencyMs": "Milliseconds"},
+        )
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Average latency and validation-failure rate per model seen by this environment"""
+        with self._lock:
+            return {
+                model_id: {
+                    "requests": s["requests"],
+                    "avg_latency_ms": round(1000 * s["latency"] / s["requests"], 1),
+                    "validation_failure_rate": round(
+                        s["validation_failures"] / s["requests"], 3
+                    ),
+                }
+                for model_id, s in self.stats.items()
+            }
+
+
+def create_model_router(default_model_id: str) -> Optional[ModelRouter]:
+    """Create the router configured by the ROUTER_* environment variables"""
+    simple_model_id = os.environ.get("ROUTER_SIMPLE_MODEL_ID")
+    if not simple_model_id:
+        return None
+
+    return ModelRouter(
+        simple_model_id=simple_model_id,
+        complex_model_id=os.environ.get("ROUTER_COMPLEX_MODEL_ID", default_model_id),
+        simple_max_score=float(os.environ.get("ROUTER_SIMPLE_MAX_SCORE", 3.0)),
+        max_tokens=int(os.environ.get("ROUTER_MAX_TOKENS", 600)),
+    )
@@ -0,0 +1,208 @@
+import base64
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import emit_metrics
+
+try:
+    import psycopg2
+    import psycopg2.errors
+except ImportError:  # psycopg2 is optional, e.g. provided by a Lambda layer
+    psycopg2 = None
+
+# Errors after which the reader is skipped for a while, except canceled queries: the writer
+# would cancel a query that ran into statement_timeout as well
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError) if psycopg2 else ()
+QUERY_CANCELED_ERRORS = (psycopg2.errors.QueryCanceled,) if psycopg2 else ()
+# Queries canceled by a replication conflict (SQLSTATE 40001) run on the writer, the
+# connection stays usable
+REPLICATION_CONFLICT_ERRORS = (psycopg2.errors.TransactionRollbackError,) if psycopg2 else ()
+
+# The Data API fails queries whose result exceeds 1 MB, the reader enforces the same limit
+MAX_RESULT_BYTES = 1024 * 1024
+FETCH_ROWS = 500
+
+# Lag of the Aurora replica the connection landed on. NULL on the writer, which the reader
+# endpoint resolves to when the cluster has no readers.
+REPLICA_LAG_QUERY = """
+SELECT replica_lag_in_msec FROM aurora_replica_status()
+WHERE server_id = aurora_db_instance_identifier()
+"""
+
+
+def data_api_field(value: Any) -> Dict[str, Any]:
+    """A driver value as a Data API field, so /execute results look the same on both paths"""
+    if value is None:
+        return {"isNull": True}
+    if isinstance(value, bool):
+        return {"booleanValue": value}
+    if isinstance(value, int):
+        return {"longValue": value}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (bytes, memoryview)):
+        return {"blobValue": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, (Decimal, date, datetime, time_of_day)):
+        # The Data API returns DECIMAL, DATE and TIMESTAMP values as strings too
+        return {"stringValue": str(value)}
+    if isinstance(value, (list, dict)):
+        return {"stringValue": json.dumps(value, default=str)}
+    return {"stringValue": str(value)}
+
+
+class ResultTooLargeError(Exception):
+    """Raised when a reader result exceeds the response size limit of the Data API"""
+
+
+def data_api_records(cursor, max_bytes: int = MAX_RESULT_BYTES, fetch_rows: int = FETCH_ROWS) -> List[list]:
+    """Rows of the cursor as Data API records, fetched in batches until max_bytes of JSON"""
+    records = []
+    size = 0
+    while True:
+        rows = cursor.fetchmany(fetch_rows)
+        if not rows:
+            return records
+        for row in rows:
+            record = [data_api_field(value) for value in row]
+            size += len(json.dumps(record))
+            if size > max_bytes:
+                raise ResultTooLargeError(
+                    f"Database returned more than the allowed response size limit of {max_bytes} bytes"
+                )
+            records.append(record)
+
+
+class ReaderExecutor:
+    """
+    Runs /execute queries on an Aurora reader over a direct connection, and returns None
+    when the query should run on the writer through the Data API instead: the replica lags
+    more than max_lag_ms, or the reader cannot be reached.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_lag_ms: float = 1000,
+        lag_check_seconds: float = 5,
+        retry_seconds: float = 30,
+        max_result_bytes: int = MAX_RESULT_BYTES,
+        connection_errors: tuple = CONNECTION_ERRORS,
+        conflict_errors: tuple = REPLICATION_CONFLICT_ERRORS,
+    ):
+        self.connect = connect
+        self.connection_errors = connection_errors
+        self.conflict_errors = conflict_errors
+        self.max_result_bytes = max_result_bytes
+        self.max_lag_ms = max_lag_ms
+        self.lag_check_seconds = lag_check_seconds
+        self.retry_seconds = retry_seconds
+        self.connection = None
+        self.lag_ms = None
+        self.lag_checked_at = 0.0
+        self.unavailable_until = 0.0
+        self._lock = threading.Lock()
+
+    def _cursor(self):
+        if self.connection is None or self.connection.closed:
+            self.connection = self.connect()
+            self.lag_checked_at = 0.0
+        return self.connection.cursor()
+
+    def _replica_lag_ms(self) -> float:
+        now = time.time()
+        if now - self.lag_checked_at >= self.lag_check_seconds:
+            with self._cursor() as cursor:
+                cursor.execute(REPLICA_LAG_QUERY)
+                row = cursor.fetchone()
+            self.lag_ms = float(row[0]) if row and row[0] is not None else 0.0
+            self.lag_checked_at = now
+        return self.lag_ms
+
+    def _fallback(self, reason: str) -> None:
+        emit_metrics({"ReaderFallbacks": 1}, {"Reason": reason})
+        return None
+
+    def _disconnect(self) -> None:
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        self.connection = None
+
+    def execute(self, query: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if time.time() < self.unavailable_until:
+                return self._fallback("unavailable")
+            try:
+                lag_ms = self._replica_lag_ms()
+                if lag_ms > self.max_lag_ms:
+                    print(f"Replica lag {lag_ms:.0f} ms exceeds {self.max_lag_ms:.0f} ms, using the writer")
+                    return self._fallback("lag")
+                with self._cursor() as cursor:
+                    cursor.execute(query)
+                    records = data_api_records(cursor, self.max_result_bytes)
+            except self.conflict_errors as e:
+                # Before the connection errors, TransactionRollbackError is an OperationalError
+                print(f"Query canceled by a replication conflict, using the writer: {str(e)}")
+                return self._fallback("conflict")
+            except self.connection_errors as e:
+                if isinstance(e, QUERY_CANCELED_ERRORS):
+                    raise
+                print(f"Reader unavailable, using the writer: {str(e)}")
+                self._disconnect()
+                self.unavailable_until = time.time() + self.retry_seconds
+                return self._fallback("error")
+            emit_metrics({"ReaderQueries": 1})
+            return {"records": records, "numberOfRecordsUpdated": 0}
+
+
+def readonly_credentials(secret_arn: str) -> Dict[str, str]:
+    import boto3
+
+    secret = boto3.client("secretsmanager").get_secret_value(SecretId=secret_arn)
+    return json.loads(secret["SecretString"])
+
+
+def create_reader_executor(
+    reader_endpoint: Optional[str], secret_arn: str, database: str
+) -> Optional[ReaderExecutor]:
+    """
+    Create the reader executor configured by the READER_* environment variables for a
+    database target. Returns None without a reader endpoint, or without psycopg2.
+    """
+    if not reader_endpoint:
+        return None
+    if psycopg2 is None:
+        print("psycopg2 is not available, /execute queries run on the writer")
+        return None
+
+    port = int(os.environ.get("READER_PORT", 5432))
+    connect_timeout = int(os.environ.get("READER_CONNECT_TIMEOUT_SECONDS", 3))
+
+    def connect():
+        # Read on every connect, the secret may have been rotated
+        credentials = readonly_credentials(secret_arn)
+        connection = psycopg2.connect(
+            host=reader_endpoint,
+            port=port,
+            dbname=database,
+            user=credentials["username"],
+            password=credentials["password"],
+            connect_timeout=connect_timeout,
+            sslmode="require",
+        )
+        connection.set_session(readonly=True, autocommit=True)
+        return connection
+
+    return ReaderExecutor(
+        connect,
+        max_lag_ms=float(os.environ.get("READER_MAX_LAG_MS", 1000)),
+        lag_check_seconds=float(os.environ.get("READER_LAG_CHECK_SECONDS", 5)),
+        retry_seconds=float(os.environ.get("READER_RETRY_SECONDS", 30)),
+    )
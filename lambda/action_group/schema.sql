@@ -1,22 +1,22 @@
--- Create schemas
-CREATE SCHEMA academics;
-CREATE SCHEMA staff;
-CREATE SCHEMA facilities;
-CREATE SCHEMA research;
--- Academics Schema
-CREATE TABLE academics.departments (
+-- Generated by scripts/migrations.py --sql, edit the migrations instead
+-- 0001_university_schema
+CREATE SCHEMA IF NOT EXISTS academics;
+CREATE SCHEMA IF NOT EXISTS staff;
+CREATE SCHEMA IF NOT EXISTS facilities;
+CREATE SCHEMA IF NOT EXISTS research;
+CREATE TABLE IF NOT EXISTS academics.departments (
     department_id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
     code VARCHAR(10) UNIQUE NOT NULL
 );
-CREATE TABLE academics.courses (
+CREATE TABLE IF NOT EXISTS academics.courses (
     course_id SERIAL PRIMARY KEY,
     department_id INTEGER REFERENCES academics.departments(department_id),
     code VARCHAR(20) UNIQUE NOT NULL,
     title VARCHAR(200) NOT NULL,
     credits INTEGER NOT NULL
 );
-CREATE TABLE academics.students (
+CREATE TABLE IF NOT EXISTS academics.students (
     student_id SERIAL PRIMARY KEY,
     first_name VARCHAR(50) NOT NULL,
     last_name VARCHAR(50) NOT NULL,
@@ -24,7 +24,7 @@ CREATE TABLE academics.students (
     enrollment_date DATE NOT NULL,
     major_department_id INTEGER REFERENCES academics.departments(department_id)
 );
-CREATE TABLE academics.enrollments (
+CREATE TABLE IF NOT EXISTS academics.enrollments (
     enrollment_id SERIAL PRIMARY KEY,
     student_id INTEGER REFERENCES academics.students(student_id),
     course_id INTEGER REFERENCES academics.courses(course_id),
@@ -32,8 +32,7 @@ CREATE TABLE academics.enrollments (
     year INTEGER NOT NULL,
     grade CHAR(2)
 );
--- Staff Schema
-CREATE TABLE staff.employees (
+CREATE TABLE IF NOT EXISTS staff.employees (
     employee_id SERIAL PRIMARY KEY,
     first_name VARCHAR(50) NOT NULL,
     last_name VARCHAR(50) NOT NULL,
@@ -41,35 +40,33 @@ CREATE TABLE staff.employees (
     hire_date DATE NOT NULL,
     position VARCHAR(100) NOT NULL
 );
-CREATE TABLE staff.salaries (
+CREATE TABLE IF NOT EXISTS staff.salaries (
     salary_id SERIAL PRIMARY KEY,
     employee_id INTEGER REFERENCES staff.employees(employee_id),
     amount DECIMAL(10, 2) NOT NULL,
     effective_date DATE NOT NULL
 );
--- Facilities Schema
-CREATE TABLE facilities.buildings (
+CREATE TABLE IF NOT EXISTS facilities.buildings (
     building_id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
     address VARCHAR(200) NOT NULL,
     construction_year INTEGER
 );
-CREATE TABLE facilities.rooms (
+CREATE TABLE IF NOT EXISTS facilities.rooms (
     room_id SERIAL PRIMARY KEY,
     building_id INTEGER REFERENCES facilities.buildings(building_id),
     room_number VARCHAR(20) NOT NULL,
     capacity INTEGER,
     room_type VARCHAR(50) NOT NULL
 );
-CREATE TABLE facilities.equipment (
+CREATE TABLE IF NOT EXISTS facilities.equipment (
     equipment_id SERIAL PRIMARY KEY,
     room_id INTEGER REFERENCES facilities.rooms(room_id),
     name VARCHAR(100) NOT NULL,
     purchase_date DATE,
     last_maintenance_date DATE
 );
--- Research Schema
-CREATE TABLE research.projects (
+CREATE TABLE IF NOT EXISTS research.projects (
     project_id SERIAL PRIMARY KEY,
     title VARCHAR(200) NOT NULL,
     description TEXT,
@@ -77,7 +74,7 @@ CREATE TABLE research.projects (
     end_date DATE,
     funding_amount DECIMAL(12, 2)
 );
-CREATE TABLE research.publications (
+CREATE TABLE IF NOT EXISTS research.publications (
     publication_id SERIAL PRIMARY KEY,
     title VARCHAR(200) NOT NULL,
     authors TEXT NOT NULL,
@@ -85,48 +82,100 @@ CREATE TABLE research.publications (
     journal VARCHAR(200),
     doi VARCHAR(100)
 );
-CREATE TABLE research.project_members (
+CREATE TABLE IF NOT EXISTS research.project_members (
     project_id INTEGER REFERENCES research.projects(project_id),
     employee_id INTEGER REFERENCES staff.employees(employee_id),
     role VARCHAR(50) NOT NULL,
     PRIMARY KEY (project_id, employee_id)
 );
--- Create indexes for performance
-CREATE INDEX idx_courses_department ON academics.courses(department_id);
-CREATE INDEX idx_enrollments_student ON academics.enrollments(student_id);
-CREATE INDEX idx_enrollments_course ON academics.enrollments(course_id);
-CREATE INDEX idx_salaries_employee ON staff.salaries(employee_id);
-CREATE INDEX idx_rooms_building ON facilities.rooms(building_id);
-CREATE INDEX idx_equipment_room ON facilities.equipment(room_id);
-CREATE INDEX idx_project_members_project ON research.project_members(project_id);
-CREATE INDEX idx_project_members_employee ON research.project_members(employee_id);
--- Add some sample data
-INSERT INTO academics.departments (name, code) VALUES 
-('Computer Science', 'CS'),
-('Physics', 'PHY'),
-('Biology', 'BIO');
-INSERT INTO academics.courses (department_id, code, title, credits) VALUES
-(1, 'CS101', 'Introduction to Programming', 3),
-(2, 'PHY201', 'Classical Mechanics', 4),
-(3, 'BIO301', 'Genetics', 4);
-INSERT INTO academics.students (first_name, last_name, date_of_birth, enrollment_date, major_department_id) VALUES
-('Alice', 'Johnson', '2000-05-15', '2022-09-01', 1),
-('Bob', 'Smith', '2001-03-22', '2022-09-01', 2);
-INSERT INTO staff.employees (first_name, last_name, email, hire_date, position) VALUES
-('John', 'Doe', 'john.doe@university.edu', '2015-08-01', 'Professor'),
-('Jane', 'Doe', 'jane.doe@university.edu', '2018-01-15', 'Associate Professor');
-INSERT INTO facilities.buildings (name, address, construction_year) VALUES
-('Science Building', '123 University Ave', 1985),
-('Library', '456 Campus Road', 1990);
-INSERT INTO research.projects (title, description, start_date, end_date, funding_amount) VALUES
-('AI in Education', 'Exploring AI applications in higher education', '2023-01-01', '2025-12-31', 500000.00),
-('Quantum Computing Advances', 'Research on quantum algorithms', '2022-07-01', '2024-06-30', 750000.00);
+CREATE INDEX IF NOT EXISTS idx_courses_department ON academics.courses(department_id);
+CREATE INDEX IF NOT EXISTS idx_enrollments_student ON academics.enrollments(student_id);
+CREATE INDEX IF NOT EXISTS idx_enrollments_course ON academics.enrollments(course_id);
+CREATE INDEX IF NOT EXISTS idx_salaries_employee ON staff.salaries(employee_id);
+CREATE INDEX IF NOT EXISTS idx_rooms_building ON facilities.rooms(building_id);
+CREATE INDEX IF NOT EXISTS idx_equipment_room ON facilities.equipment(room_id);
+CREATE INDEX IF NOT EXISTS idx_project_members_project ON research.project_members(project_id);
+CREATE INDEX IF NOT EXISTS idx_project_members_employee ON research.project_members(employee_id);
+-- 0002_readonly_role_grants
+GRANT USAGE ON SCHEMA academics TO readonly_role;
+GRANT SELECT ON ALL TABLES IN SCHEMA academics TO readonly_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA academics GRANT SELECT ON TABLES TO readonly_role;
+GRANT USAGE ON SCHEMA staff TO readonly_role;
+GRANT SELECT ON ALL TABLES IN SCHEMA staff TO readonly_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA staff GRANT SELECT ON TABLES TO readonly_role;
+GRANT USAGE ON SCHEMA facilities TO readonly_role;
+GRANT SELECT ON ALL TABLES IN SCHEMA facilities TO readonly_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA facilities GRANT SELECT ON TABLES TO readonly_role;
+GRANT USAGE ON SCHEMA research TO readonly_role;
+GRANT SELECT ON ALL TABLES IN SCHEMA research TO readonly_role;
+ALTER DEFAULT PRIVILEGES IN SCHEMA research GRANT SELECT ON TABLES TO readonly_role;
+-- 0003_schema_version_triggers
+CREATE SCHEMA IF NOT EXISTS agent_meta;
+CREATE TABLE IF NOT EXISTS agent_meta.schema_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    pruned_below BIGINT NOT NULL DEFAULT 0,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS agent_meta.schema_changes (
+    version BIGINT NOT NULL,
+    relation TEXT,
+    command_tag TEXT NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS schema_changes_version_idx ON agent_meta.schema_changes (version);
+INSERT INTO agent_meta.schema_version (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
+CREATE OR REPLACE FUNCTION agent_meta.record_ddl_command() RETURNS event_trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog AS $$
+DECLARE
+    new_version BIGINT;
+BEGIN
+    UPDATE agent_meta.schema_version SET version = version + 1, changed_at = now()
+    RETURNING version INTO new_version;
+
+    INSERT INTO agent_meta.schema_changes (version, relation, command_tag)
+    SELECT new_version, n.nspname || '.' || c.relname, cmd.command_tag
+    FROM pg_event_trigger_ddl_commands() cmd
+    LEFT JOIN pg_index i ON i.indexrelid = cmd.objid
+    JOIN pg_class c ON c.oid = COALESCE(i.indrelid, cmd.objid)
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE cmd.classid = 'pg_class'::regclass AND n.nspname <> 'agent_meta';
 
-INSERT INTO research.publications (title, authors, publication_date, journal, doi) VALUES
-('AI in Higher Education: Challenges and Opportunities', 'John Doe, Jane Smith', '2023-03-15', 'Journal of Higher Education', '10.1000/12345'),
-('Quantum Algorithms: A Survey', 'Alice Johnson, Bob Smith', '2022-09-01', 'Journal of Quantum Computing', '10.1000/67890');
+    IF new_version % 100 = 0 THEN
+        DELETE FROM agent_meta.schema_changes WHERE version <= new_version - 1000;
+        UPDATE agent_meta.schema_version SET pruned_below = GREATEST(new_version - 1000, 0);
+    END IF;
+END
+$$;
+CREATE OR REPLACE FUNCTION agent_meta.record_dropped_objects() RETURNS event_trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog AS $$
+DECLARE
+    next_version BIGINT;
+BEGIN
+    SELECT version + 1 INTO next_version FROM agent_meta.schema_version FOR UPDATE;
 
-INSERT INTO research.project_members (project_id, employee_id, role) VALUES
-(1, 1, 'Principal Investigator'),
-(1, 2, 'Co-Investigator'),
-(2, 2, 'Principal Investigator');
\ No newline at end of file
+    INSERT INTO agent_meta.schema_changes (version, relation, command_tag)
+    SELECT next_version,
+        CASE WHEN d.object_type = 'table column'
+            THEN regexp_replace(d.object_identity, '\.[^.]+$', '')
+            ELSE d.object_identity END,
+        tg_tag
+    FROM pg_event_trigger_dropped_objects() d
+    WHERE d.object_type IN ('table', 'view', 'materialized view', 'table column')
+        AND d.schema_name <> 'agent_meta';
+END
+$$;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'agent_meta_ddl_command_end') THEN
+        CREATE EVENT TRIGGER agent_meta_ddl_command_end ON ddl_command_end
+            EXECUTE FUNCTION agent_meta.record_ddl_command();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'agent_meta_sql_drop') THEN
+        CREATE EVENT TRIGGER agent_meta_sql_drop ON sql_drop
+            EXECUTE FUNCTION agent_meta.record_dropped_objects();
+    END IF;
+END
+$$;
+GRANT USAGE ON SCHEMA agent_meta TO readonly_role;
+GRANT SELECT ON agent_meta.schema_version, agent_meta.schema_changes TO readonly_role;
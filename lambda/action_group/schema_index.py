@@ -0,0 +1,69 @@
+import re
+from typing import Dict, List, Set
+
+from schema_model import SchemaSource, as_compact_schema
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Column name tokens too common to tell tables apart
+GENERIC_COLUMN_TOKENS = {"id", "name", "code", "title", "date", "type", "description"}
+
+
+def normalize_token(token: str) -> str:
+    """Cheap singularization so that "courses" matches "course" and "facilities" "facility" """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("sses"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [normalize_token(t) for t in WORD_PATTERN.findall(text.lower())]
+
+
+class SchemaIndex:
+    """
+    Token index over table and column names of the cached schema, used to find the tables
+    a question refers to without calling a model.
+    """
+
+    def __init__(self, schema: SchemaSource):
+        self.table_tokens = {}
+        self.column_tokens = {}
+        for table in as_compact_schema(schema):
+            self.table_tokens[table.key] = set(tokenize(table.name))
+            self.column_tokens[table.key] = {
+                token for name in table.column_names() for token in tokenize(name)
+            }
+
+    @property
+    def tables(self) -> List[str]:
+        return list(self.table_tokens)
+
+    def score_tables(self, question: str) -> Dict[str, int]:
+        """
+        Relevance of each table to the question: 2 per table name token and 1 per column name
+        token found in the question. Generic tokens like "id" or "name" are ignored for columns.
+        """
+        words = set(tokenize(question))
+        scores = {}
+        for key, name_tokens in self.table_tokens.items():
+            score = 2 * len(name_tokens & words)
+            score += len((self.column_tokens[key] - GENERIC_COLUMN_TOKENS) & words)
+            if score:
+                scores[key] = score
+        return scores
+
+    def referenced_tables(self, question: str) -> List[str]:
+        """Tables whose name is mentioned in the question, most relevant first"""
+        words = set(tokenize(question))
+        scores = self.score_tables(question)
+        named = [key for key in scores if self.table_tokens[key] & words]
+        return sorted(named, key=lambda key: -scores[key])
+
+    def related_tables(self, question: str) -> Set[str]:
+        """Tables referenced by name or through one of their columns"""
+        return set(self.score_tables(question))
@@ -0,0 +1,210 @@
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+# Column flags, one byte per column
+NOT_NULL = 1
+PRIMARY_KEY = 2
+FOREIGN_KEY = 4
+UNIQUE = 8
+CHECK = 16
+
+# Constraint types of information_schema.table_constraints, in rendering order
+CONSTRAINT_FLAGS = {
+    "PRIMARY KEY": PRIMARY_KEY,
+    "FOREIGN KEY": FOREIGN_KEY,
+    "UNIQUE": UNIQUE,
+    "CHECK": CHECK,
+}
+
+
+def table_key(row: Dict[str, Any]) -> str:
+    """Qualified table name of a schema row, e.g. academics.courses"""
+    if row.get("table_schema"):
+        return f"{row['table_schema']}.{row['table_name']}"
+    return row["table_name"]
+
+
+class StringTable:
+    """
+    Interned strings referenced by integer id: each column name, type and constraint name is
+    stored once however many tables repeat it. Append-only, so ids stay valid across schema
+    refreshes that share the table.
+    """
+
+    __slots__ = ("strings", "ids")
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def id(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            value = sys.intern(value)
+            self.strings.append(value)
+            self.ids[value] = string_id
+        return string_id
+
+    def __getitem__(self, string_id: int) -> str:
+        return self.strings[string_id]
+
+
+class Column:
+    """A column of a table, built on demand from the arrays of its table"""
+
+    __slots__ = ("name", "data_type", "flags", "default")
+
+    def __init__(self, name: str, data_type: str, flags: int, default: Optional[str]):
+        self.name = name
+        self.data_type = data_type
+        self.flags = flags
+        self.default = default
+
+    @property
+    def constraint_types(self) -> List[str]:
+        return [name for name, flag in CONSTRAINT_FLAGS.items() if self.flags & flag]
+
+
+class Table:
+    """
+    A table with its columns kept in parallel arrays of string ids and flags, and the index
+    of each column by name id. Defaults and foreign keys are only allocated for tables that
+    have them.
+    """
+
+    __slots__ = (
+        "strings", "key", "schema", "name", "names", "positions", "types", "flags", "defaults", "foreign_keys"
+    )
+
+    def __init__(self, strings: StringTable, schema: Optional[str], name: str):
+        self.strings = strings
+        self.schema = sys.intern(schema or "")
+        self.name = sys.intern(name)
+        self.key = sys.intern(f"{schema}.{name}" if schema else name)
+        self.names = array("I")
+        # Name id -> column index
+        self.positions = {}
+        self.types = array("I")
+        self.flags = array("B")
+        # Column index -> default expression
+        self.defaults = None
+        # Pairs of column index and constraint name id
+        self.foreign_keys = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def column_index(self, name_id: int) -> int:
+        return self.positions.get(name_id, -1)
+
+    def add_row(self, row: Dict[str, Any]) -> None:
+        """Add the column of an introspection row, or the constraint of a known column"""
+        name_id = self.strings.id(row["column_name"])
+        index = self.column_index(name_id)
+        if index < 0:
+            index = self.positions[name_id] = len(self.names)
+            self.names.append(name_id)
+            self.types.append(self.strings.id(row.get("data_type") or ""))
+            self.flags.append(NOT_NULL if row.get("is_nullable") == "NO" else 0)
+            if row.get("column_default"):
+                if self.defaults is None:
+                    self.defaults = {}
+                self.defaults[index] = row["column_default"]
+
+        flag = CONSTRAINT_FLAGS.get(row.get("constraint_type"), 0)
+        self.flags[index] |= flag
+        if flag == FOREIGN_KEY and row.get("constraint_name"):
+            if self.foreign_keys is None:
+                self.foreign_keys = array("I")
+            self.foreign_keys.extend((index, self.strings.id(row["constraint_name"])))
+
+    def column_names(self) -> Iterator[str]:
+        return (self.strings[name_id] for name_id in self.names)
+
+    def columns(self) -> Iterator[Column]:
+        defaults = self.defaults or {}
+        for index, name_id in enumerate(self.names):
+            yield Column(
+                self.strings[name_id],
+                self.strings[self.types[index]],
+                self.flags[index],
+                defaults.get(index),
+            )
+
+    def size_bytes(self) -> int:
+        size = sys.getsizeof(self) + sys.getsizeof(self.key)
+        size += sum(sys.getsizeof(a) for a in (self.names, self.positions, self.types, self.flags))
+        if self.defaults:
+            size += sys.getsizeof(self.defaults)
+            size += sum(sys.getsizeof(d) for d in self.defaults.values())
+        if self.foreign_keys is not None:
+            size += sys.getsizeof(self.foreign_keys)
+        return size
+
+
+class CompactSchema:
+    """
+    The cached schema as one Table per relation instead of one dict per column and
+    constraint row. Iterating yields the tables in introspection order.
+    """
+
+    __slots__ = ("strings", "tables")
+
+    def __init__(self, strings: Optional[StringTable] = None):
+        self.strings = strings or StringTable()
+        self.tables = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], strings: Optional[StringTable] = None) -> "CompactSchema":
+        schema = cls(strings)
+        for row in rows or []:
+            schema.add_row(row)
+        return schema
+
+    def add_row(self, row: Dict[str, Any]) -> None:
+        key = table_key(row)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = Table(self.strings, row.get("table_schema"), row["table_name"])
+        if row.get("column_name"):
+            table.add_row(row)
+
+    def replace(self, relations: Set[str], rows: Iterable[Dict[str, Any]]) -> "CompactSchema":
+        """
+        A new schema with the tables of the changed relations replaced by the rows
+        re-introspected for them. Dropped relations simply have no rows.
+        """
+        changed = CompactSchema.from_rows(rows, self.strings)
+        tables = {key: table for key, table in self.tables.items() if key not in relations}
+        tables.update(changed.tables)
+        changed.tables = dict(sorted(tables.items()))
+        return changed
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def __iter__(self) -> Iterator[Table]:
+        return iter(self.tables.values())
+
+    def size_bytes(self) -> int:
+        """Estimated memory of the tables, their arrays and the interned strings"""
+        return (
+            sys.getsizeof(self.tables)
+            + sum(table.size_bytes() for table in self.tables.values())
+            + sys.getsizeof(self.strings.strings)
+            + sys.getsizeof(self.strings.ids)
+            + sum(sys.getsizeof(s) for s in self.strings.strings)
+        )
+
+
+# The compact model, or introspection rows as returned by the Data API
+SchemaSource = Union[CompactSchema, Iterable[Dict[str, Any]], None]
+
+
+def as_compact_schema(schema: SchemaSource) -> CompactSchema:
+    """The schema itself, or the compact model of introspection rows"""
+    if isinstance(schema, CompactSchema):
+        return schema
+    return CompactSchema.from_rows(schema)
@@ -0,0 +1,53 @@
+import json
+from typing import Dict, List, Optional, Set, Tuple
+
+from schema_model import NOT_NULL, Column, SchemaSource, as_compact_schema
+
+
+def render_column(
+    column: Column, include_defaults: bool = True, include_nullability: bool = True
+) -> str:
+    """Render one column as e.g. "department_id integer not null default nextval(...) PRIMARY KEY" """
+    parts = [column.name, column.data_type]
+    if include_nullability and column.flags & NOT_NULL:
+        parts.append("not null")
+    if include_defaults and column.default:
+        parts.append(f"default {column.default}")
+    return " ".join(p for p in parts if p)
+
+
+def render_values(values: List[str]) -> str:
+    """Render stored values as an SQL list, e.g. "in ('Professor','Lecturer')" """
+    return "in (" + ",".join("'" + v.replace("'", "''") + "'" for v in values) + ")"
+
+
+def render_schema(
+    schema: SchemaSource,
+    include_defaults: bool = True,
+    include_nullability: bool = True,
+    tables: Optional[Set[str]] = None,
+    column_values: Optional[Dict[Tuple[str, str], List[str]]] = None,
+    table_notes: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Render the schema as compact JSON mapping each table to its columns, optionally
+    without column defaults or nullability and limited to the given tables.
+    Constraints of a column, e.g. PRIMARY KEY or FOREIGN KEY, are appended to it, and so
+    are the stored values of low-cardinality columns found in column_values.
+    A table's note from table_notes, e.g. its row estimate and indexes, is its first entry.
+    """
+    result = {}
+    for table in as_compact_schema(schema):
+        key = table.key
+        if tables is not None and key not in tables:
+            continue
+        columns = []
+        if table_notes and table_notes.get(key):
+            columns.append(table_notes[key])
+        for column in table.columns():
+            text = render_column(column, include_defaults, include_nullability)
+            if column_values and (key, column.name) in column_values:
+                text += " " + render_values(column_values[(key, column.name)])
+            columns.append(" ".join([text] + column.constraint_types))
+        result[key] = columns
+    return json.dumps(result, separators=(",", ":"))
@@ -0,0 +1,92 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+VERSION_QUERY = "SELECT version, pruned_below FROM agent_meta.schema_version"
+CHANGES_QUERY = """
+SELECT DISTINCT relation FROM agent_meta.schema_changes
+WHERE version > {since} AND version <= {until} AND relation IS NOT NULL
+"""
+
+
+@dataclass
+class SchemaChange:
+    """Relations changed since the last check, or full=True when they cannot be listed"""
+
+    version: int
+    full: bool = False
+    relations: Set[str] = field(default_factory=set)
+
+
+class SchemaWatcher:
+    """
+    Detects DDL through the version row maintained by the agent_meta event triggers. The
+    row is read at most every check_seconds. When the triggers are not installed, the
+    watcher disables itself and the schema stays as loaded at init.
+    """
+
+    def __init__(self, fetch: Callable[[str], List[Dict[str, Any]]], check_seconds: int = 30, max_relations: int = 200):
+        self.fetch = fetch
+        self.check_seconds = check_seconds
+        self.max_relations = max_relations
+        self.version = None
+        self.checked_at = 0.0
+        self.enabled = True
+
+    def read_version(self) -> Optional[Tuple[int, int]]:
+        """The current version and the oldest version with a change log"""
+        try:
+            row = self.fetch(VERSION_QUERY)[0]
+            return int(row["version"]), int(row["pruned_below"])
+        except Exception as e:
+            print(f"Schema version not available: {str(e)}")
+            return None
+
+    def start(self) -> None:
+        """Read the current version, to be called before the schema is introspected"""
+        current = self.read_version()
+        if current is None:
+            print("Schema changes are not tracked, install the agent_meta event triggers")
+            self.enabled = False
+            return
+        self.version = current[0]
+        self.checked_at = time.time()
+
+    def check(self) -> Optional[SchemaChange]:
+        """The change since the last check, None when nothing changed or it is not time yet"""
+        if not self.enabled or time.time() - self.checked_at < self.check_seconds:
+            return None
+        self.checked_at = time.time()
+
+        current = self.read_version()
+        if current is None or current[0] == self.version:
+            return None
+
+        version, pruned_below = current
+        if self.version is None or self.version < pruned_below:
+            change = SchemaChange(version, full=True)
+        else:
+            rows = self.fetch(CHANGES_QUERY.format(since=self.version, until=version))
+            relations = {r["relation"] for r in rows}
+            if len(relations) > self.max_relations:
+                change = SchemaChange(version, full=True)
+            else:
+                change = SchemaChange(version, relations=relations)
+
+        print(
+            f"Schema version {self.version} -> {version}: "
+            + ("full reload" if change.full else f"changed {sorted(change.relations)}")
+        )
+        self.version = version
+        return change
+
+
+def create_schema_watcher(fetch: Callable[[str], List[Dict[str, Any]]]) -> Optional[SchemaWatcher]:
+    """Create the watcher configured by the SCHEMA_VERSION_* environment variables"""
+    check_seconds = os.environ.get("SCHEMA_VERSION_CHECK_SECONDS")
+    if not check_seconds:
+        return None
+    watcher = SchemaWatcher(fetch, check_seconds=int(check_seconds))
+    watcher.start()
+    return watcher
@@ -0,0 +1,160 @@
+import os
+import re
+import time
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from metrics import emit_metrics
+
+TABLE_REFERENCE_PATTERN = re.compile(
+    r"\b(?:from|join)\s+((?:\"?[a-z_][\w$]*\"?\.)?\"?[a-z_][\w$]*\"?)", re.IGNORECASE
+)
+
+SQL_FENCE_PATTERN = re.compile(r"^```[a-zA-Z]*\s*(.*?)\s*```$", re.DOTALL)
+LEADING_COMMENT_PATTERN = re.compile(r"^\s*(--[^\n]*(\n|$)|/\*.*?\*/)", re.DOTALL)
+
+
+def normalize_sql(text: str) -> str:
+    """The SQL of a model response without a Markdown fence, leading comments and whitespace"""
+    text = text.strip()
+    fenced = SQL_FENCE_PATTERN.match(text)
+    if fenced:
+        text = fenced.group(1)
+    while True:
+        comment = LEADING_COMMENT_PATTERN.match(text)
+        if not comment:
+            return text.strip()
+        text = text[comment.end():]
+
+
+def referenced_tables(sql: str, known_tables: Iterable[str]) -> Set[str]:
+    """Qualified names of the known tables that appear after FROM or JOIN in the SQL"""
+    by_name = {}
+    known = set(known_tables)
+    for key in known:
+        by_name.setdefault(key.split(".")[-1], set()).add(key)
+
+    tables = set()
+    for reference in TABLE_REFERENCE_PATTERN.findall(sql):
+        reference = reference.replace('"', "").lower()
+        if reference in known:
+            tables.add(reference)
+        else:
+            tables.update(by_name.get(reference.split(".")[-1], set()))
+    return tables
+
+
+def correction_message(sql: str, error: str, table_definitions: str) -> str:
+    return f"""
+    The SQL query below failed to run on PostgreSQL.
+    <sql>{sql}</sql>
+    <error>{error}</error>
+    These are the definitions of the relevant tables:
+    <database_schema>{table_definitions}</database_schema>
+    Return only the corrected SQL query without any explanations.
+    """
+
+
+class SelfCorrector:
+    """
+    Validates generated SQL with a cheap EXPLAIN and, on error, re-prompts the model with
+    the PostgreSQL error and the relevant table definitions, within the same invocation.
+    The number of re-prompts is bounded and none is started that would not finish before
+    the deadline.
+    """
+
+    def __init__(
+        self,
+        explain: Callable[[str], None],
+        max_attempts: int = 2,
+        validate: Optional[Callable[[str], bool]] = None,
+    ):
+        self.explain = explain
+        self.max_attempts = max_attempts
+        self.validate = validate
+
+    def check(self, sql: str) -> Optional[str]:
+        """Return the EXPLAIN error of the SQL, or None when it plans fine"""
+        statement = normalize_sql(sql).rstrip(";").strip()
+        if ";" in statement:
+            return "Only a single SQL statement is allowed"
+        # EXPLAIN must never become EXPLAIN ANALYZE or take an option list from the model
+        # output, which would execute the statement
+        if not statement.lower().startswith(("select", "with")):
+            return "Only a single SELECT or WITH query is allowed"
+        if self.validate is not None:
+            try:
+                self.validate(statement)
+            except ValueError as e:
+                return str(e)
+        try:
+            self.explain(f"EXPLAIN {statement}")
+            return None
+        except Exception as e:
+            return str(e)
+
+    def run(
+        self,
+        sql: str,
+        messages: List[dict],
+        regenerate: Callable[[List[dict]], str],
+        table_definitions: Callable[[str], str],
+        deadline: Optional[float] = None,
+        generation_seconds: float = 0.0,
+    ) -> Tuple[str, int, bool]:
+        """
+        Return the final SQL, the number of correction attempts and whether it passed EXPLAIN.
+        generation_seconds is the duration of the first generation, used to check the deadline.
+        """
+        attempts = 0
+        error = self.check(sql)
+        initially_valid = error is None
+
+        while error is not None and attempts < self.max_attempts:
+            if deadline is not None and time.time() + generation_seconds > deadline:
+                print("Not enough time left for another correction attempt")
+                break
+
+            attempts += 1
+            print(f"Correction attempt {attempts} for error: {error}")
+            messages = messages + [
+                {"role": "assistant", "content": [{"type": "text", "text": sql}]},
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": correction_message(sql, error, table_definitions(sql)),
+                        }
+                    ],
+                },
+            ]
+            started = time.time()
+            sql = regenerate(messages).strip()
+            generation_seconds = max(generation_seconds, time.time() - started)
+            error = self.check(sql)
+
+        valid = error is None
+        emit_metrics(
+            {
+                "GeneratedQueries": 1,
+                "ExplainFailures": int(not initially_valid),
+                "CorrectionAttempts": attempts,
+                "Corrected": int(not initially_valid and valid),
+                "Uncorrected": int(not valid),
+            },
+            {"Component": "SelfCorrection"},
+        )
+        return sql, attempts, valid
+
+
+def create_self_corrector(
+    explain: Callable[[str], None], validate: Optional[Callable[[str], bool]] = None
+) -> Optional[SelfCorrector]:
+    """
+    Create the self corrector configured by the SELF_CORRECTION_* environment variables.
+    validate raises ValueError for queries that must not even be explained.
+    """
+    max_attempts = int(os.environ.get("SELF_CORRECTION_MAX_ATTEMPTS", 0))
+    if max_attempts <= 0:
+        return None
+    return SelfCorrector(explain, max_attempts, validate)
@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from background_refresh import BackgroundRefresher
+from metrics import emit_metrics
+from schema_model import table_key
+
+# One cheap catalog query per refresh. The index signature changes when an index is created
+# or dropped, and only those tables have their index definitions read again.
+TABLES_QUERY = """
+SELECT
+    c.oid::bigint AS table_oid,
+    n.nspname AS table_schema,
+    c.relname AS table_name,
+    c.reltuples::bigint AS row_estimate,
+    COALESCE(
+        (SELECT string_agg(i.indexrelid::text, ',' ORDER BY i.indexrelid) FROM pg_index i WHERE i.indrelid = c.oid),
+        ''
+    ) AS index_signature
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p') AND n.nspname NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
+"""
+
+INDEXES_QUERY = """
+SELECT
+    i.indrelid::bigint AS table_oid,
+    ic.relname AS index_name,
+    i.indisprimary AS is_primary,
+    i.indisunique AS is_unique,
+    am.amname AS method,
+    array_to_json(ARRAY(
+        SELECT pg_get_indexdef(i.indexrelid, k, true) FROM generate_series(1, i.indnkeyatts) k ORDER BY k
+    ))::text AS index_columns
+FROM pg_index i
+JOIN pg_class ic ON ic.oid = i.indexrelid
+JOIN pg_am am ON am.oid = ic.relam
+WHERE i.indrelid IN ({table_oids}) AND i.indisvalid
+ORDER BY i.indrelid, i.indisprimary DESC, ic.relname
+"""
+
+
+@dataclass
+class IndexInfo:
+    columns: List[str]
+    unique: bool = False
+    method: str = "btree"
+
+
+@dataclass
+class TableStats:
+    """Planner facts of a table that should shape the generated SQL"""
+
+    row_estimate: int
+    primary_key: List[str] = field(default_factory=list)
+    indexes: List[IndexInfo] = field(default_factory=list)
+
+
+def format_rows(count: int) -> str:
+    if count >= 1_000_000:
+        return f"{count / 1_000_000:.1f}M"
+    if count >= 10_000:
+        return f"{count // 1000}k"
+    return str(count)
+
+
+def render_table_stats(stats: TableStats) -> Optional[str]:
+    """
+    Render as e.g. "-- ~1.2M rows; pk (enrollment_id); indexed (student_id), (course_id, year)",
+    None when there is nothing to say, e.g. for a never analyzed table without indexes
+    """
+    parts = []
+    if stats.row_estimate >= 0:  # -1 until the table is first analyzed
+        parts.append(f"~{format_rows(stats.row_estimate)} rows")
+    if stats.primary_key:
+        parts.append(f"pk ({', '.join(stats.primary_key)})")
+    if stats.indexes:
+        parts.append(
+            "indexed "
+            + ", ".join(
+                f"({', '.join(index.columns)})"
+                + (" unique" if index.unique else "")
+                + (f" {index.method}" if index.method != "btree" else "")
+                for index in stats.indexes
+            )
+        )
+    return "-- " + "; ".join(parts) if parts else None
+
+
+class TableStatistics(BackgroundRefresher):
+    """
+    Row estimates (pg_class.reltuples), primary-key column order and index definitions of the
+    user tables, refreshed incrementally in the background, rendered as one note per table.
+    """
+
+    name = "table statistics"
+
+    def __init__(self, fetch: Callable[[str], List[Dict[str, Any]]], ttl_seconds: int = 600):
+        super().__init__(ttl_seconds)
+        self.fetch = fetch
+        self.stats = {}
+        self.signatures = {}
+        self.rendered = {}
+
+    def load_indexes(self, table_oids: Dict[int, str]) -> Dict[str, Tuple[List[str], List[IndexInfo]]]:
+        """Primary key and other indexes of the given tables, keyed by table name"""
+        indexes = {key: ([], []) for key in table_oids.values()}
+        rows = self.fetch(
+            INDEXES_QUERY.format(table_oids=",".join(str(int(oid)) for oid in table_oids))
+        )
+        for row in rows:
+            key = table_oids[int(row["table_oid"])]
+            columns = row["index_columns"]
+            if isinstance(columns, str):
+                columns = json.loads(columns)
+            if row["is_primary"]:
+                indexes[key][0].extend(columns)
+            else:
+                indexes[key][1].append(
+                    IndexInfo(columns, bool(row["is_unique"]), row.get("method") or "btree")
+                )
+        return indexes
+
+    def refresh(self) -> None:
+        started = time.monotonic()
+        stats = {}
+        signatures = {}
+        changed = {}
+        for row in self.fetch(TABLES_QUERY):
+            key = table_key(row)
+            signatures[key] = row["index_signature"]
+            previous = self.stats.get(key)
+            stats[key] = TableStats(
+                int(row["row_estimate"]),
+                previous.primary_key if previous else [],
+                previous.indexes if previous else [],
+            )
+            if previous is None or self.signatures.get(key) != row["index_signature"]:
+                changed[int(row["table_oid"])] = key
+
+        if changed:
+            for key, (primary_key, indexes) in self.load_indexes(changed).items():
+                stats[key].primary_key = primary_key
+                stats[key].indexes = indexes
+
+        self.stats = stats
+        self.signatures = signatures
+        rendered = {key: render_table_stats(s) for key, s in stats.items()}
+        self.rendered = {key: note for key, note in rendered.items() if note}
+        elapsed = time.monotonic() - started
+        print(f"Refreshed statistics of {len(stats)} tables, indexes of {len(changed)} reloaded")
+        emit_metrics(
+            {"StatsTables": len(stats), "StatsIndexReloads": len(changed), "StatsRefreshMs": elapsed * 1000},
+            {"Component": "TableStats"},
+            units={"StatsRefreshMs": "Milliseconds"},
+        )
+
+    def size_bytes(self) -> int:
+        """Estimated memory of the statistics, index signatures and rendered notes"""
+        stats, rendered = self.stats, self.rendered
+        size = sum(sys.getsizeof(d) for d in (stats, self.signatures, rendered))
+        size += sum(sys.getsizeof(s) for s in self.signatures.values())
+        size += sum(sys.getsizeof(note) for note in rendered.values())
+        for table in stats.values():
+            size += sys.getsizeof(table) + sys.getsizeof(table.primary_key) + sys.getsizeof(table.indexes)
+            size += sum(sys.getsizeof(index) + sys.getsizeof(index.columns) for index in table.indexes)
+        return size
+
+    def notes(self) -> Dict[str, str]:
+        """Rendered statistics per table, triggering a background refresh when they are stale"""
+        self.refresh_if_stale()
+        return self.rendered
+
+
+def create_table_statistics(fetch: Callable[[str], List[Dict[str, Any]]]) -> Optional[TableStatistics]:
+    """Create the table statistics configured by the TABLE_STATS_* environment variables"""
+    if os.environ.get("TABLE_STATS_ENABLED", "false").lower() != "true":
+        return None
+
+    statistics = TableStatistics(fetch, ttl_seconds=int(os.environ.get("TABLE_STATS_TTL_SECONDS", 600)))
+    statistics.start_refresh()
+    return statistics
@@ -0,0 +1,113 @@
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import emit_metrics
+from schema_index import SchemaIndex
+from schema_model import SchemaSource, as_compact_schema
+from schema_render import render_schema
+
+# Schema detail dropped step by step until the prompt fits the token budget
+TRIM_LEVELS = [
+    ("full", {}),
+    ("no_defaults", {"include_defaults": False}),
+    ("no_nullability", {"include_defaults": False, "include_nullability": False}),
+    (
+        "related_tables",
+        {"include_defaults": False, "include_nullability": False, "related_only": True},
+    ),
+]
+
+
+class TokenEstimator:
+    """
+    Estimates the token count of a prompt from its length, with a characters-per-token ratio
+    calibrated against the usage.input_tokens reported by Bedrock.
+    """
+
+    def __init__(self, chars_per_token: float = 3.5, smoothing: float = 0.2):
+        self.chars_per_token = chars_per_token
+        self.smoothing = smoothing
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1
+
+    def calibrate(self, text: str, input_tokens: int) -> None:
+        """Move the ratio towards the one observed for this prompt (exponential moving average)"""
+        if not input_tokens:
+            return
+        observed = len(text) / input_tokens
+        with self._lock:
+            if self.samples == 0:
+                self.chars_per_token = observed
+            else:
+                self.chars_per_token += self.smoothing * (observed - self.chars_per_token)
+            self.samples += 1
+
+
+def fit_prompt(
+    schema: SchemaSource,
+    question: str,
+    build_prompt: Callable[[str], str],
+    estimator: TokenEstimator,
+    budget: Optional[int],
+    schema_index: Optional[SchemaIndex] = None,
+    column_values: Optional[Dict[Tuple[str, str], List[str]]] = None,
+    table_notes: Optional[Dict[str, str]] = None,
+) -> Tuple[str, str, int]:
+    """
+    Build the prompt with the most schema detail that fits the token budget.
+    Returns the prompt, the trim level used and its estimated token count. When even the
+    smallest schema does not fit, that prompt is returned and Bedrock decides.
+    Column values and table notes are rendered for the tables kept at each level.
+    """
+    schema = as_compact_schema(schema)
+    related = None
+    for level, options in TRIM_LEVELS:
+        options = dict(options)
+        if options.pop("related_only", False):
+            if schema_index is None:
+                continue
+            related = related or schema_index.related_tables(question)
+            if not related:
+                continue
+            options["tables"] = related
+        prompt = build_prompt(
+            render_schema(
+                schema, column_values=column_values, table_notes=table_notes, **options
+            )
+        )
+        estimated = estimator.estimate(prompt)
+        if budget is None or estimated <= budget:
+            return prompt, level, estimated
+
+    print(f"Prompt of {estimated} estimated tokens exceeds the budget of {budget} tokens")
+    return prompt, level, estimated
+
+
+def record_token_usage(
+    estimator: TokenEstimator, prompt: str, estimated: int, trim_level: str, usage: Dict[str, Any]
+) -> None:
+    """Calibrate the estimator and publish estimated and actual token counts"""
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    estimator.calibrate(prompt, input_tokens)
+    print(
+        f"Token usage: estimated={estimated} input={input_tokens} output={output_tokens} "
+        f"trim_level={trim_level} chars_per_token={estimator.chars_per_token:.2f}"
+    )
+    emit_metrics(
+        {
+            "EstimatedInputTokens": estimated,
+            "InputTokens": input_tokens,
+            "OutputTokens": output_tokens,
+        },
+        {"Component": "TokenBudget", "TrimLevel": trim_level},
+    )
+
+
+def prompt_token_budget() -> Optional[int]:
+    budget = os.environ.get("PROMPT_TOKEN_BUDGET")
+    return int(budget) if budget else None
@@ -0,0 +1,46 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+# Scheduled events {"warmup": true, "concurrency": 3} keep execution environments warm
+# without calling Bedrock
+WARMUP_ATTRIBUTE = "warmup"
+# Time each fanned out invocation stays busy, so that they overlap and land in distinct
+# execution environments
+DEFAULT_HOLD_MS = 200
+
+lambda_client = None
+
+
+def is_warmup_event(event: Dict[str, Any]) -> bool:
+    return bool(event.get(WARMUP_ATTRIBUTE))
+
+
+def fan_out(function_arn: str, invocations: int, hold_ms: int = DEFAULT_HOLD_MS) -> int:
+    """
+    Invoke the function concurrently, while the calling invocation waits for them, so that
+    invocations + 1 execution environments are busy at the same time. Returns the number of
+    successful invocations.
+    """
+    global lambda_client
+    if invocations <= 0:
+        return 0
+    if lambda_client is None:
+        import boto3
+
+        lambda_client = boto3.client("lambda")
+
+    payload = json.dumps({WARMUP_ATTRIBUTE: True, "concurrency": 1, "holdMs": hold_ms})
+
+    def invoke(_):
+        try:
+            response = lambda_client.invoke(
+                FunctionName=function_arn, InvocationType="RequestResponse", Payload=payload
+            )
+            return "FunctionError" not in response
+        except Exception as e:
+            print(f"Warmup invocation failed: {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=min(invocations, 32)) as pool:
+        return sum(pool.map(invoke, range(invocations)))
@@ -2,6 +2,14 @@ import json
 import os
 import boto3
 
+from provisioning import (
+    MONITORING_STATEMENTS,
+    call_with_resume_retry,
+    do_block,
+    readonly_user_statements,
+)
+from schema_version import SCHEMA_VERSION_STATEMENTS
+
 
 # Add cfnresponse
 def send_cfn_response(event, context, response_status, response_data, reason=None):
@@ -18,43 +26,54 @@ def send_cfn_response(event, context, response_status, response_data, reason=Non
     print(response_body)
 
 
+rds_data = boto3.client("rds-data")
+secrets = boto3.client("secretsmanager")
+
+
+def get_readonly_credentials():
+    """Read once per invocation, the secret may have been rotated since the last one"""
+    readonly_secret = secrets.get_secret_value(SecretId=os.environ["READONLY_SECRET_ARN"])
+    return json.loads(readonly_secret["SecretString"])
+
+
+def execute_statement(sql, context):
+    """Run one statement as the admin user, waiting for a paused cluster to resume"""
+    return call_with_resume_retry(
+        lambda: rds_data.execute_statement(
+            resourceArn=os.environ["CLUSTER_ARN"],
+            secretArn=os.environ["ADMIN_SECRET_ARN"],
+            database=os.environ["DB_NAME"],
+            sql=sql,
+        ),
+        remaining_seconds=lambda: context.get_remaining_time_in_millis() / 1000,
+    )
+
+
 def handler(event, context):
     if event["RequestType"] in ["Create", "Update"]:
         try:
-            rds_data = boto3.client("rds-data")
-            secrets = boto3.client("secretsmanager")
-
-            # Get readonly user credentials
-            readonly_secret = secrets.get_secret_value(
-                SecretId=os.environ["READONLY_SECRET_ARN"]
-            )
-            readonly_creds = json.loads(readonly_secret["SecretString"])
+            creds = get_readonly_credentials()
 
-            # SQL statements to create read-only user and permissions
+            # Read-only user, its role, the DDL version counter read by the action group
+            # to refresh its cached schema and pg_stat_statements. All statements are idempotent and run in a single
+            # transaction, so an Update re-applies them instead of failing on existing objects.
             statements = [
-                f"CREATE USER {readonly_creds['username']} WITH PASSWORD '{readonly_creds['password']}'",
-                "CREATE ROLE readonly_role",
-                f"GRANT CONNECT ON DATABASE {os.environ['DB_NAME']} TO readonly_role",
-                "GRANT USAGE ON SCHEMA public TO readonly_role",
-                "GRANT SELECT ON ALL TABLES IN SCHEMA public TO readonly_role",
-                "ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO readonly_role",
-                f"GRANT readonly_role TO {readonly_creds['username']}",
-                f"ALTER USER {readonly_creds['username']} SET default_transaction_read_only = ON",
+                *readonly_user_statements(
+                    creds["username"],
+                    creds["password"],
+                    os.environ["DB_NAME"],
+                    event.get("StatementTimeout"),
+                ),
+                *SCHEMA_VERSION_STATEMENTS,
+                *MONITORING_STATEMENTS,
             ]
-
-            # Execute each statement using Data API
-            for sql in statements:
-                response = rds_data.execute_statement(
-                    resourceArn=os.environ["CLUSTER_ARN"],
-                    secretArn=os.environ["ADMIN_SECRET_ARN"],
-                    database=os.environ["DB_NAME"],
-                    sql=sql,
-                )
-                print(f"Executed statement: {sql}")
-                print(response)
+            response = execute_statement(do_block(statements), context)
+            # The statements contain the password, only their count is logged
+            print(f"Executed {len(statements)} statements in one transaction")
+            print(response)
 
             response_data = {
-                "PhysicalResourceId": f"ReadOnlyUser-{readonly_creds['username']}",
+                "PhysicalResourceId": f"ReadOnlyUser-{creds['username']}",
                 "Data": {"Message": "Read-only user created successfully"},
             }
             send_cfn_response(event, context, "SUCCESS", response_data)
@@ -65,23 +84,10 @@ def handler(event, context):
 
     elif event["RequestType"] == "Delete":
         try:
-            rds_data = boto3.client("rds-data")
-            secrets = boto3.client("secretsmanager")
-
-            # Get readonly user credentials
-            readonly_secret = secrets.get_secret_value(
-                SecretId=os.environ["READONLY_SECRET_ARN"]
-            )
-            readonly_creds = json.loads(readonly_secret["SecretString"])
+            creds = get_readonly_credentials()
 
             # Drop user if exists
-            sql = f"DROP USER IF EXISTS {readonly_creds['username']}"
-            rds_data.execute_statement(
-                resourceArn=os.environ["CLUSTER_ARN"],
-                secretArn=os.environ["CLUSTER_SECRET_ARN"],
-                database=os.environ["DB_NAME"],
-                sql=sql,
-            )
+            execute_statement(f"DROP USER IF EXISTS {creds['username']}", context)
             response_data = {
                 "PhysicalResourceId": event.get(
                     "PhysicalResourceId", "ReadOnlyUserCreated"
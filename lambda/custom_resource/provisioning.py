@@ -0,0 +1,105 @@
+import random
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+# Statistics of the executed statements, read by the pg_stat_statements library loaded through
+# the cluster parameter group
+MONITORING_STATEMENTS = ["CREATE EXTENSION IF NOT EXISTS pg_stat_statements"]
+
+STATEMENT_TIMEOUT_PATTERN = re.compile(r"^\d+\s*(ms|s|min|h)?$")
+
+# Data API errors raised while a Serverless v2 cluster resumes from zero capacity
+RESUMING_ERROR_CODES = {"DatabaseResumingException"}
+
+
+def do_block(statements: List[str]) -> str:
+    """
+    One DO block EXECUTE-ing the statements, i.e. one Data API call and one transaction.
+    Statements may contain DO blocks and function bodies quoted with $$.
+    """
+    lines = ["DO $block$", "BEGIN"]
+    for statement in statements:
+        if "$statement$" in statement or "$block$" in statement:
+            raise ValueError("Statements must not use the $statement$ or $block$ quote tags")
+        lines.append(f"    EXECUTE $statement${statement.strip()}$statement$;")
+    lines += ["END", "$block$"]
+    return "\n".join(lines)
+
+
+def readonly_user_statements(
+    username: str, password: str, db_name: str, statement_timeout: Optional[str] = None
+) -> List[str]:
+    """Create or update the read-only user and its role, safe to run on every deployment"""
+    password = password.replace("'", "''")
+    if statement_timeout and not STATEMENT_TIMEOUT_PATTERN.match(statement_timeout):
+        raise ValueError(f"Invalid statement timeout '{statement_timeout}', e.g. 30s or 500ms")
+    statements = [
+        f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'readonly_role') THEN
+                CREATE ROLE readonly_role;
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = '{username}') THEN
+                CREATE USER {username} WITH PASSWORD '{password}';
+            ELSE
+                ALTER USER {username} WITH PASSWORD '{password}';
+            END IF;
+        END
+        $$
+        """,
+        f"GRANT CONNECT ON DATABASE {db_name} TO readonly_role",
+        "GRANT USAGE ON SCHEMA public TO readonly_role",
+        "GRANT SELECT ON ALL TABLES IN SCHEMA public TO readonly_role",
+        "ALTER DEFAULT PRIVILEGES IN SCHEMA public GRANT SELECT ON TABLES TO readonly_role",
+        f"GRANT readonly_role TO {username}",
+        f"ALTER USER {username} SET default_transaction_read_only = ON",
+    ]
+    if statement_timeout:
+        # Bounds runaway generated queries. Settings of a role only apply to sessions logged
+        # in as that role, not to its members, so the timeout is set on the user as well.
+        statements += [
+            f"ALTER ROLE readonly_role SET statement_timeout = '{statement_timeout}'",
+            f"ALTER USER {username} SET statement_timeout = '{statement_timeout}'",
+        ]
+    return statements
+
+
+def is_resuming_error(error: Exception) -> bool:
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get("Error", {}).get("Code", "")
+    message = error.response.get("Error", {}).get("Message", "")
+    return code in RESUMING_ERROR_CODES or (
+        code == "BadRequestException" and "resuming" in message.lower()
+    )
+
+
+def call_with_resume_retry(
+    call: Callable[[], Dict],
+    remaining_seconds: Optional[Callable[[], float]] = None,
+    base_delay: float = 1.0,
+    max_delay: float = 16.0,
+    margin_seconds: float = 10.0,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Dict:
+    """
+    Call the Data API, retrying with capped exponential backoff while the cluster resumes.
+    Gives up when the next attempt would not finish margin_seconds before the Lambda timeout.
+    """
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except Exception as e:
+            if not is_resuming_error(e):
+                raise
+            delay = min(max_delay, base_delay * 2**attempt) * random.uniform(0.5, 1.0)
+            if remaining_seconds is not None and remaining_seconds() - delay < margin_seconds:
+                raise
+            attempt += 1
+            print(f"Cluster is resuming, retry {attempt} in {delay:.1f} s")
+            sleep(delay)
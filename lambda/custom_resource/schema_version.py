@@ -0,0 +1,87 @@
+# Event triggers that bump agent_meta.schema_version on every DDL command and log the changed
+# relations, so that the action group Lambda can re-introspect only those. One statement per
+# entry for the Data API. All statements are idempotent and need the rds_superuser admin user.
+SCHEMA_VERSION_STATEMENTS = [
+    "CREATE SCHEMA IF NOT EXISTS agent_meta",
+    """
+    CREATE TABLE IF NOT EXISTS agent_meta.schema_version (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        version BIGINT NOT NULL DEFAULT 0,
+        pruned_below BIGINT NOT NULL DEFAULT 0,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agent_meta.schema_changes (
+        version BIGINT NOT NULL,
+        relation TEXT,
+        command_tag TEXT NOT NULL,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS schema_changes_version_idx ON agent_meta.schema_changes (version)",
+    "INSERT INTO agent_meta.schema_version (id) VALUES (TRUE) ON CONFLICT DO NOTHING",
+    # Tables, and the tables of indexes, changed by the command. Keeps the last 1000 versions.
+    """
+    CREATE OR REPLACE FUNCTION agent_meta.record_ddl_command() RETURNS event_trigger
+    LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog AS $$
+    DECLARE
+        new_version BIGINT;
+    BEGIN
+        UPDATE agent_meta.schema_version SET version = version + 1, changed_at = now()
+        RETURNING version INTO new_version;
+
+        INSERT INTO agent_meta.schema_changes (version, relation, command_tag)
+        SELECT new_version, n.nspname || '.' || c.relname, cmd.command_tag
+        FROM pg_event_trigger_ddl_commands() cmd
+        LEFT JOIN pg_index i ON i.indexrelid = cmd.objid
+        JOIN pg_class c ON c.oid = COALESCE(i.indrelid, cmd.objid)
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE cmd.classid = 'pg_class'::regclass AND n.nspname <> 'agent_meta';
+
+        IF new_version % 100 = 0 THEN
+            DELETE FROM agent_meta.schema_changes WHERE version <= new_version - 1000;
+            UPDATE agent_meta.schema_version SET pruned_below = GREATEST(new_version - 1000, 0);
+        END IF;
+    END
+    $$
+    """,
+    # Dropped tables and columns are only visible at sql_drop, which fires before
+    # ddl_command_end of the same command: log them under the version about to be bumped.
+    """
+    CREATE OR REPLACE FUNCTION agent_meta.record_dropped_objects() RETURNS event_trigger
+    LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog AS $$
+    DECLARE
+        next_version BIGINT;
+    BEGIN
+        SELECT version + 1 INTO next_version FROM agent_meta.schema_version FOR UPDATE;
+
+        INSERT INTO agent_meta.schema_changes (version, relation, command_tag)
+        SELECT next_version,
+            CASE WHEN d.object_type = 'table column'
+                THEN regexp_replace(d.object_identity, '\\.[^.]+$', '')
+                ELSE d.object_identity END,
+            tg_tag
+        FROM pg_event_trigger_dropped_objects() d
+        WHERE d.object_type IN ('table', 'view', 'materialized view', 'table column')
+            AND d.schema_name <> 'agent_meta';
+    END
+    $$
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'agent_meta_ddl_command_end') THEN
+            CREATE EVENT TRIGGER agent_meta_ddl_command_end ON ddl_command_end
+                EXECUTE FUNCTION agent_meta.record_ddl_command();
+        END IF;
+        IF NOT EXISTS (SELECT 1 FROM pg_event_trigger WHERE evtname = 'agent_meta_sql_drop') THEN
+            CREATE EVENT TRIGGER agent_meta_sql_drop ON sql_drop
+                EXECUTE FUNCTION agent_meta.record_dropped_objects();
+        END IF;
+    END
+    $$
+    """,
+    "GRANT USAGE ON SCHEMA agent_meta TO readonly_role",
+    "GRANT SELECT ON agent_meta.schema_version, agent_meta.schema_changes TO readonly_role",
+]
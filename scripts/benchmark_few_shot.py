@@ -0,0 +1,58 @@
+import os
+import random
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lambda", "action_group"))
+
+from few_shot import FewShotStore, np  # noqa: E402
+
+SUBJECTS = [
+    "students", "courses", "departments", "enrollments", "employees", "buildings",
+    "projects", "publications", "professors", "grades", "credits", "semesters",
+]
+FILTERS = [
+    "in the {} department", "enrolled in {}", "hired after {}", "built before {}",
+    "with more than {} credits", "funded in {}", "published in {}", "during semester {}",
+]
+ASKS = ["How many", "List the", "Show all", "What is the average number of", "Count the", "Which"]
+
+
+def random_question(rng):
+    subject, other = rng.sample(SUBJECTS, 2)
+    value = rng.choice([str(rng.randint(1990, 2030)), f"{other}{rng.randint(1, 500)}"])
+    return f"{rng.choice(ASKS)} {subject} {rng.choice(FILTERS).format(value)} per {other}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Few-shot store lookup benchmark")
+    parser.add_argument("--pairs", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    store = FewShotStore(max_pairs=args.pairs)
+    started = time.perf_counter()
+    for i in range(args.pairs):
+        store.add(f"{random_question(rng)} #{i}", f"SELECT {i}")
+    print(f"Loaded {len(store)} pairs in {time.perf_counter() - started:.1f} s")
+
+    timings = []
+    for _ in range(args.lookups):
+        question = random_question(rng)
+        started = time.perf_counter()
+        store.lookup(question, args.k)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    print(f"Scoring with {'numpy' if np is not None else 'pure Python'}")
+    print(
+        f"Lookup latency: p50={timings[len(timings) // 2]:.3f} ms "
+        f"p99={timings[int(len(timings) * 0.99)]:.3f} ms max={timings[-1]:.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
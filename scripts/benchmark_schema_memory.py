@@ -0,0 +1,97 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lambda", "action_group"))
+
+from schema_model import CompactSchema  # noqa: E402
+from schema_render import render_schema  # noqa: E402
+
+TYPES = [
+    "integer", "bigint", "character varying", "text", "numeric", "date",
+    "timestamp without time zone", "boolean",
+]
+COLUMNS = [
+    "name", "title", "description", "status", "created_at", "updated_at", "amount",
+    "code", "email", "start_date", "end_date", "credits", "budget", "position",
+]
+
+
+def synthetic_rows(tables, rng):
+    """Introspection rows of a catalog, serialized and parsed like the Data API response"""
+    rows = []
+    for t in range(tables):
+        schema = f"schema_{t % 20}"
+        table = f"table_{t}"
+        rows.append(
+            {
+                "table_schema": schema, "table_name": table, "table_type": "BASE TABLE",
+                "column_name": "id", "data_type": "integer", "is_nullable": "NO",
+                "column_default": f"nextval('{schema}.{table}_id_seq'::regclass)",
+                "constraint_type": "PRIMARY KEY", "constraint_name": f"{table}_pkey",
+            }
+        )
+        for c in rng.sample(COLUMNS, rng.randint(4, 12)):
+            rows.append(
+                {
+                    "table_schema": schema, "table_name": table, "table_type": "BASE TABLE",
+                    "column_name": c, "data_type": rng.choice(TYPES),
+                    "is_nullable": rng.choice(["YES", "NO"]), "column_default": None,
+                    "constraint_type": None, "constraint_name": None,
+                }
+            )
+        for f in range(rng.randint(0, 3)):
+            rows.append(
+                {
+                    "table_schema": schema, "table_name": table, "table_type": "BASE TABLE",
+                    "column_name": f"table_{rng.randrange(tables)}_id", "data_type": "integer",
+                    "is_nullable": "YES", "column_default": None,
+                    "constraint_type": "FOREIGN KEY", "constraint_name": f"{table}_fk_{f}",
+                }
+            )
+    return json.loads(json.dumps(rows))
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema cache memory benchmark")
+    parser.add_argument("--tables", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'tables':>8} {'rows':>8} {'dicts MB':>9} {'compact MB':>11} {'ratio':>6} {'render dicts':>13} {'render compact':>15}")
+    for tables in args.tables:
+        rows, rows_bytes = measure(lambda: synthetic_rows(tables, rng))
+        schema, schema_bytes = measure(lambda: CompactSchema.from_rows(rows))
+
+        started = time.perf_counter()
+        render_schema(rows)
+        rows_render = time.perf_counter() - started
+        started = time.perf_counter()
+        render_schema(schema)
+        schema_render = time.perf_counter() - started
+
+        print(
+            f"{tables:>8} {len(rows):>8} {rows_bytes / 2**20:>9.1f} {schema_bytes / 2**20:>11.1f} "
+            f"{rows_bytes / schema_bytes:>5.1f}x {rows_render * 1000:>10.0f} ms {schema_render * 1000:>12.0f} ms"
+        )
+        # Released before the next size is measured
+        rows = schema = None
+
+
+if __name__ == "__main__":
+    main()
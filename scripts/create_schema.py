@@ -1,5 +1,12 @@
+import argparse
+import json
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import boto3
-# import json
+
+from migrations import MIGRATIONS, apply_migrations
 
 # Define your AWS Aurora PostgreSQL configuration
 CLUSTER_ARN = "Update with RDSAuroraStack.CLUSTERARN"  # Replace with your cluster ARN
@@ -23,146 +30,105 @@ def execute_statement(sql, parameters=[]):
     return response
 
 
-def create_schema_and_ingest_data():
+# Rows per batch_execute_statement call, and a payload bound well under the Data API limits
+BATCH_MAX_ROWS = 500
+BATCH_MAX_BYTES = 1024 * 1024
+LOAD_WORKERS = 4
 
-    # Cleanup existing schemas
+CREATE_TABLE_PATTERN = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.]+)", re.IGNORECASE)
+REFERENCES_PATTERN = re.compile(r"REFERENCES\s+([\w.]+)", re.IGNORECASE)
+INSERT_PATTERN = re.compile(r"INSERT\s+INTO\s+([\w.]+)", re.IGNORECASE)
 
-    # drops = [
-    #     "DROP SCHEMA academics CASCADE;",
-    #     "DROP SCHEMA staff CASCADE;",
-    #     "DROP SCHEMA facilities CASCADE;",
-    #     "DROP SCHEMA research CASCADE;",
-    # ]
 
-    # Schema creation statements
-    schemas = [
-        "CREATE SCHEMA IF NOT EXISTS academics;",
-        "CREATE SCHEMA IF NOT EXISTS staff;",
-        "CREATE SCHEMA IF NOT EXISTS facilities;",
-        "CREATE SCHEMA IF NOT EXISTS research;",
-    ]
-
-    # Table creation statements
-    tables = [
-        """
-        CREATE TABLE IF NOT EXISTS academics.departments (
-            department_id SERIAL PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            code VARCHAR(10) UNIQUE NOT NULL
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS academics.courses (
-            course_id SERIAL PRIMARY KEY,
-            department_id INTEGER REFERENCES academics.departments(department_id),
-            code VARCHAR(20) UNIQUE NOT NULL,
-            title VARCHAR(200) NOT NULL,
-            credits INTEGER NOT NULL
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS academics.students (
-            student_id SERIAL PRIMARY KEY,
-            first_name VARCHAR(50) NOT NULL,
-            last_name VARCHAR(50) NOT NULL,
-            date_of_birth DATE NOT NULL,
-            enrollment_date DATE NOT NULL,
-            major_department_id INTEGER REFERENCES academics.departments(department_id)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS academics.enrollments (
-            enrollment_id SERIAL PRIMARY KEY,
-            student_id INTEGER REFERENCES academics.students(student_id),
-            course_id INTEGER REFERENCES academics.courses(course_id),
-            semester VARCHAR(20) NOT NULL,
-            year INTEGER NOT NULL,
-            grade CHAR(2)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS staff.employees (
-            employee_id SERIAL PRIMARY KEY,
-            first_name VARCHAR(50) NOT NULL,
-            last_name VARCHAR(50) NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            hire_date DATE NOT NULL,
-            position VARCHAR(100) NOT NULL
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS facilities.buildings (
-            building_id SERIAL PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            address VARCHAR(200) NOT NULL,
-            construction_year INTEGER
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS research.projects (
-            project_id SERIAL PRIMARY KEY,
-            title VARCHAR(200) NOT NULL,
-            description TEXT,
-            start_date DATE,
-            end_date DATE,
-            funding_amount DECIMAL(12, 2)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS research.publications (
-            publication_id SERIAL PRIMARY KEY,
-            title VARCHAR(200) NOT NULL,
-            authors TEXT NOT NULL,
-            publication_date DATE,
-            journal VARCHAR(200),
-            doi VARCHAR(100)
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS research.project_members (
-            project_id INTEGER REFERENCES research.projects(project_id),
-            employee_id INTEGER REFERENCES staff.employees(employee_id),
-            role VARCHAR(50) NOT NULL,
-            PRIMARY KEY (project_id, employee_id)
-        );
-        """,
-    ]
+def table_dependencies(create_statements):
+    """Tables referenced through foreign keys by each created table"""
+    dependencies = {}
+    for statement in create_statements:
+        match = CREATE_TABLE_PATTERN.search(statement)
+        if match:
+            dependencies[match.group(1)] = set(REFERENCES_PATTERN.findall(statement)) - {match.group(1)}
+    return dependencies
 
-    # Execute drop statements
-    print("Cleaning up existing schemas...")
-    # for drop in drops:
-    # execute_statement(drop)
 
-    # Execute schema creation
-    print("Creating schemas...")
-    for schema in schemas:
-        execute_statement(schema)
+def parameter_batches(parameter_sets, max_rows=BATCH_MAX_ROWS, max_bytes=BATCH_MAX_BYTES):
+    """Split the parameter sets of a statement into batches bounded by rows and payload size"""
+    batch, size = [], 0
+    for parameters in parameter_sets:
+        row_size = len(json.dumps(parameters))
+        if batch and (len(batch) >= max_rows or size + row_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(parameters)
+        size += row_size
+    if batch:
+        yield batch
 
-    # Execute table creation
-    print("Creating tables...")
-    for table in tables:
-        execute_statement(table)
 
-    schemas = [
-        "academics",
-        "staff",
-        "facilities",
-        "research",
-    ]
-    # grant read-only permissions to all schemas
-    # User and readonly_role are created already in the RDSAuroraStack
-    grants = []
-    for schema in schemas:
-        grants.append(f"GRANT USAGE ON SCHEMA {schema} TO readonly_role")
-        grants.append(f"GRANT SELECT ON ALL TABLES IN SCHEMA {schema} TO readonly_role")
-        grants.append(
-            f"ALTER DEFAULT PRIVILEGES IN SCHEMA {schema} GRANT SELECT ON TABLES TO readonly_role"
+def load_table(statements):
+    """Run the inserts of one table in batches inside a single transaction"""
+    transaction_id = rds_data.begin_transaction(
+        resourceArn=CLUSTER_ARN, secretArn=ADMIN_SECRET_ARN, database=DB_NAME
+    )["transactionId"]
+    rows = 0
+    try:
+        for sql, parameter_sets in statements:
+            for batch in parameter_batches(parameter_sets):
+                rds_data.batch_execute_statement(
+                    resourceArn=CLUSTER_ARN,
+                    secretArn=ADMIN_SECRET_ARN,
+                    database=DB_NAME,
+                    sql=sql,
+                    parameterSets=batch,
+                    transactionId=transaction_id,
+                )
+                rows += len(batch)
+        rds_data.commit_transaction(
+            resourceArn=CLUSTER_ARN, secretArn=ADMIN_SECRET_ARN, transactionId=transaction_id
         )
+    except Exception:
+        rds_data.rollback_transaction(
+            resourceArn=CLUSTER_ARN, secretArn=ADMIN_SECRET_ARN, transactionId=transaction_id
+        )
+        raise
+    return rows
+
 
-    # Execute each statement using Data API
-    print("Adding grant...")
-    for grant in grants:
-        execute_statement(grant)
+def load_data(data, dependencies, workers=LOAD_WORKERS):
+    """
+    Load (sql, parameter sets) inserts, one transaction per table. A table is loaded once
+    the tables it references are committed, so independent tables load concurrently.
+    Returns the number of inserted rows.
+    """
+    loads = {}
+    for sql, parameter_sets in data:
+        loads.setdefault(INSERT_PATTERN.search(sql).group(1), []).append((sql, parameter_sets))
+    pending = {
+        table: dependencies.get(table, set()) & set(loads) for table in loads
+    }
+
+    loaded, running, rows = set(), {}, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for table in [t for t, references in pending.items() if references <= loaded]:
+                del pending[table]
+                running[executor.submit(load_table, loads[table])] = table
+            if not running:
+                raise ValueError(f"Circular foreign keys between {sorted(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                table = running.pop(future)
+                table_rows = future.result()
+                rows += table_rows
+                loaded.add(table)
+                print(f"Loaded {table_rows} rows into {table}")
+    return rows
+
+
+def create_schema_and_ingest_data(row_by_row=False, workers=LOAD_WORKERS):
+
+    # Schemas, tables, grants and DDL event triggers, each migration applied once
+    print("Applying migrations...")
+    apply_migrations(execute_statement)
 
     # Sample data insertion
     print("Inserting sample data...")
@@ -558,12 +524,35 @@ def create_schema_and_ingest_data():
     ]
 
     # Execute data insertion
-    for sql, data in sample_data:
-        for item in data:
-            execute_statement(sql, item)
+    started = time.perf_counter()
+    if row_by_row:
+        rows = 0
+        for sql, data in sample_data:
+            for item in data:
+                execute_statement(sql, item)
+                rows += 1
+    else:
+        create_statements = [s for m in MIGRATIONS for s in m.statements]
+        rows = load_data(sample_data, table_dependencies(create_statements), workers)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Inserted {rows} rows in {elapsed:.2f} s ({rows / elapsed:.0f} rows/s, "
+        f"{'row by row' if row_by_row else 'batched'})"
+    )
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Create the sample schema and data")
+    parser.add_argument(
+        "--row-by-row",
+        action="store_true",
+        help="Insert one row per Data API call, to compare rows/s with the batched load",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=LOAD_WORKERS, help="Tables loaded concurrently"
+    )
+    args = parser.parse_args()
+
     # Validate configuration
     if not all([CLUSTER_ARN, ADMIN_SECRET_ARN, DB_NAME]):
         print(
@@ -573,7 +562,7 @@ def main():
 
     try:
         print("Starting database schema creation and data ingestion...")
-        create_schema_and_ingest_data()
+        create_schema_and_ingest_data(args.row_by_row, args.workers)
         print("Successfully created schema and ingested sample data!")
         return 0
     except Exception as e:
@@ -0,0 +1,425 @@
+import argparse
+import bisect
+import csv
+import datetime
+import io
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Data API target configuration, as in create_schema.py
+CLUSTER_ARN = "Update with RDSAuroraStack.CLUSTERARN"  # Replace with your cluster ARN
+ADMIN_SECRET_ARN = (
+    "Update with RDSAuroraStack.ADMINSECRETARN"  # Replace with your secret ARN
+)
+DB_NAME = "postgres"  # Replace with your database name
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William",
+    "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah",
+    "Wei", "Aisha", "Carlos", "Yuki", "Priya", "Olga", "Ahmed", "Sofia", "Liam", "Chloe",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+    "Martinez", "Wilson", "Anderson", "Taylor", "Thomas", "Moore", "Jackson", "Martin", "Lee",
+    "Chen", "Kumar", "Nguyen", "Ivanova", "Haddad", "Rossi", "Murphy", "Kim", "Novak", "Silva",
+]
+FIELDS = [
+    "Computer Science", "Physics", "Mathematics", "Biology", "Chemistry", "History", "Economics",
+    "Philosophy", "Linguistics", "Psychology", "Sociology", "Mechanical Engineering", "Law",
+    "Electrical Engineering", "Civil Engineering", "Medicine", "Music", "Fine Arts", "Geology",
+]
+TOPICS = [
+    "Introduction to", "Advanced", "Foundations of", "Topics in", "Applied", "Seminar in",
+    "Principles of", "Methods in", "Theory of", "Laboratory in",
+]
+POSITIONS = [
+    ("Professor", 10), ("Associate Professor", 12), ("Assistant Professor", 15),
+    ("Lecturer", 20), ("Research Associate", 15), ("Teaching Assistant", 25),
+    ("Administrator", 8), ("Technician", 6), ("Dean", 1),
+]
+GRADES = [("A", 20), ("A-", 12), ("B+", 14), ("B", 16), ("B-", 9), ("C+", 7), ("C", 6), ("D", 3), ("F", 3), (None, 10)]
+SEMESTERS = ["Fall", "Spring", "Summer"]
+ROLES = [("Principal Investigator", 1), ("Co-Investigator", 2), ("Research Associate", 4), ("Research Scientist", 3)]
+JOURNALS = [
+    "Journal of Quantum Computing", "Environmental Science & Technology", "Nature",
+    "Educational Technology Research", "Journal of Applied Physics", "The Lancet",
+    "Journal of Economic Theory", "ACM Computing Surveys", "Cell", "Physical Review Letters",
+]
+STREETS = ["University Ave", "College St", "Campus Rd", "Science Park", "Library Way", "Main St"]
+ROOM_TYPES = [("Classroom", 40), ("Office", 30), ("Laboratory", 15), ("Lecture Hall", 5), ("Meeting Room", 10)]
+EQUIPMENT = ["Projector", "Microscope", "Oscilloscope", "Workstation", "Centrifuge", "3D Printer", "Whiteboard"]
+
+
+def weighted(rng: random.Random, choices: Sequence[Tuple[Any, int]]) -> Any:
+    return rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+
+@lru_cache(maxsize=None)
+def zipf_cumulative(n: int, s: float) -> List[float]:
+    total, cumulative = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1 / rank**s
+        cumulative.append(total)
+    return cumulative
+
+
+def skewed_id(rng: random.Random, parent: Tuple[int, int], s: float = 1.1) -> int:
+    """A Zipf distributed id among the generated rows of a parent table (offset, count)"""
+    offset, count = parent
+    cumulative = zipf_cumulative(count, s)
+    rank = bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+    # Spread the popular ranks over the id range instead of the first ids
+    return offset + (rank * 2654435761) % count + 1
+
+
+def random_date(rng: random.Random, start_year: int, end_year: int) -> datetime.date:
+    start = datetime.date(start_year, 1, 1).toordinal()
+    return datetime.date.fromordinal(rng.randint(start, datetime.date(end_year, 12, 31).toordinal()))
+
+
+def person(rng: random.Random) -> Tuple[str, str]:
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+# Row generators: (rng, first unit id, last unit id, parents) -> rows of units first..last
+
+def departments(rng, first, last, parents):
+    for i in range(first, last + 1):
+        field = FIELDS[i % len(FIELDS)]
+        yield i, field if i <= len(FIELDS) else f"{field} {i // len(FIELDS) + 1}", f"D{i}"
+
+
+def courses(rng, first, last, parents):
+    for i in range(first, last + 1):
+        department_id = skewed_id(rng, parents["academics.departments"])
+        title = f"{rng.choice(TOPICS)} {rng.choice(FIELDS)} {rng.randint(1, 4)}{rng.randint(0, 99):02d}"
+        yield i, department_id, f"C{i}", title, rng.choices([2, 3, 4, 6], weights=[2, 10, 5, 1])[0]
+
+
+def students(rng, first, last, parents):
+    for i in range(first, last + 1):
+        first_name, last_name = person(rng)
+        enrollment_date = random_date(rng, 2015, 2024)
+        date_of_birth = enrollment_date - datetime.timedelta(days=rng.randint(17 * 365, 30 * 365))
+        yield (
+            i, first_name, last_name, date_of_birth, enrollment_date,
+            skewed_id(rng, parents["academics.departments"]),
+        )
+
+
+def enrollments(rng, first, last, parents):
+    for student_id in range(first, last + 1):
+        year = rng.randint(2015, 2024)
+        # Most students take a few courses, some take many
+        for _ in range(min(int(rng.expovariate(1 / 8)), 40)):
+            yield (
+                student_id, skewed_id(rng, parents["academics.courses"]),
+                rng.choice(SEMESTERS), year + rng.randint(0, 3), weighted(rng, GRADES),
+            )
+
+
+def employees(rng, first, last, parents):
+    for i in range(first, last + 1):
+        first_name, last_name = person(rng)
+        email = f"{first_name}.{last_name}.{i}@university.edu".lower()
+        yield i, first_name, last_name, email, random_date(rng, 1990, 2024), weighted(rng, POSITIONS)
+
+
+def salaries(rng, first, last, parents):
+    for employee_id in range(first, last + 1):
+        amount = round(rng.lognormvariate(11, 0.4), 2)
+        for raise_number in range(rng.randint(1, 4)):
+            yield employee_id, round(amount * 1.03**raise_number, 2), random_date(rng, 2015 + raise_number * 2, 2016 + raise_number * 2)
+
+
+def buildings(rng, first, last, parents):
+    for i in range(first, last + 1):
+        name = f"{FIELDS[i % len(FIELDS)]} Building {i}"
+        yield i, name, f"{rng.randint(1, 999)} {rng.choice(STREETS)}", rng.randint(1900, 2024)
+
+
+def rooms(rng, first, last, parents):
+    for i in range(first, last + 1):
+        room_type = weighted(rng, ROOM_TYPES)
+        capacity = {"Lecture Hall": 300, "Classroom": 60, "Laboratory": 30}.get(room_type, 8)
+        yield (
+            i, skewed_id(rng, parents["facilities.buildings"], s=0.6), f"R{i}",
+            rng.randint(max(1, capacity // 4), capacity), room_type,
+        )
+
+
+def equipment(rng, first, last, parents):
+    for room_id in range(first, last + 1):
+        for _ in range(rng.randint(0, 10)):
+            purchase_date = random_date(rng, 2000, 2024)
+            maintenance = purchase_date + datetime.timedelta(days=rng.randint(0, 1500)) if rng.random() < 0.7 else None
+            yield room_id, rng.choice(EQUIPMENT), purchase_date, maintenance
+
+
+def projects(rng, first, last, parents):
+    for i in range(first, last + 1):
+        start = random_date(rng, 2010, 2025)
+        end = start + datetime.timedelta(days=rng.randint(180, 5 * 365))
+        field = rng.choice(FIELDS)
+        yield (
+            i, f"{rng.choice(TOPICS)} {field} #{i}", f"Research project in {field.lower()}",
+            start, end, round(rng.lognormvariate(12.5, 1.0), 2),
+        )
+
+
+def publications(rng, first, last, parents):
+    for i in range(first, last + 1):
+        authors = ", ".join(" ".join(person(rng)) for _ in range(rng.randint(1, 6)))
+        yield (
+            i, f"{rng.choice(TOPICS)} {rng.choice(FIELDS)}: study {i}", authors,
+            random_date(rng, 2000, 2025), rng.choice(JOURNALS), f"10.5555/gen.{i}",
+        )
+
+
+def project_members(rng, first, last, parents):
+    employees_range = parents["staff.employees"]
+    for project_id in range(first, last + 1):
+        members = set()
+        for _ in range(min(rng.randint(1, 8), employees_range[1])):
+            members.add(skewed_id(rng, employees_range, s=0.8))
+        for index, employee_id in enumerate(sorted(members)):
+            yield project_id, employee_id, "Principal Investigator" if index == 0 else weighted(rng, ROLES[1:])
+
+
+@dataclass
+class TableSpec:
+    """
+    A generated table. Rows are generated per unit: a row with an explicit id when id_column
+    is set, or the rows belonging to one row of units_of, e.g. the enrollments of a student.
+    """
+
+    table: str
+    columns: List[str]
+    generate: Callable[..., Iterable[tuple]]
+    units: int = 0
+    id_column: Optional[str] = None
+    units_of: Optional[str] = None
+    rows_per_unit: float = 1
+    references: Tuple[str, ...] = ()
+
+
+# Units at scale 1, about one million rows in total
+TABLES = [
+    TableSpec("academics.departments", ["department_id", "name", "code"], departments, 40, "department_id"),
+    TableSpec(
+        "academics.courses", ["course_id", "department_id", "code", "title", "credits"], courses, 2000,
+        "course_id", references=("academics.departments",),
+    ),
+    TableSpec(
+        "academics.students",
+        ["student_id", "first_name", "last_name", "date_of_birth", "enrollment_date", "major_department_id"],
+        students, 100000, "student_id", references=("academics.departments",),
+    ),
+    TableSpec(
+        "academics.enrollments", ["student_id", "course_id", "semester", "year", "grade"], enrollments,
+        units_of="academics.students", rows_per_unit=8, references=("academics.students", "academics.courses"),
+    ),
+    TableSpec(
+        "staff.employees", ["employee_id", "first_name", "last_name", "email", "hire_date", "position"],
+        employees, 5000, "employee_id",
+    ),
+    TableSpec(
+        "staff.salaries", ["employee_id", "amount", "effective_date"], salaries,
+        units_of="staff.employees", rows_per_unit=2.5, references=("staff.employees",),
+    ),
+    TableSpec("facilities.buildings", ["building_id", "name", "address", "construction_year"], buildings, 100, "building_id"),
+    TableSpec(
+        "facilities.rooms", ["room_id", "building_id", "room_number", "capacity", "room_type"], rooms, 2000,
+        "room_id", references=("facilities.buildings",),
+    ),
+    TableSpec(
+        "facilities.equipment", ["room_id", "name", "purchase_date", "last_maintenance_date"], equipment,
+        units_of="facilities.rooms", rows_per_unit=5, references=("facilities.rooms",),
+    ),
+    TableSpec(
+        "research.projects", ["project_id", "title", "description", "start_date", "end_date", "funding_amount"],
+        projects, 2000, "project_id",
+    ),
+    TableSpec(
+        "research.publications", ["publication_id", "title", "authors", "publication_date", "journal", "doi"],
+        publications, 20000, "publication_id",
+    ),
+    TableSpec(
+        "research.project_members", ["project_id", "employee_id", "role"], project_members,
+        units_of="research.projects", rows_per_unit=4, references=("research.projects", "staff.employees"),
+    ),
+]
+
+
+class DataApiTarget:
+    """Aurora through the Data API: batched inserts, one transaction per chunk"""
+
+    def __init__(self):
+        import boto3
+
+        self.client = boto3.client("rds-data")
+        self.arns = {"resourceArn": CLUSTER_ARN, "secretArn": ADMIN_SECRET_ARN}
+
+    def query(self, sql: str) -> List[List[Any]]:
+        records = self.client.execute_statement(**self.arns, database=DB_NAME, sql=sql).get("records", [])
+        return [[next(iter(field.values())) for field in record] for record in records]
+
+    @staticmethod
+    def parameter(name: str, value: Any) -> Dict[str, Any]:
+        if value is None:
+            return {"name": name, "value": {"isNull": True}}
+        if isinstance(value, datetime.date):
+            return {"name": name, "value": {"stringValue": value.isoformat()}, "typeHint": "DATE"}
+        if isinstance(value, float):
+            return {"name": name, "value": {"stringValue": f"{value:.2f}"}, "typeHint": "DECIMAL"}
+        if isinstance(value, int):
+            return {"name": name, "value": {"longValue": value}}
+        return {"name": name, "value": {"stringValue": value}}
+
+    def load(self, table: str, columns: List[str], rows: List[tuple]) -> None:
+        # Imported here so that the local target does not need AWS configuration
+        from create_schema import parameter_batches
+
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})"
+        parameter_sets = [[self.parameter(c, v) for c, v in zip(columns, row)] for row in rows]
+        transaction_id = self.client.begin_transaction(**self.arns, database=DB_NAME)["transactionId"]
+        try:
+            for batch in parameter_batches(parameter_sets):
+                self.client.batch_execute_statement(
+                    **self.arns, database=DB_NAME, sql=sql, parameterSets=batch, transactionId=transaction_id
+                )
+            self.client.commit_transaction(**self.arns, transactionId=transaction_id)
+        except Exception:
+            self.client.rollback_transaction(**self.arns, transactionId=transaction_id)
+            raise
+
+
+class LocalPostgresTarget:
+    """A PostgreSQL server reachable with psycopg2: COPY per chunk, one connection per worker"""
+
+    def __init__(self, dsn: str):
+        try:
+            import psycopg2
+        except ImportError:
+            raise SystemExit("The local target needs psycopg2: pip install psycopg2-binary")
+        self.connect = lambda: psycopg2.connect(dsn)
+        self.local = threading.local()
+
+    def connection(self):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = self.connect()
+        return self.local.connection
+
+    def query(self, sql: str) -> List[List[Any]]:
+        connection = self.connection()
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            rows = [list(row) for row in cursor.fetchall()] if cursor.description else []
+        connection.commit()
+        return rows
+
+    def load(self, table: str, columns: List[str], rows: List[tuple]) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if v is None else v.isoformat() if isinstance(v, datetime.date) else v for v in row])
+        buffer.seek(0)
+        connection = self.connection()
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        connection.commit()
+
+
+def table_levels(specs: List[TableSpec]) -> List[List[TableSpec]]:
+    """Tables grouped so that each group only references tables of earlier groups"""
+    names = {spec.table for spec in specs}
+    done, levels, pending = set(), [], list(specs)
+    while pending:
+        level = [s for s in pending if all(r in done or r not in names for r in s.references)]
+        if not level:
+            raise ValueError(f"Circular references between {[s.table for s in pending]}")
+        levels.append(level)
+        done.update(s.table for s in level)
+        pending = [s for s in pending if s not in level]
+    return levels
+
+
+def generate(target, specs: List[TableSpec], scale: float, seed: int, workers: int, chunk_rows: int, truncate: bool):
+    existing = {f"{schema}.{name}" for schema, name in target.query(
+        "SELECT table_schema, table_name FROM information_schema.tables "
+        "WHERE table_schema IN ('academics', 'staff', 'facilities', 'research')"
+    )}
+    specs = [spec for spec in specs if spec.table in existing]
+    if truncate:
+        print(f"Truncating {len(specs)} tables...")
+        target.query(f"TRUNCATE {', '.join(spec.table for spec in specs)} RESTART IDENTITY CASCADE")
+
+    # (id offset, generated count) of each table with explicit ids, new ids follow existing ones
+    parents = {}
+    for spec in specs:
+        if spec.id_column:
+            offset = target.query(f"SELECT COALESCE(MAX({spec.id_column}), 0) FROM {spec.table}")[0][0]
+            parents[spec.table] = (int(offset), max(1, int(spec.units * scale)))
+
+    def load_chunk(spec: TableSpec, first: int, last: int) -> int:
+        rng = random.Random(f"{seed}:{spec.table}:{first}")
+        rows = list(spec.generate(rng, first, last, parents))
+        if rows:
+            target.load(spec.table, spec.columns, rows)
+        return len(rows)
+
+    total_rows, started = 0, time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for level in table_levels(specs):
+            futures = {}
+            for spec in level:
+                offset, count = parents[spec.units_of or spec.table]
+                per_chunk = max(1, int(chunk_rows / spec.rows_per_unit))
+                futures[spec.table] = [
+                    executor.submit(load_chunk, spec, first, min(first + per_chunk - 1, offset + count))
+                    for first in range(offset + 1, offset + count + 1, per_chunk)
+                ]
+            for table, table_futures in futures.items():
+                rows = sum(f.result() for f in table_futures)
+                total_rows += rows
+                print(f"Loaded {rows} rows into {table}")
+
+    # Explicit ids do not advance the serial sequences
+    for spec in specs:
+        if spec.id_column:
+            target.query(
+                f"SELECT setval(pg_get_serial_sequence('{spec.table}', '{spec.id_column}'), "
+                f"(SELECT MAX({spec.id_column}) FROM {spec.table}))"
+            )
+    elapsed = time.perf_counter() - started
+    print(f"Generated {total_rows} rows in {elapsed:.1f} s ({total_rows / elapsed:.0f} rows/s)")
+    return total_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic university data at benchmark scale")
+    parser.add_argument("--scale", type=float, default=1.0, help="1.0 is about one million rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="Rows generated and loaded per chunk")
+    parser.add_argument("--target", choices=["data-api", "local"], default="data-api")
+    parser.add_argument(
+        "--dsn", default=os.environ.get("DATABASE_URL", ""),
+        help="libpq connection string of the local target, PG* environment variables apply",
+    )
+    parser.add_argument("--truncate", action="store_true", help="Empty the tables first and restart their ids")
+    args = parser.parse_args()
+
+    target = LocalPostgresTarget(args.dsn) if args.target == "local" else DataApiTarget()
+    generate(target, TABLES, args.scale, args.seed, args.workers, args.chunk_rows, args.truncate)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
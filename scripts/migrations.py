@@ -0,0 +1,265 @@
+import argparse
+import hashlib
+import os
+import sys
+import textwrap
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda", "custom_resource"))
+from provisioning import do_block  # noqa: E402
+from schema_version import SCHEMA_VERSION_STATEMENTS  # noqa: E402
+
+SCHEMAS = ["academics", "staff", "facilities", "research"]
+
+# Applied migrations, created by every migration so that the first run needs no extra call
+BOOTSTRAP_STATEMENTS = [
+    "CREATE SCHEMA IF NOT EXISTS agent_meta",
+    """
+    CREATE TABLE IF NOT EXISTS agent_meta.schema_migrations (
+        id TEXT PRIMARY KEY,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+]
+APPLIED_QUERY = "SELECT id, checksum FROM agent_meta.schema_migrations"
+
+
+class MigrationChecksumError(Exception):
+    """Raised when an applied migration was edited, changes belong in a new migration"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Statements applied together in one transaction. A repeatable migration is applied again
+    whenever its statements change, which requires all of them to be idempotent.
+    """
+
+    id: str
+    statements: List[str]
+    repeatable: bool = False
+
+    @property
+    def checksum(self) -> str:
+        normalized = ";\n".join(" ".join(statement.split()) for statement in self.statements)
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+MIGRATIONS = [
+    Migration(
+        "0001_university_schema",
+        [f"CREATE SCHEMA IF NOT EXISTS {schema}" for schema in SCHEMAS]
+        + [
+            """
+            CREATE TABLE IF NOT EXISTS academics.departments (
+                department_id SERIAL PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                code VARCHAR(10) UNIQUE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS academics.courses (
+                course_id SERIAL PRIMARY KEY,
+                department_id INTEGER REFERENCES academics.departments(department_id),
+                code VARCHAR(20) UNIQUE NOT NULL,
+                title VARCHAR(200) NOT NULL,
+                credits INTEGER NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS academics.students (
+                student_id SERIAL PRIMARY KEY,
+                first_name VARCHAR(50) NOT NULL,
+                last_name VARCHAR(50) NOT NULL,
+                date_of_birth DATE NOT NULL,
+                enrollment_date DATE NOT NULL,
+                major_department_id INTEGER REFERENCES academics.departments(department_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS academics.enrollments (
+                enrollment_id SERIAL PRIMARY KEY,
+                student_id INTEGER REFERENCES academics.students(student_id),
+                course_id INTEGER REFERENCES academics.courses(course_id),
+                semester VARCHAR(20) NOT NULL,
+                year INTEGER NOT NULL,
+                grade CHAR(2)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS staff.employees (
+                employee_id SERIAL PRIMARY KEY,
+                first_name VARCHAR(50) NOT NULL,
+                last_name VARCHAR(50) NOT NULL,
+                email VARCHAR(100) UNIQUE NOT NULL,
+                hire_date DATE NOT NULL,
+                position VARCHAR(100) NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS staff.salaries (
+                salary_id SERIAL PRIMARY KEY,
+                employee_id INTEGER REFERENCES staff.employees(employee_id),
+                amount DECIMAL(10, 2) NOT NULL,
+                effective_date DATE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS facilities.buildings (
+                building_id SERIAL PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                address VARCHAR(200) NOT NULL,
+                construction_year INTEGER
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS facilities.rooms (
+                room_id SERIAL PRIMARY KEY,
+                building_id INTEGER REFERENCES facilities.buildings(building_id),
+                room_number VARCHAR(20) NOT NULL,
+                capacity INTEGER,
+                room_type VARCHAR(50) NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS facilities.equipment (
+                equipment_id SERIAL PRIMARY KEY,
+                room_id INTEGER REFERENCES facilities.rooms(room_id),
+                name VARCHAR(100) NOT NULL,
+                purchase_date DATE,
+                last_maintenance_date DATE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS research.projects (
+                project_id SERIAL PRIMARY KEY,
+                title VARCHAR(200) NOT NULL,
+                description TEXT,
+                start_date DATE,
+                end_date DATE,
+                funding_amount DECIMAL(12, 2)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS research.publications (
+                publication_id SERIAL PRIMARY KEY,
+                title VARCHAR(200) NOT NULL,
+                authors TEXT NOT NULL,
+                publication_date DATE,
+                journal VARCHAR(200),
+                doi VARCHAR(100)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS research.project_members (
+                project_id INTEGER REFERENCES research.projects(project_id),
+                employee_id INTEGER REFERENCES staff.employees(employee_id),
+                role VARCHAR(50) NOT NULL,
+                PRIMARY KEY (project_id, employee_id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_courses_department ON academics.courses(department_id)",
+            "CREATE INDEX IF NOT EXISTS idx_enrollments_student ON academics.enrollments(student_id)",
+            "CREATE INDEX IF NOT EXISTS idx_enrollments_course ON academics.enrollments(course_id)",
+            "CREATE INDEX IF NOT EXISTS idx_salaries_employee ON staff.salaries(employee_id)",
+            "CREATE INDEX IF NOT EXISTS idx_rooms_building ON facilities.rooms(building_id)",
+            "CREATE INDEX IF NOT EXISTS idx_equipment_room ON facilities.equipment(room_id)",
+            "CREATE INDEX IF NOT EXISTS idx_project_members_project ON research.project_members(project_id)",
+            "CREATE INDEX IF NOT EXISTS idx_project_members_employee ON research.project_members(employee_id)",
+        ],
+    ),
+    # readonly_role is created by the custom resource of the RDSAuroraStack
+    Migration(
+        "0002_readonly_role_grants",
+        [
+            statement
+            for schema in SCHEMAS
+            for statement in (
+                f"GRANT USAGE ON SCHEMA {schema} TO readonly_role",
+                f"GRANT SELECT ON ALL TABLES IN SCHEMA {schema} TO readonly_role",
+                f"ALTER DEFAULT PRIVILEGES IN SCHEMA {schema} GRANT SELECT ON TABLES TO readonly_role",
+            )
+        ],
+    ),
+    # Shared with the custom resource, re-applied when the triggers change
+    Migration("0003_schema_version_triggers", SCHEMA_VERSION_STATEMENTS, repeatable=True),
+]
+
+
+def migration_sql(migration: Migration) -> str:
+    """
+    The statements of the migration and its record in one DO block, so that a migration
+    is a single Data API call and a single transaction.
+    """
+    record = (
+        "INSERT INTO agent_meta.schema_migrations (id, checksum) "
+        f"VALUES ('{migration.id}', '{migration.checksum}') "
+        "ON CONFLICT (id) DO UPDATE SET checksum = EXCLUDED.checksum, applied_at = now()"
+    )
+    return do_block(BOOTSTRAP_STATEMENTS + migration.statements + [record])
+
+
+def applied_migrations(execute: Callable[[str], Dict[str, Any]]) -> Dict[str, str]:
+    """Checksums of the applied migrations, empty before the first migration"""
+    try:
+        records = execute(APPLIED_QUERY).get("records", [])
+    except Exception as e:
+        if "does not exist" in str(e):
+            return {}
+        raise
+    return {record[0]["stringValue"]: record[1]["stringValue"] for record in records}
+
+
+def pending_migrations(migrations: List[Migration], applied: Dict[str, str]) -> List[Migration]:
+    pending = []
+    for migration in migrations:
+        checksum = applied.get(migration.id)
+        if checksum is None or (migration.repeatable and checksum != migration.checksum):
+            pending.append(migration)
+        elif checksum != migration.checksum:
+            raise MigrationChecksumError(
+                f"Migration {migration.id} was changed after it was applied, add a new migration instead"
+            )
+    return pending
+
+
+def apply_migrations(
+    execute: Callable[[str], Dict[str, Any]], migrations: List[Migration] = MIGRATIONS
+) -> List[str]:
+    """Apply the migrations not applied yet, in order. Returns the ids of the applied ones."""
+    pending = pending_migrations(migrations, applied_migrations(execute))
+    for migration in pending:
+        print(f"Applying migration {migration.id}...")
+        execute(migration_sql(migration))
+    if not pending:
+        print("Schema is up to date")
+    return [migration.id for migration in pending]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the schema migrations")
+    parser.add_argument(
+        "--sql",
+        action="store_true",
+        help="Print the migrations as plain SQL instead, e.g. for a local PostgreSQL",
+    )
+    args = parser.parse_args()
+
+    if args.sql:
+        print("-- Generated by scripts/migrations.py --sql, edit the migrations instead")
+        for migration in MIGRATIONS:
+            print(f"-- {migration.id}")
+            for statement in migration.statements:
+                print(textwrap.dedent(statement).strip() + ";")
+        return 0
+
+    from create_schema import execute_statement
+
+    apply_migrations(execute_statement)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
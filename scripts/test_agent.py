@@ -1,12 +1,173 @@
 import boto3
-# import json
+import csv
+import json
+import math
+import os
+import random
+import threading
 import time
 import argparse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Upper bounds of the latency histogram buckets of the load test, in seconds
+LATENCY_BUCKETS = [0.5, 1, 2, 3, 5, 8, 13, 21, 34]
+
+
+class StubAgentRuntime:
+    """
+    Offline stand-in for the bedrock-agent-runtime client: streams a canned completion after
+    a log-normal latency, and raises throttling errors at throttle_rate, to exercise the
+    load test without an agent.
+    """
+
+    def __init__(self, median_seconds=2.0, sigma=0.5, throttle_rate=0.0, error_rate=0.0, seed=None):
+        self.median_seconds = median_seconds
+        self.sigma = sigma
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def invoke_agent(self, agentId, agentAliasId, sessionId, inputText, enableTrace=False):
+        with self._lock:
+            latency = self.median_seconds * math.exp(self.random.gauss(0, self.sigma))
+            outcome = self.random.random()
+        if outcome < self.throttle_rate:
+            time.sleep(latency / 10)
+            raise Exception(
+                "An error occurred (throttlingException) when calling the InvokeAgent operation: Rate exceeded"
+            )
+        if outcome < self.throttle_rate + self.error_rate:
+            time.sleep(latency / 2)
+            raise Exception("An error occurred (dependencyFailedException) when calling the InvokeAgent operation")
+
+        def trace(part, data):
+            return {"trace": {"agentId": agentId, "sessionId": sessionId, "trace": {part: data}}}
+
+        def model_output(seconds, input_tokens, output_tokens):
+            time.sleep(seconds)
+            metadata = {"usage": {"inputTokens": input_tokens, "outputTokens": output_tokens}}
+            return trace("orchestrationTrace", {"modelInvocationOutput": {"metadata": metadata}})
+
+        def completion():
+            if enableTrace:
+                # Model, /generate and /execute calls, model again and the final answer
+                for api_path in ("/generate", "/execute"):
+                    yield trace("orchestrationTrace", {"modelInvocationInput": {"type": "ORCHESTRATION"}})
+                    yield model_output(latency * 0.15, 1200, 60)
+                    yield trace(
+                        "orchestrationTrace",
+                        {
+                            "invocationInput": {
+                                "invocationType": "ACTION_GROUP",
+                                "actionGroupInvocationInput": {"actionGroupName": "stub", "apiPath": api_path},
+                            }
+                        },
+                    )
+                    time.sleep(latency * 0.15)
+                    yield trace("orchestrationTrace", {"observation": {"type": "ACTION_GROUP"}})
+                yield trace("orchestrationTrace", {"modelInvocationInput": {"type": "ORCHESTRATION"}})
+                yield model_output(latency * 0.2, 1500, 80)
+                yield trace("orchestrationTrace", {"observation": {"type": "FINISH"}})
+            else:
+                time.sleep(latency * 0.8)
+            yield {"chunk": {"bytes": b"Stub answer to: "}}
+            time.sleep(latency * 0.2)
+            yield {"chunk": {"bytes": inputText.encode()}}
+
+        return {"sessionId": sessionId, "completion": completion()}
+
+
+# Trace parts of an agent invocation and the phase names used in the timing results
+TRACE_PHASES = {
+    "preProcessingTrace": "pre_processing",
+    "orchestrationTrace": "orchestration",
+    "postProcessingTrace": "post_processing",
+}
+
+
+def trace_timings(trace_entries, trace_times):
+    """
+    Steps of an invocation from its trace events and their arrival times in seconds since
+    the call: each model invocation (from its input to its output), each action group call
+    (from its input to its observation) and the final observation. The service-side
+    duration and the token usage are read from the trace metadata when it has them.
+    """
+    steps = []
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    open_steps = {}
+    previous = 0.0
+
+    def add_step(phase, kind, name, start, end, metadata=None):
+        steps.append(
+            {
+                "phase": phase,
+                "kind": kind,
+                "name": name,
+                "start": round(start, 4),
+                "end": round(end, 4),
+                "duration": round(end - start, 4),
+                "service_ms": (metadata or {}).get("totalTimeMs"),
+            }
+        )
+
+    for entry, at in zip(trace_entries, trace_times):
+        trace = entry.get("trace", {})
+        for part, phase in TRACE_PHASES.items():
+            data = trace.get(part)
+            if not data:
+                continue
+            if "modelInvocationInput" in data:
+                open_steps[(phase, "model")] = at
+            elif "modelInvocationOutput" in data:
+                metadata = data["modelInvocationOutput"].get("metadata", {})
+                usage["input_tokens"] += metadata.get("usage", {}).get("inputTokens", 0)
+                usage["output_tokens"] += metadata.get("usage", {}).get("outputTokens", 0)
+                start = open_steps.pop((phase, "model"), previous)
+                add_step(phase, "model_invocation", None, start, at, metadata)
+            elif "invocationInput" in data:
+                invocation = data["invocationInput"]
+                action = invocation.get("actionGroupInvocationInput", {})
+                name = (
+                    f"{action.get('actionGroupName', '')} {action.get('apiPath', '')}".strip()
+                    or invocation.get("invocationType")
+                )
+                open_steps[(phase, "action")] = (at, name)
+            elif "observation" in data:
+                observation = data["observation"]
+                if (phase, "action") in open_steps:
+                    start, name = open_steps.pop((phase, "action"))
+                    add_step(
+                        phase,
+                        "action_group",
+                        name,
+                        start,
+                        at,
+                        observation.get("actionGroupInvocationOutput", {}).get("metadata"),
+                    )
+                else:
+                    add_step(phase, "observation", observation.get("type"), previous, at)
+        previous = at
+
+    return steps, usage
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of the values, q in [0, 100]"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def is_throttle(error):
+    return "throttl" in error.lower() or "too many requests" in error.lower()
 
 
 class BedrockAgentTester:
-    def __init__(self):
-        self.bedrock_agent_runtime = boto3.client("bedrock-agent-runtime")
+    def __init__(self, bedrock_agent_runtime=None):
+        self.bedrock_agent_runtime = bedrock_agent_runtime or boto3.client("bedrock-agent-runtime")
         self.agent_id = "Update with BedrockAgentStack.AgentId"
         self.agent_alias_id = "TSTALIASID"
 
@@ -42,14 +203,19 @@ class BedrockAgentTester:
             "Can you find the members of AI in Education project ? ",
         ]
 
-    def invoke_agent(self, prompt, trace_enabled=False):
+    def invoke_agent(self, prompt, trace_enabled=False, session_id=None):
         """Invoke Bedrock agent and return response"""
         trace_info = []
+        # Arrival of each trace event, in seconds since the call
+        trace_times = []
+        time_to_first_chunk = None
+        started = time.perf_counter()
         try:
             response = self.bedrock_agent_runtime.invoke_agent(
                 agentId=self.agent_id,
                 agentAliasId=self.agent_alias_id,
-                sessionId=f"test-session-{int(time.time())}",
+                # Unique per call, concurrent invocations must not share a session
+                sessionId=session_id or f"test-session-{uuid.uuid4()}",
                 inputText=prompt,
                 enableTrace=trace_enabled,  # Enable tracing
             )
@@ -58,13 +224,17 @@ class BedrockAgentTester:
             completion = ""
 
             for event in response.get("completion"):
+                at = time.perf_counter() - started
                 if "chunk" in event:
                     chunk = event["chunk"]
                     # print("\n- chunk", chunk)
+                    if time_to_first_chunk is None:
+                        time_to_first_chunk = at
                     completion += chunk.get("bytes", b"").decode()
                 elif "trace" in event:
                     trace = event["trace"]
                     trace_info.append(trace)
+                    trace_times.append(at)
                 else:
                     print("\nevent", event)
 
@@ -72,10 +242,20 @@ class BedrockAgentTester:
                 "success": True,
                 "response": completion.strip(),
                 "trace": trace_info,
+                "trace_times": trace_times,
+                "time_to_first_chunk": time_to_first_chunk,
+                "total_time": time.perf_counter() - started,
             }
 
         except Exception as e:
-            return {"success": False, "error": str(e), "trace": trace_info}
+            return {
+                "success": False,
+                "error": str(e),
+                "trace": trace_info,
+                "trace_times": trace_times,
+                "time_to_first_chunk": time_to_first_chunk,
+                "total_time": time.perf_counter() - started,
+            }
 
     def print_trace_steps(self, trace_entries):
         """Print minimal information for each trace step"""
@@ -131,11 +311,12 @@ class BedrockAgentTester:
 
             traceback.print_exc()
 
-    def run_all_tests(self, trace_enabled=False):
+    def run_all_tests(self, trace_enabled=False, output_dir=None):
         """Run test cases and print results"""
         print("\nBEDROCK AGENT TEST RESULTS")
         print("=" * 50)
 
+        cases = []
         for i, test in enumerate(self.test_cases, 1):
             print(f"\nTest Case {i}")
             print("-" * 50)
@@ -143,7 +324,9 @@ class BedrockAgentTester:
 
             # Get agent response with trace
             print("\nInvoking Agent...")
-            result = self.invoke_agent(test, trace_enabled)
+            # The timings are computed from the trace
+            result = self.invoke_agent(test, trace_enabled or bool(output_dir))
+            cases.append(self.timing_result(i, test, result))
 
             if result["success"]:
                 print("\nAgent Response:")
@@ -157,9 +340,13 @@ class BedrockAgentTester:
                 print("\n❌ Error in response:")
                 print(result["error"])
 
+            self.print_timing(cases[-1])
             print("\n" + "=" * 50)
 
-    def run_single_test(self, trace_enabled=False):
+        if output_dir:
+            self.write_timing_results(cases, output_dir)
+
+    def run_single_test(self, trace_enabled=False, output_dir=None):
         """Run single test"""
 
         prompt = self.single_prompt
@@ -173,7 +360,9 @@ class BedrockAgentTester:
 
         # Get agent response with trace
         print("\nInvoking Agent...")
-        result = self.invoke_agent(prompt, trace_enabled)
+        # The timings are computed from the trace
+        result = self.invoke_agent(prompt, trace_enabled or bool(output_dir))
+        case = self.timing_result(1, prompt, result)
 
         if result["success"]:
             print("\nAgent Response:")
@@ -187,6 +376,221 @@ class BedrockAgentTester:
             print("\n❌ Error in response:")
             print(result["error"])
 
+        self.print_timing(case)
+        print("\n" + "=" * 50)
+
+        if output_dir:
+            self.write_timing_results([case], output_dir)
+
+    @staticmethod
+    def timing_result(index, prompt, result):
+        """Timings of one test case, as written to <output_dir>/case-<index>.json"""
+        steps, usage = trace_timings(result["trace"], result["trace_times"])
+        return {
+            "case": index,
+            "prompt": prompt,
+            "success": result["success"],
+            "response": result.get("response"),
+            "error": result.get("error"),
+            "time_to_first_chunk": result["time_to_first_chunk"],
+            "total_time": result["total_time"],
+            "input_tokens": usage["input_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "steps": steps,
+        }
+
+    @staticmethod
+    def print_timing(case):
+        first_chunk = case["time_to_first_chunk"]
+        print(
+            f"\n⏱️ First chunk: {first_chunk:.2f} s, total: {case['total_time']:.2f} s"
+            if first_chunk is not None
+            else f"\n⏱️ Total: {case['total_time']:.2f} s"
+        )
+        for step in case["steps"]:
+            name = f" {step['name']}" if step["name"] else ""
+            print(f"   {step['phase']} {step['kind']}{name}: {step['duration']:.2f} s")
+        if case["input_tokens"] or case["output_tokens"]:
+            print(f"   tokens: {case['input_tokens']} in, {case['output_tokens']} out")
+
+    @staticmethod
+    def write_timing_results(cases, output_dir):
+        """
+        One JSON file per test case, plus summary.csv with one row per test case and
+        steps.csv with one row per step, for analysis in a spreadsheet or pandas
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        for case in cases:
+            with open(os.path.join(output_dir, f"case-{case['case']:02d}.json"), "w") as f:
+                json.dump(case, f, indent=2)
+
+        with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                [
+                    "case", "prompt", "success", "time_to_first_chunk", "total_time",
+                    "model_time", "action_group_time", "input_tokens", "output_tokens",
+                ]
+            )
+            for case in cases:
+                writer.writerow(
+                    [
+                        case["case"],
+                        case["prompt"],
+                        case["success"],
+                        (
+                            round(case["time_to_first_chunk"], 4)
+                            if case["time_to_first_chunk"] is not None
+                            else None
+                        ),
+                        round(case["total_time"], 4),
+                        round(sum(s["duration"] for s in case["steps"] if s["kind"] == "model_invocation"), 4),
+                        round(sum(s["duration"] for s in case["steps"] if s["kind"] == "action_group"), 4),
+                        case["input_tokens"],
+                        case["output_tokens"],
+                    ]
+                )
+
+        with open(os.path.join(output_dir, "steps.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            fields = ["phase", "kind", "name", "start", "end", "duration", "service_ms"]
+            writer.writerow(["case"] + fields)
+            for case in cases:
+                for step in case["steps"]:
+                    writer.writerow([case["case"]] + [step[field] for field in fields])
+
+        print(f"\nTiming results written to {output_dir}")
+
+    def run_load_test(self, concurrency=4, rps=None, duration=60, ramp_up=0, prompts=None):
+        """
+        Invoke the agent from concurrency threads for duration seconds, cycling through the
+        test cases. With rps, invocations start at that rate (open loop): latencies count
+        from the scheduled start, invocations due while every thread is busy are dropped,
+        and those still running at the end of the run are counted as late. Without rps, each
+        thread starts the next invocation when the previous one finished. The rate, or the
+        number of active threads, grows linearly over ramp_up seconds. Returns the
+        statistics of the run.
+        """
+        prompts = prompts or self.test_cases
+        results = []
+        results_lock = threading.Lock()
+        running = set()
+        started = time.time()
+        deadline = started + duration
+
+        def invoke(n, scheduled=None):
+            call_started = time.time()
+            result = self.invoke_agent(prompts[n % len(prompts)])
+            # From the scheduled start in the open loop, so that a delayed start counts as well
+            latency = time.time() - (scheduled or call_started)
+            with results_lock:
+                running.discard(n)
+                results.append(
+                    {
+                        "latency": latency,
+                        "success": result["success"],
+                        "throttled": not result["success"] and is_throttle(result["error"]),
+                    }
+                )
+
+        def start_offset(n):
+            """Start of invocation n when the rate grows linearly to rps over ramp_up"""
+            ramp_invocations = rps * ramp_up / 2
+            if n < ramp_invocations:
+                return math.sqrt(2 * ramp_up * (n + 1) / rps)
+            return ramp_up + (n - ramp_invocations) / rps
+
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        if rps:
+            # Open loop: the schedule never waits for the agent, a busy pool drops invocations
+            # instead of queueing them
+            free = threading.Semaphore(concurrency)
+
+            def scheduled_invoke(n, scheduled):
+                try:
+                    invoke(n, scheduled)
+                finally:
+                    free.release()
+
+            n = 0
+            while started + start_offset(n) < deadline:
+                scheduled = started + start_offset(n)
+                time.sleep(max(0.0, scheduled - time.time()))
+                if free.acquire(blocking=False):
+                    with results_lock:
+                        running.add(n)
+                    pool.submit(scheduled_invoke, n, scheduled)
+                else:
+                    with results_lock:
+                        results.append({"dropped": True})
+                n += 1
+
+            time.sleep(max(0.0, deadline - time.time()))
+            with results_lock:
+                finished = results + [{"late": True}] * len(running)
+            # Late invocations finish in the background, after the statistics
+            pool.shutdown(wait=False)
+            return self.load_test_statistics(finished, duration)
+
+        # Closed loop: worker w joins after w / concurrency of the ramp-up
+        counter = iter(range(10**9))
+        counter_lock = threading.Lock()
+
+        def worker(w):
+            time.sleep(ramp_up * w / concurrency)
+            while time.time() < deadline:
+                with counter_lock:
+                    n = next(counter)
+                invoke(n)
+
+        for w in range(concurrency):
+            pool.submit(worker, w)
+        pool.shutdown(wait=True)
+        return self.load_test_statistics(results, time.time() - started)
+
+    @staticmethod
+    def load_test_statistics(results, elapsed):
+        """
+        Statistics of the invocation results. Dropped and late invocations count as
+        requests, but not in the error rates and latencies of the completed ones.
+        """
+        completed = [r for r in results if not r.get("dropped") and not r.get("late")]
+        latencies = [r["latency"] for r in completed if r["success"]]
+        errors = sum(1 for r in completed if not r["success"])
+        throttles = sum(1 for r in completed if r["throttled"])
+        histogram = {}
+        for latency in latencies:
+            bucket = next((b for b in LATENCY_BUCKETS if latency <= b), math.inf)
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        return {
+            "requests": len(results),
+            "dropped": sum(1 for r in results if r.get("dropped")),
+            "late": sum(1 for r in results if r.get("late")),
+            "elapsed": elapsed,
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "error_rate": errors / len(completed) if completed else 0.0,
+            "throttle_rate": throttles / len(completed) if completed else 0.0,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "histogram": [(b, histogram.get(b, 0)) for b in LATENCY_BUCKETS + [math.inf]],
+        }
+
+    @staticmethod
+    def print_load_test_statistics(stats):
+        print("\nBEDROCK AGENT LOAD TEST RESULTS")
+        print("=" * 50)
+        print(f"Requests:      {stats['requests']} in {stats['elapsed']:.1f} s")
+        if stats["dropped"] or stats["late"]:
+            print(f"Not completed: {stats['dropped']} dropped (all threads busy), {stats['late']} late")
+        print(f"Throughput:    {stats['throughput']:.2f} successful req/s")
+        print(f"Error rate:    {stats['error_rate']:.1%} (throttled {stats['throttle_rate']:.1%})")
+        print(f"Latency:       p50 {stats['p50']:.2f} s, p90 {stats['p90']:.2f} s, p99 {stats['p99']:.2f} s")
+        print("\nLatency histogram:")
+        total = sum(count for _, count in stats["histogram"]) or 1
+        for bound, count in stats["histogram"]:
+            label = f"<= {bound:g} s" if bound != math.inf else f"> {LATENCY_BUCKETS[-1]:g} s"
+            print(f"{label:>9} {count:>6} {'#' * round(40 * count / total)}")
         print("\n" + "=" * 50)
 
 
@@ -196,9 +600,9 @@ def main():
     parser = argparse.ArgumentParser(description="Bedrock Agent Tester")
     parser.add_argument(
         "--test-type",
-        choices=["single", "all"],
+        choices=["single", "all", "load"],
         default="single",
-        help="Run single test or all tests",
+        help="Run single test, all tests or a load test",
     )
     parser.add_argument(
         "--trace",
@@ -206,16 +610,46 @@ def main():
         help="Enable trace output",
     )
 
+    parser.add_argument(
+        "--output-dir",
+        help="Write the timings of each test case as JSON and CSV to this directory",
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="Load test threads")
+    parser.add_argument(
+        "--rps",
+        type=float,
+        help="Target invocations per second of the load test, default as fast as the threads allow",
+    )
+    parser.add_argument("--duration", type=float, default=60, help="Load test duration in seconds")
+    parser.add_argument("--ramp-up", type=float, default=0, help="Load test ramp-up in seconds")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use a stubbed bedrock-agent-runtime client instead of the deployed agent",
+    )
+    parser.add_argument(
+        "--stub-throttle-rate",
+        type=float,
+        default=0.0,
+        help="Share of throttled invocations of the stubbed client",
+    )
+
     # Parse arguments
     args = parser.parse_args()
 
-    tester = BedrockAgentTester()
+    tester = BedrockAgentTester(
+        StubAgentRuntime(throttle_rate=args.stub_throttle_rate) if args.offline else None
+    )
 
     # Run tests based on arguments
     if args.test_type == "single":
-        tester.run_single_test(args.trace)
+        tester.run_single_test(args.trace, args.output_dir)
+    elif args.test_type == "load":
+        tester.print_load_test_statistics(
+            tester.run_load_test(args.concurrency, args.rps, args.duration, args.ramp_up)
+        )
     else:
-        tester.run_all_tests(args.trace)
+        tester.run_all_tests(args.trace, args.output_dir)
 
 
 if __name__ == "__main__":
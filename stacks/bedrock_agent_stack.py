@@ -1,13 +1,20 @@
+import json
 
 from aws_cdk import (
     Stack,
-    # aws_ec2 as ec2,
+    aws_ec2 as ec2,
     aws_iam as iam,
     aws_lambda as lambda_,
     aws_bedrock as bedrock,
+    aws_applicationautoscaling as appscaling,
+    aws_dynamodb as dynamodb,
+    aws_events as events,
+    aws_events_targets as events_targets,
     Duration,
+    Fn,
     CfnOutput,
     CfnParameter,
+    RemovalPolicy,
 )
 from constructs import Construct
 
@@ -87,31 +94,245 @@ class BedrockAgentStack(Stack):
             )
         )
 
-        # Create Lambda function
-        generate_query_lambda = lambda_.Function(
-            self,
-            "GenerateAndExecuteQueryFunction",
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/action_group"),
-            timeout=Duration.seconds(30),
-            environment={
-                "READONLY_SECRET_ARN": secret_arn,
-                "DB_NAME": db_name,
-                "CLUSTER_ARN": cluster_arn,
-                "model_id": model_id,
-            },
-            role=generate_query_lambda_role,
+        lambda_environment = {
+            "READONLY_SECRET_ARN": secret_arn,
+            "DB_NAME": db_name,
+            "CLUSTER_ARN": cluster_arn,
+            "model_id": model_id,
+        }
+
+        # Failover list of model ids / inference profiles and client-side rate limit for /generate
+        bedrock_model_ids = self.node.try_get_context("bedrock_model_ids")
+        if bedrock_model_ids:
+            if isinstance(bedrock_model_ids, str):
+                bedrock_model_ids = bedrock_model_ids.split(",")
+            lambda_environment["BEDROCK_MODEL_IDS"] = ",".join(bedrock_model_ids)
+        bedrock_requests_per_second = self.node.try_get_context(
+            "bedrock_requests_per_second"
         )
+        if bedrock_requests_per_second is not None:
+            lambda_environment["BEDROCK_REQUESTS_PER_SECOND"] = str(
+                bedrock_requests_per_second
+            )
 
-        # Add resource policy to allow Bedrock Agent to invoke the Lambda function
-        generate_query_lambda.add_permission(
-            "BedrockAgentInvokePermission",
-            principal=iam.ServicePrincipal("bedrock.amazonaws.com"),
-            action="lambda:InvokeFunction",
-            source_account=Stack.of(self).account,
-            source_arn=f"arn:aws:bedrock:{Stack.of(self).region}:{Stack.of(self).account}:agent/*",
+        # Optional prompt token budget, schema detail is trimmed to fit it
+        prompt_token_budget = self.node.try_get_context("prompt_token_budget")
+        if prompt_token_budget is not None:
+            lambda_environment["PROMPT_TOKEN_BUDGET"] = str(prompt_token_budget)
+
+        # Optional EXPLAIN based self-correction of generated SQL inside /generate
+        self_correction_max_attempts = self.node.try_get_context(
+            "self_correction_max_attempts"
         )
+        if self_correction_max_attempts is not None:
+            lambda_environment["SELF_CORRECTION_MAX_ATTEMPTS"] = str(
+                self_correction_max_attempts
+            )
+
+        # Optional routing of simple questions to a faster, cheaper model
+        for key in ("simple_model_id", "complex_model_id", "simple_max_score", "max_tokens"):
+            value = self.node.try_get_context(f"router_{key}")
+            if value is not None:
+                lambda_environment[f"ROUTER_{key.upper()}"] = str(value)
+
+        # Optional hedged requests to cut the tail latency of SQL generation
+        if self._context_flag("hedge_enabled"):
+            lambda_environment["HEDGE_ENABLED"] = "true"
+            for key in ("percentile", "default_delay_ms", "max_rate", "model_id"):
+                value = self.node.try_get_context(f"hedge_{key}")
+                if value is not None:
+                    lambda_environment[f"HEDGE_{key.upper()}"] = str(value)
+
+        # Optional idempotency store so that agent retries do not regenerate and re-run queries
+        idempotency_store = self.node.try_get_context("idempotency_store") or "none"
+        lambda_environment["IDEMPOTENCY_STORE"] = idempotency_store
+        if idempotency_store == "dynamodb":
+            idempotency_table = dynamodb.Table(
+                self,
+                "IdempotencyTable",
+                partition_key=dynamodb.Attribute(
+                    name="idempotency_key", type=dynamodb.AttributeType.STRING
+                ),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",
+                point_in_time_recovery=True,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            idempotency_table.grant(
+                generate_query_lambda_role,
+                "dynamodb:GetItem",
+                "dynamodb:PutItem",
+                "dynamodb:DeleteItem",
+            )
+            lambda_environment["IDEMPOTENCY_TABLE"] = idempotency_table.table_name
+        if self.node.try_get_context("idempotency_ttl_seconds") is not None:
+            lambda_environment["IDEMPOTENCY_TTL_SECONDS"] = str(
+                self.node.try_get_context("idempotency_ttl_seconds")
+            )
+
+        # Optional refresh of the cached schema after DDL, through the agent_meta version row
+        schema_version_check_seconds = self.node.try_get_context(
+            "schema_version_check_seconds"
+        )
+        if schema_version_check_seconds is not None:
+            lambda_environment["SCHEMA_VERSION_CHECK_SECONDS"] = str(
+                schema_version_check_seconds
+            )
+
+        # Optional SQL templates answering frequent questions without calling the model
+        if self._context_flag("intent_templates_enabled"):
+            lambda_environment["INTENT_TEMPLATES_ENABLED"] = "true"
+            if self.node.try_get_context("intent_values_ttl_seconds") is not None:
+                lambda_environment["INTENT_VALUES_TTL_SECONDS"] = str(
+                    self.node.try_get_context("intent_values_ttl_seconds")
+                )
+
+        # Optional stored values of low-cardinality columns in the prompt
+        if self._context_flag("column_values_enabled"):
+            lambda_environment["COLUMN_VALUES_ENABLED"] = "true"
+            for key in ("ttl_seconds", "max_distinct", "max_values", "max_queries"):
+                value = self.node.try_get_context(f"column_values_{key}")
+                if value is not None:
+                    lambda_environment[f"COLUMN_VALUES_{key.upper()}"] = str(value)
+
+        # Optional row estimates and indexes of each table in the prompt
+        if self._context_flag("table_stats_enabled"):
+            lambda_environment["TABLE_STATS_ENABLED"] = "true"
+            if self.node.try_get_context("table_stats_ttl_seconds") is not None:
+                lambda_environment["TABLE_STATS_TTL_SECONDS"] = str(
+                    self.node.try_get_context("table_stats_ttl_seconds")
+                )
+
+        # Optional routing of requests to other databases through the "database" session
+        # attribute, e.g. {"analytics": {"database": "analytics", "cluster_arn": "..."}}
+        database_routes = self.node.try_get_context("database_routes") or {}
+        if isinstance(database_routes, str):
+            database_routes = json.loads(database_routes)
+        if database_routes:
+            lambda_environment["DATABASE_ROUTES"] = json.dumps(database_routes)
+            routed_clusters = sorted(
+                {r["cluster_arn"] for r in database_routes.values() if "cluster_arn" in r}
+            )
+            routed_secrets = sorted(
+                {r["secret_arn"] for r in database_routes.values() if "secret_arn" in r}
+            )
+            if routed_clusters:
+                generate_query_lambda_role.add_to_policy(
+                    iam.PolicyStatement(
+                        actions=["rds-data:ExecuteStatement"],
+                        resources=routed_clusters,
+                    )
+                )
+            if routed_secrets:
+                generate_query_lambda_role.add_to_policy(
+                    iam.PolicyStatement(
+                        actions=["secretsmanager:GetSecretValue"],
+                        resources=routed_secrets,
+                    )
+                )
+        for key in (
+            "database_cache_max_entries",
+            "database_cache_max_mb",
+            "generated_query_cache_size",
+        ):
+            value = self.node.try_get_context(key)
+            if value is not None:
+                lambda_environment[key.upper()] = str(value)
+
+        # Optional routing of /execute queries to the Aurora readers over a direct connection,
+        # with a fallback to the writer through the Data API when the replica lags. Needs
+        # psycopg2 from a Lambda layer and a function that can reach the reader endpoint.
+        reader_endpoint = self.node.try_get_context("reader_endpoint")
+        if reader_endpoint:
+            lambda_environment["READER_ENDPOINT"] = reader_endpoint
+            for key in ("port", "max_lag_ms", "lag_check_seconds", "retry_seconds"):
+                value = self.node.try_get_context(f"reader_{key}")
+                if value is not None:
+                    lambda_environment[f"READER_{key.upper()}"] = str(value)
+
+        # Optional few-shot examples retrieved from previously executed questions, shared
+        # between execution environments through a snapshot in an existing S3 bucket
+        layers = []
+        if self._context_flag("few_shot_enabled"):
+            lambda_environment["FEW_SHOT_ENABLED"] = "true"
+            for key in ("max_pairs", "k", "min_score", "snapshot_key", "sync_seconds"):
+                value = self.node.try_get_context(f"few_shot_{key}")
+                if value is not None:
+                    lambda_environment[f"FEW_SHOT_{key.upper()}"] = str(value)
+            snapshot_bucket = self.node.try_get_context("few_shot_snapshot_bucket")
+            if not snapshot_bucket and self._context_flag("split_action_group_functions"):
+                # The execute function stores the pairs the generate function reads
+                raise ValueError(
+                    "few_shot_enabled with split_action_group_functions requires "
+                    "few_shot_snapshot_bucket"
+                )
+            if snapshot_bucket:
+                lambda_environment["FEW_SHOT_SNAPSHOT_BUCKET"] = snapshot_bucket
+                snapshot_key = lambda_environment.get(
+                    "FEW_SHOT_SNAPSHOT_KEY", "few_shot/snapshot.json"
+                )
+                snapshot_resources = [f"arn:aws:s3:::{snapshot_bucket}/{snapshot_key}"]
+                if database_routes:
+                    # Routed databases use snapshot-<database>.json next to the default one
+                    stem = snapshot_key.rpartition(".")[0] or snapshot_key
+                    snapshot_resources.append(f"arn:aws:s3:::{snapshot_bucket}/{stem}-*")
+                generate_query_lambda_role.add_to_policy(
+                    iam.PolicyStatement(
+                        actions=["s3:GetObject", "s3:PutObject"],
+                        resources=snapshot_resources,
+                    )
+                )
+            # NumPy speeds up the similarity search, the pure Python fallback is used without it
+            numpy_layer_arn = self.node.try_get_context("few_shot_numpy_layer_arn")
+            if numpy_layer_arn:
+                layers.append(
+                    lambda_.LayerVersion.from_layer_version_arn(
+                        self, "NumpyLayer", numpy_layer_arn
+                    )
+                )
+
+        # Optional placement of the action group functions in the VPC of the cluster, e.g. to
+        # reach the RDS Proxy or the readers of the RDSAuroraStack (see its PRIVATE_SUBNET_IDS
+        # and PROXY_CLIENT_SECURITY_GROUP_ID outputs)
+        network = self._lambda_network()
+
+        driver_layer_arn = self.node.try_get_context("reader_driver_layer_arn")
+        if reader_endpoint and driver_layer_arn:
+            layers.append(
+                lambda_.LayerVersion.from_layer_version_arn(
+                    self, "DriverLayer", driver_layer_arn
+                )
+            )
+
+        if self._context_flag("split_action_group_functions"):
+            # Deploy /generate and /execute as two functions from the same code package,
+            # each sized and scaled on its own. Settings fall back to the lambda_* keys.
+            generate_query_target = self._create_action_group_function(
+                "GenerateQueryFunction",
+                self._lambda_settings("generate_lambda", fallback_prefix="lambda"),
+                {**lambda_environment, "ACTION_GROUP_MODE": "generate"},
+                generate_query_lambda_role,
+                layers,
+                network,
+            )
+            execute_query_target = self._create_action_group_function(
+                "ExecuteQueryFunction",
+                self._lambda_settings("execute_lambda", fallback_prefix="lambda"),
+                {**lambda_environment, "ACTION_GROUP_MODE": "execute"},
+                generate_query_lambda_role,
+                layers,
+                network,
+            )
+        else:
+            generate_query_target = self._create_action_group_function(
+                "GenerateAndExecuteQueryFunction",
+                self._lambda_settings("lambda"),
+                lambda_environment,
+                generate_query_lambda_role,
+                layers,
+                network,
+            )
+            execute_query_target = generate_query_target
 
         # Create IAM role for Bedrock Agent
         agent_role = iam.Role(
@@ -154,7 +375,14 @@ class BedrockAgentStack(Stack):
             iam.PolicyStatement(
                 effect=iam.Effect.ALLOW,
                 actions=["lambda:InvokeFunction"],
-                resources=[generate_query_lambda.function_arn],
+                resources=(
+                    [generate_query_target.function_arn]
+                    if execute_query_target is generate_query_target
+                    else [
+                        generate_query_target.function_arn,
+                        execute_query_target.function_arn,
+                    ]
+                ),
             )
         )
 
@@ -356,7 +584,7 @@ class BedrockAgentStack(Stack):
                 bedrock.CfnAgent.AgentActionGroupProperty(
                     action_group_name="generate-query",
                     action_group_executor=bedrock.CfnAgent.ActionGroupExecutorProperty(
-                        lambda_=generate_query_lambda.function_arn
+                        lambda_=generate_query_target.function_arn
                     ),
                     description="Generates SQL queries from natural language prompts",
                     action_group_state="ENABLED",
@@ -367,7 +595,7 @@ class BedrockAgentStack(Stack):
                 bedrock.CfnAgent.AgentActionGroupProperty(
                     action_group_name="execute-query",
                     action_group_executor=bedrock.CfnAgent.ActionGroupExecutorProperty(
-                        lambda_=generate_query_lambda.function_arn
+                        lambda_=execute_query_target.function_arn
                     ),
                     description="Executes SQL queries against the database",
                     action_group_state="ENABLED",
@@ -379,6 +607,49 @@ class BedrockAgentStack(Stack):
         )
         agent.node.add_dependency(agent_role)
 
+        # Optional schedule keeping the database and warmer_concurrency execution environments
+        # of each function warm, e.g. during business hours. Warmup events skip Bedrock.
+        if self._context_flag("warmer_enabled"):
+            schedule = self.node.try_get_context("warmer_schedule") or (
+                "cron(0/5 7-18 ? * MON-FRI *)"
+            )
+            concurrency = int(self.node.try_get_context("warmer_concurrency") or 1)
+            warmed_targets = (
+                [generate_query_target]
+                if execute_query_target is generate_query_target
+                else [generate_query_target, execute_query_target]
+            )
+            for index, warmed_target in enumerate(warmed_targets):
+                events.Rule(
+                    self,
+                    f"WarmerRule{index}",
+                    description="Keeps the action group function and Aurora warm",
+                    schedule=events.Schedule.expression(schedule),
+                    targets=[
+                        events_targets.LambdaFunction(
+                            warmed_target,
+                            event=events.RuleTargetInput.from_object(
+                                {"warmup": True, "concurrency": concurrency}
+                            ),
+                            retry_attempts=0,
+                        )
+                    ],
+                )
+            if concurrency > 1:
+                # The warmup invocation fans out to the other execution environments. Not
+                # in the default policy of the role, which the functions depend on.
+                iam.Policy(
+                    self,
+                    "WarmerFanOutPolicy",
+                    roles=[generate_query_lambda_role],
+                    statements=[
+                        iam.PolicyStatement(
+                            actions=["lambda:InvokeFunction"],
+                            resources=[t.function_arn for t in warmed_targets],
+                        )
+                    ],
+                )
+
         # Create agent alias
         # agent_alias = bedrock.CfnAgentAlias(
         #     self,
@@ -390,3 +661,186 @@ class BedrockAgentStack(Stack):
         # Outputs
         CfnOutput(self, "AgentId", value=agent.ref)
         # CfnOutput(self, "AgentAliasId", value=agent_alias.ref)
+
+    def _context_flag(self, key: str) -> bool:
+        """Read a boolean from the cdk context, accepting "true"/"false" strings from -c"""
+        value = self.node.try_get_context(key)
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "1", "yes")
+        return bool(value)
+
+    def _create_action_group_function(
+        self,
+        construct_id: str,
+        settings: dict,
+        environment: dict,
+        role: iam.IRole,
+        layers: list = None,
+        network: dict = None,
+    ) -> lambda_.IFunction:
+        """
+        Create an action group Lambda function from the shared code package and allow the
+        Bedrock agents of this account to invoke it. Returns the invocation target, which is
+        the "live" alias when provisioned concurrency is configured.
+        """
+        function = lambda_.Function(
+            self,
+            construct_id,
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            handler="index.handler",
+            code=lambda_.Code.from_asset("lambda/action_group"),
+            memory_size=settings["memory_size"],
+            architecture=settings["architecture"],
+            timeout=settings["timeout"],
+            reserved_concurrent_executions=settings["reserved_concurrency"],
+            environment=environment,
+            role=role,
+            layers=layers or None,
+            **(network or {}),
+        )
+
+        target = self._add_provisioned_alias(
+            function, construct_id.replace("Function", "Alias"), settings
+        )
+
+        # Add resource policy to allow Bedrock Agent to invoke the Lambda function
+        target.add_permission(
+            "BedrockAgentInvokePermission",
+            principal=iam.ServicePrincipal("bedrock.amazonaws.com"),
+            action="lambda:InvokeFunction",
+            source_account=Stack.of(self).account,
+            source_arn=f"arn:aws:bedrock:{Stack.of(self).region}:{Stack.of(self).account}:agent/*",
+        )
+
+        return target
+
+    def _context_list(self, key: str) -> list:
+        """Read a list from the cdk context, accepting comma separated strings from -c"""
+        value = self.node.try_get_context(key) or []
+        if isinstance(value, str):
+            value = value.split(",")
+        return [item.strip() for item in value if item.strip()]
+
+    def _lambda_network(self) -> dict:
+        """
+        VPC arguments of the action group functions from lambda_vpc_id, lambda_subnet_ids and
+        lambda_security_group_ids, empty when lambda_vpc_id is not set
+        """
+        vpc_id = self.node.try_get_context("lambda_vpc_id")
+        if not vpc_id:
+            return {}
+        subnet_ids = self._context_list("lambda_subnet_ids")
+        security_group_ids = self._context_list("lambda_security_group_ids")
+        if not subnet_ids or not security_group_ids:
+            raise ValueError(
+                "lambda_vpc_id requires lambda_subnet_ids and lambda_security_group_ids"
+            )
+        return {
+            "vpc": ec2.Vpc.from_vpc_attributes(
+                self,
+                "LambdaVpc",
+                vpc_id=vpc_id,
+                availability_zones=Fn.get_azs(),
+            ),
+            "vpc_subnets": ec2.SubnetSelection(
+                subnets=[
+                    ec2.Subnet.from_subnet_id(self, f"LambdaSubnet{index}", subnet_id)
+                    for index, subnet_id in enumerate(subnet_ids)
+                ]
+            ),
+            "security_groups": [
+                ec2.SecurityGroup.from_security_group_id(
+                    self, f"LambdaSecurityGroup{index}", security_group_id
+                )
+                for index, security_group_id in enumerate(security_group_ids)
+            ],
+        }
+
+    def _lambda_settings(self, prefix: str, fallback_prefix: str = None) -> dict:
+        """
+        Read the sizing and concurrency settings of a Lambda function from the cdk context.
+        Keys are named <prefix>_<setting>, e.g. lambda_memory_size or lambda_architecture,
+        and default to <fallback_prefix>_<setting> when given.
+        """
+
+        def context(key, default=None):
+            value = self.node.try_get_context(f"{prefix}_{key}")
+            if value is None and fallback_prefix:
+                value = self.node.try_get_context(f"{fallback_prefix}_{key}")
+            return default if value is None else value
+
+        architecture = str(context("architecture", "x86_64")).lower()
+        if architecture not in ("arm64", "x86_64"):
+            raise ValueError(
+                f"Invalid {prefix}_architecture '{architecture}', expected arm64 or x86_64"
+            )
+
+        reserved_concurrency = context("reserved_concurrency")
+        provisioned_concurrency = context("provisioned_concurrency")
+
+        return {
+            "memory_size": int(context("memory_size", 128)),
+            "architecture": (
+                lambda_.Architecture.ARM_64
+                if architecture == "arm64"
+                else lambda_.Architecture.X86_64
+            ),
+            "timeout": Duration.seconds(int(context("timeout", 30))),
+            "reserved_concurrency": (
+                int(reserved_concurrency) if reserved_concurrency is not None else None
+            ),
+            "provisioned_concurrency": (
+                int(provisioned_concurrency)
+                if provisioned_concurrency is not None
+                else None
+            ),
+            # Optional Application Auto Scaling schedule for the provisioned concurrency:
+            # {"max_capacity": 10, "actions": [{"name": "BusinessHours",
+            #   "cron": "0 7 ? * MON-FRI *", "min_capacity": 5}, ...]}
+            "provisioned_concurrency_schedule": context(
+                "provisioned_concurrency_schedule"
+            ),
+        }
+
+    def _add_provisioned_alias(
+        self, function: lambda_.Function, alias_id: str, settings: dict
+    ) -> lambda_.IFunction:
+        """
+        Publish a "live" alias with provisioned concurrency for the function and optionally
+        scale it on a schedule. Returns the function itself when no provisioned concurrency is set.
+        """
+        provisioned_concurrency = settings["provisioned_concurrency"]
+        if not provisioned_concurrency:
+            return function
+
+        alias = lambda_.Alias(
+            self,
+            alias_id,
+            alias_name="live",
+            version=function.current_version,
+            provisioned_concurrent_executions=provisioned_concurrency,
+        )
+
+        schedule = settings["provisioned_concurrency_schedule"]
+        if schedule:
+            actions = schedule.get("actions", [])
+            max_capacity = int(
+                schedule.get(
+                    "max_capacity",
+                    max(
+                        [provisioned_concurrency]
+                        + [int(action["min_capacity"]) for action in actions]
+                    ),
+                )
+            )
+            scaling = alias.add_auto_scaling(
+                min_capacity=provisioned_concurrency, max_capacity=max_capacity
+            )
+            for action in actions:
+                scaling.scale_on_schedule(
+                    action["name"],
+                    schedule=appscaling.Schedule.expression(f"cron({action['cron']})"),
+                    min_capacity=int(action["min_capacity"]),
+                )
+
+        return alias
@@ -84,6 +84,41 @@ class RDSAuroraStack(Stack):
             ),
         )
 
+        # Cluster parameters to find and explain slow generated queries: pg_stat_statements,
+        # auto_explain above a duration threshold and I/O timings, plus planner settings for
+        # Aurora storage. db_cluster_parameters overrides or adds parameters. Opt-in with
+        # tuned_parameters: changes of shared_preload_libraries take effect after the next
+        # reboot of the instances.
+        cluster_parameter_group = None
+        if engine_version and self._context_flag("tuned_parameters"):
+            parameters = {
+                "shared_preload_libraries": "pg_stat_statements,auto_explain",
+                "pg_stat_statements.track": "top",
+                "auto_explain.log_min_duration": str(
+                    self.node.try_get_context("auto_explain_min_duration_ms") or 1000
+                ),
+                "auto_explain.log_analyze": "0",
+                "auto_explain.log_format": "json",
+                "track_io_timing": "1",
+                "work_mem": str(self.node.try_get_context("work_mem_kb") or 16384),
+                "random_page_cost": str(
+                    self.node.try_get_context("random_page_cost") or 1.1
+                ),
+                **{
+                    key: str(value)
+                    for key, value in (
+                        self.node.try_get_context("db_cluster_parameters") or {}
+                    ).items()
+                },
+            }
+            cluster_parameter_group = rds.CfnDBClusterParameterGroup(
+                self,
+                "AuroraClusterParameterGroup",
+                description="Aurora PostgreSQL parameters for the Bedrock agent queries",
+                family=f"aurora-postgresql{str(engine_version).split('.')[0]}",
+                parameters=parameters,
+            )
+
         # Aurora DB Cluste
         db_cluster = rds.CfnDBCluster(
             self,
@@ -102,6 +137,9 @@ class RDSAuroraStack(Stack):
                 "aurora-serverless-global-db-secret:SecretString:password",
             ).to_string(),
             vpc_security_group_ids=[db_security_group.security_group_id],
+            db_cluster_parameter_group_name=(
+                cluster_parameter_group.ref if cluster_parameter_group else None
+            ),
             enable_http_endpoint=True,
             serverless_v2_scaling_configuration=rds.CfnDBCluster.ServerlessV2ScalingConfigurationProperty(
                 min_capacity=min_acu,  # Minimum ACU value
@@ -128,6 +166,26 @@ class RDSAuroraStack(Stack):
         )
         db_instance.add_dependency(db_cluster)
 
+        # Optional Serverless v2 readers for the queries run by the agent, so that analytical
+        # SELECTs do not compete with the application writes on the writer. Promotion tiers
+        # above 1 let the readers scale on their own load instead of following the writer.
+        reader_instances = int(self.node.try_get_context("reader_instances") or 0)
+        for index in range(reader_instances):
+            reader_instance = rds.CfnDBInstance(
+                self,
+                f"serverless-db-reader-{index + 1}",
+                db_cluster_identifier=db_cluster.ref,
+                db_instance_class="db.serverless",
+                db_instance_identifier=f"serverless-db-reader-{index + 1}",
+                engine="aurora-postgresql",
+                engine_version=engine_version,
+                promotion_tier=int(
+                    self.node.try_get_context("reader_promotion_tier") or 2
+                ),
+            )
+            # Added after the writer, which is the first instance of the cluster
+            reader_instance.add_dependency(db_instance)
+
         # Construct the ARN
         Fn.join(
             ":",
@@ -202,6 +260,11 @@ class RDSAuroraStack(Stack):
         )
         create_user_lambda.node.add_dependency(db_instance)
 
+        # Bounds the runtime of the generated queries at the database, on by default, "0"
+        # disables it. Part of the payload, so that changing it updates the custom resource.
+        statement_timeout = self.node.try_get_context("readonly_statement_timeout")
+        statement_timeout = "30s" if statement_timeout is None else str(statement_timeout)
+
         create_user_custom_resource = cr.AwsCustomResource(
             self,
             "CreateReadOnlyCustomResource",
@@ -215,6 +278,24 @@ class RDSAuroraStack(Stack):
                         {
                             "RequestType": "Create",
                             "StackId": self.stack_id,
+                            "StatementTimeout": statement_timeout,
+                        }
+                    ),
+                },
+                physical_resource_id=cr.PhysicalResourceId.of("ReadOnlyUserCreation"),
+            ),
+            # Provisioning is idempotent, an update re-applies it
+            on_update=cr.AwsSdkCall(
+                service="Lambda",
+                action="invoke",
+                parameters={
+                    "FunctionName": create_user_lambda.function_name,
+                    "InvocationType": "RequestResponse",
+                    "Payload": json.dumps(
+                        {
+                            "RequestType": "Update",
+                            "StackId": self.stack_id,
+                            "StatementTimeout": statement_timeout,
                         }
                     ),
                 },
@@ -247,6 +328,148 @@ class RDSAuroraStack(Stack):
         # Ensure Custom Resource is created after the Lambda
         create_user_custom_resource.node.add_dependency(create_user_lambda)
 
+        # Optional RDS Proxy pooling the direct connections of the action group functions,
+        # which would otherwise exhaust the connections of a cluster at min_acu. The proxy
+        # authenticates with the read-only secret. Functions placed in the VPC reach it with
+        # the client security group, and AWS services through VPC endpoints, since the
+        # private subnets have no NAT gateway.
+        if self._context_flag("rds_proxy"):
+            proxy_security_group = ec2.SecurityGroup(
+                self,
+                "proxy-security-group",
+                description="RDS Proxy of the Aurora cluster",
+                allow_all_outbound=True,
+                vpc=vpc,
+            )
+            proxy_client_security_group = ec2.SecurityGroup(
+                self,
+                "proxy-client-security-group",
+                description="Clients of the RDS Proxy, e.g. the action group functions",
+                allow_all_outbound=True,
+                vpc=vpc,
+            )
+            proxy_security_group.add_ingress_rule(
+                proxy_client_security_group, ec2.Port.tcp(5432), "Proxy clients"
+            )
+            db_security_group.add_ingress_rule(
+                proxy_security_group, ec2.Port.tcp(5432), "RDS Proxy"
+            )
+
+            proxy_role = iam.Role(
+                self,
+                "RDSProxyRole",
+                assumed_by=iam.ServicePrincipal("rds.amazonaws.com"),
+                description="Role for the RDS Proxy to read the read-only user secret",
+            )
+            proxy_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=["secretsmanager:GetSecretValue"],
+                    resources=[readonly_credentials.attr_id],
+                )
+            )
+
+            db_proxy = rds.CfnDBProxy(
+                self,
+                "RDSProxy",
+                db_proxy_name=f"{construct_id}-proxy".lower(),
+                engine_family="POSTGRESQL",
+                auth=[
+                    rds.CfnDBProxy.AuthFormatProperty(
+                        auth_scheme="SECRETS",
+                        secret_arn=readonly_credentials.attr_id,
+                        iam_auth="DISABLED",
+                    )
+                ],
+                role_arn=proxy_role.role_arn,
+                vpc_subnet_ids=subnet_ids,
+                vpc_security_group_ids=[proxy_security_group.security_group_id],
+                require_tls=True,
+                idle_client_timeout=int(
+                    self.node.try_get_context("proxy_idle_client_timeout") or 1800
+                ),
+            )
+
+            pool_configuration = {}
+            for key in ("max_connections_percent", "max_idle_connections_percent"):
+                value = self.node.try_get_context(f"proxy_{key}")
+                if value is not None:
+                    pool_configuration[key] = int(value)
+            proxy_target_group = rds.CfnDBProxyTargetGroup(
+                self,
+                "RDSProxyTargetGroup",
+                db_proxy_name=db_proxy.ref,
+                target_group_name="default",
+                db_cluster_identifiers=[db_cluster.ref],
+                connection_pool_configuration_info=(
+                    rds.CfnDBProxyTargetGroup.ConnectionPoolConfigurationInfoFormatProperty(
+                        **pool_configuration
+                    )
+                    if pool_configuration
+                    else None
+                ),
+            )
+            # The cluster needs an available instance to be registered as a target
+            proxy_target_group.add_dependency(db_instance)
+
+            CfnOutput(
+                self,
+                "PROXY_ENDPOINT",
+                value=db_proxy.attr_endpoint,
+                export_name="ProxyEndpoint",
+            )
+            if reader_instances:
+                proxy_reader_endpoint = rds.CfnDBProxyEndpoint(
+                    self,
+                    "RDSProxyReaderEndpoint",
+                    db_proxy_endpoint_name=f"{construct_id}-proxy-reader".lower(),
+                    db_proxy_name=db_proxy.ref,
+                    target_role="READ_ONLY",
+                    vpc_subnet_ids=subnet_ids,
+                    vpc_security_group_ids=[proxy_security_group.security_group_id],
+                )
+                proxy_reader_endpoint.add_dependency(proxy_target_group)
+                CfnOutput(
+                    self,
+                    "PROXY_READER_ENDPOINT",
+                    value=proxy_reader_endpoint.attr_endpoint,
+                    export_name="ProxyReaderEndpoint",
+                )
+
+            for name, service in (
+                ("SecretsManager", ec2.InterfaceVpcEndpointAwsService.SECRETS_MANAGER),
+                ("RdsData", ec2.InterfaceVpcEndpointAwsService.RDS_DATA),
+                ("BedrockRuntime", ec2.InterfaceVpcEndpointAwsService.BEDROCK_RUNTIME),
+                ("Lambda", ec2.InterfaceVpcEndpointAwsService.LAMBDA_),
+            ):
+                vpc.add_interface_endpoint(
+                    f"{name}Endpoint",
+                    service=service,
+                    subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+                    security_groups=[proxy_client_security_group],
+                )
+            proxy_client_security_group.add_ingress_rule(
+                proxy_client_security_group, ec2.Port.tcp(443), "VPC endpoints"
+            )
+            for name, service in (
+                ("S3", ec2.GatewayVpcEndpointAwsService.S3),
+                ("DynamoDB", ec2.GatewayVpcEndpointAwsService.DYNAMODB),
+            ):
+                vpc.add_gateway_endpoint(f"{name}Endpoint", service=service)
+
+            CfnOutput(self, "VPC_ID", value=vpc.vpc_id, export_name="VpcId")
+            CfnOutput(
+                self,
+                "PRIVATE_SUBNET_IDS",
+                value=Fn.join(",", subnet_ids),
+                export_name="PrivateSubnetIds",
+            )
+            CfnOutput(
+                self,
+                "PROXY_CLIENT_SECURITY_GROUP_ID",
+                value=proxy_client_security_group.security_group_id,
+                export_name="ProxyClientSecurityGroupId",
+            )
+
         CfnOutput(
             self,
             "CLUSTER_ARN",
@@ -266,3 +489,17 @@ class RDSAuroraStack(Stack):
             export_name="ReadOnlySecretARN",
         )
         CfnOutput(self, "DB_NAME", value="postgres", export_name="DBName")
+        if reader_instances:
+            CfnOutput(
+                self,
+                "READER_ENDPOINT",
+                value=db_cluster.attr_read_endpoint_address,
+                export_name="ReaderEndpoint",
+            )
+
+    def _context_flag(self, key: str) -> bool:
+        """Read a boolean from the cdk context, accepting "true"/"false" strings from -c"""
+        value = self.node.try_get_context(key)
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "1", "yes")
+        return bool(value)
@@ -0,0 +1,61 @@
+import sys
+import os
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from test_agent import BedrockAgentTester, StubAgentRuntime, percentile
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 90) == 0.0
+
+
+def test_invocations_use_unique_sessions():
+    sessions = []
+
+    class Runtime(StubAgentRuntime):
+        def invoke_agent(self, sessionId, **kwargs):
+            sessions.append(sessionId)
+            return super().invoke_agent(sessionId=sessionId, **kwargs)
+
+    tester = BedrockAgentTester(Runtime(median_seconds=0.001))
+    assert tester.invoke_agent("How many departments?")["response"] == "Stub answer to: How many departments?"
+    tester.invoke_agent("How many departments?")
+    assert len(set(sessions)) == 2
+
+
+def test_load_test_against_the_stub():
+    tester = BedrockAgentTester(StubAgentRuntime(median_seconds=0.01, throttle_rate=0.2, seed=1))
+
+    stats = tester.run_load_test(concurrency=4, duration=0.5, ramp_up=0.1)
+
+    assert stats["requests"] > 20
+    assert 0 < stats["throttle_rate"] == stats["error_rate"] < 0.5
+    assert 0 < stats["p50"] <= stats["p90"] <= stats["p99"]
+    assert sum(count for _, count in stats["histogram"]) == round(stats["requests"] * (1 - stats["error_rate"]))
+
+
+def test_load_test_at_a_target_rate():
+    tester = BedrockAgentTester(StubAgentRuntime(median_seconds=0.01, seed=1))
+
+    stats = tester.run_load_test(concurrency=4, rps=40, duration=0.5, ramp_up=0.2)
+
+    # 4 invocations during the ramp-up, then 40 per second
+    assert 14 <= stats["requests"] <= 16
+
+
+def test_open_loop_drops_invocations_instead_of_queueing_them():
+    tester = BedrockAgentTester(StubAgentRuntime(median_seconds=0.3, sigma=0.01, seed=1))
+
+    started = time.time()
+    stats = tester.run_load_test(concurrency=2, rps=40, duration=0.5)
+
+    # The schedule is kept and the run ends on time, with the slow invocations still running
+    assert time.time() - started < 0.7
+    assert stats["elapsed"] == 0.5
+    assert 19 <= stats["requests"] <= 21
+    assert stats["dropped"] >= 15
+    assert stats["late"] == 2
@@ -0,0 +1,56 @@
+import csv
+import json
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from test_agent import BedrockAgentTester, StubAgentRuntime, trace_timings
+
+
+def orchestration(data):
+    return {"trace": {"orchestrationTrace": data}}
+
+
+def test_trace_timings():
+    entries = [
+        {"trace": {"preProcessingTrace": {"modelInvocationInput": {}}}},
+        {"trace": {"preProcessingTrace": {"modelInvocationOutput": {"metadata": {"usage": {"inputTokens": 100, "outputTokens": 10}}}}}},
+        orchestration({"modelInvocationInput": {}}),
+        orchestration({"rationale": {"text": "Generate the query"}}),
+        orchestration(
+            {"modelInvocationOutput": {"metadata": {"totalTimeMs": 900, "usage": {"inputTokens": 1000, "outputTokens": 50}}}}
+        ),
+        orchestration(
+            {"invocationInput": {"actionGroupInvocationInput": {"actionGroupName": "query", "apiPath": "/generate"}}}
+        ),
+        orchestration({"observation": {"type": "ACTION_GROUP"}}),
+        orchestration({"observation": {"type": "FINISH"}}),
+    ]
+    times = [0.1, 0.5, 0.5, 1.2, 1.5, 1.5, 3.0, 3.25]
+
+    steps, usage = trace_timings(entries, times)
+
+    assert [(s["phase"], s["kind"], s["name"], s["duration"]) for s in steps] == [
+        ("pre_processing", "model_invocation", None, 0.4),
+        ("orchestration", "model_invocation", None, 1.0),
+        ("orchestration", "action_group", "query /generate", 1.5),
+        ("orchestration", "observation", "FINISH", 0.25),
+    ]
+    assert steps[1]["service_ms"] == 900
+    assert usage == {"input_tokens": 1100, "output_tokens": 60}
+
+
+def test_timing_results_are_written(tmp_path):
+    tester = BedrockAgentTester(StubAgentRuntime(median_seconds=0.01, seed=1))
+    tester.test_cases = tester.test_cases[:2]
+
+    tester.run_all_tests(output_dir=str(tmp_path))
+
+    case = json.loads((tmp_path / "case-02.json").read_text())
+    assert 0 < case["time_to_first_chunk"] <= case["total_time"]
+    assert [s["kind"] for s in case["steps"]].count("action_group") == 2
+    assert case["input_tokens"] == 3900
+    with open(tmp_path / "summary.csv") as f:
+        assert [row["case"] for row in csv.DictReader(f)] == ["1", "2"]
+    with open(tmp_path / "steps.csv") as f:
+        assert len(list(csv.DictReader(f))) == 2 * len(case["steps"])
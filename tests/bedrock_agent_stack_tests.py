@@ -0,0 +1,355 @@
+import sys
+import os
+
+import pytest
+from aws_cdk import App
+from aws_cdk.assertions import Template, Match
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stacks.bedrock_agent_stack import BedrockAgentStack
+
+MODEL_ID = "eu.anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+
+def synth_template(**context):
+    app = App(context={"model_id": MODEL_ID, **context})
+    stack = BedrockAgentStack(app, "BedrockAgentStack")
+    return Template.from_stack(stack)
+
+
+def test_default_lambda_configuration():
+    template = synth_template()
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Handler": "index.handler",
+            "MemorySize": 128,
+            "Timeout": 30,
+            "Architectures": ["x86_64"],
+            "ReservedConcurrentExecutions": Match.absent(),
+        },
+    )
+    template.resource_count_is("AWS::Lambda::Alias", 0)
+
+
+def test_lambda_sizing_from_context():
+    template = synth_template(
+        lambda_memory_size=1024,
+        lambda_architecture="arm64",
+        lambda_timeout="60",
+        lambda_reserved_concurrency=20,
+    )
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Handler": "index.handler",
+            "MemorySize": 1024,
+            "Timeout": 60,
+            "Architectures": ["arm64"],
+            "ReservedConcurrentExecutions": 20,
+        },
+    )
+
+
+def test_provisioned_concurrency_alias_is_used_by_agent():
+    template = synth_template(lambda_provisioned_concurrency=2)
+
+    template.has_resource_properties(
+        "AWS::Lambda::Alias",
+        {
+            "Name": "live",
+            "ProvisionedConcurrencyConfig": {"ProvisionedConcurrentExecutions": 2},
+        },
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Permission",
+        {
+            "Principal": "bedrock.amazonaws.com",
+            "FunctionName": {"Ref": Match.string_like_regexp("GenerateAndExecuteQueryAlias")},
+        },
+    )
+    template.has_resource_properties(
+        "AWS::Bedrock::Agent",
+        {
+            "ActionGroups": Match.array_with(
+                [
+                    Match.object_like(
+                        {
+                            "ActionGroupExecutor": {
+                                "Lambda": {"Ref": Match.string_like_regexp("GenerateAndExecuteQueryAlias")}
+                            }
+                        }
+                    )
+                ]
+            )
+        },
+    )
+    template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 0)
+
+
+def test_scheduled_provisioned_concurrency():
+    template = synth_template(
+        lambda_provisioned_concurrency=1,
+        lambda_provisioned_concurrency_schedule={
+            "max_capacity": 5,
+            "actions": [
+                {"name": "BusinessHours", "cron": "0 7 ? * MON-FRI *", "min_capacity": 5},
+                {"name": "OffHours", "cron": "0 19 ? * MON-FRI *", "min_capacity": 1},
+            ],
+        },
+    )
+
+    template.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget",
+        {
+            "MinCapacity": 1,
+            "MaxCapacity": 5,
+            "ScalableDimension": "lambda:function:ProvisionedConcurrency",
+            "ScheduledActions": [
+                {
+                    "ScalableTargetAction": {"MinCapacity": 5},
+                    "Schedule": "cron(0 7 ? * MON-FRI *)",
+                    "ScheduledActionName": "BusinessHours",
+                },
+                {
+                    "ScalableTargetAction": {"MinCapacity": 1},
+                    "Schedule": "cron(0 19 ? * MON-FRI *)",
+                    "ScheduledActionName": "OffHours",
+                },
+            ],
+        },
+    )
+
+
+def test_split_generate_and_execute_functions():
+    template = synth_template(
+        split_action_group_functions="true",
+        lambda_architecture="arm64",
+        generate_lambda_memory_size=256,
+        generate_lambda_timeout=60,
+        execute_lambda_memory_size=1024,
+        execute_lambda_reserved_concurrency=50,
+    )
+
+    template.resource_count_is("AWS::Lambda::Function", 2)
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "MemorySize": 256,
+            "Timeout": 60,
+            "Architectures": ["arm64"],
+            "Environment": {"Variables": Match.object_like({"ACTION_GROUP_MODE": "generate"})},
+        },
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "MemorySize": 1024,
+            "Timeout": 30,
+            "Architectures": ["arm64"],
+            "ReservedConcurrentExecutions": 50,
+            "Environment": {"Variables": Match.object_like({"ACTION_GROUP_MODE": "execute"})},
+        },
+    )
+    template.resource_count_is("AWS::Lambda::Permission", 2)
+
+    agent = template.find_resources("AWS::Bedrock::Agent")
+    action_groups = list(agent.values())[0]["Properties"]["ActionGroups"]
+    executors = {
+        group["ActionGroupName"]: group["ActionGroupExecutor"]["Lambda"]["Fn::GetAtt"][0]
+        for group in action_groups
+    }
+    assert executors["generate-query"].startswith("GenerateQueryFunction")
+    assert executors["execute-query"].startswith("ExecuteQueryFunction")
+
+
+def test_dynamodb_idempotency_store():
+    template = synth_template(idempotency_store="dynamodb")
+
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "KeySchema": [{"AttributeName": "idempotency_key", "KeyType": "HASH"}],
+            "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True},
+        },
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Environment": {
+                "Variables": Match.object_like(
+                    {
+                        "IDEMPOTENCY_STORE": "dynamodb",
+                        "IDEMPOTENCY_TABLE": {"Ref": Match.string_like_regexp("IdempotencyTable")},
+                    }
+                )
+            }
+        },
+    )
+
+
+def test_few_shot_snapshot_and_numpy_layer():
+    layer_arn = "arn:aws:lambda:eu-west-1:123456789012:layer:numpy:1"
+    template = synth_template(
+        few_shot_enabled="true",
+        few_shot_snapshot_bucket="my-bucket",
+        few_shot_numpy_layer_arn=layer_arn,
+    )
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Layers": [layer_arn],
+            "Environment": {
+                "Variables": Match.object_like(
+                    {"FEW_SHOT_ENABLED": "true", "FEW_SHOT_SNAPSHOT_BUCKET": "my-bucket"}
+                )
+            },
+        },
+    )
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": Match.array_with(
+                    [
+                        Match.object_like(
+                            {
+                                "Action": ["s3:GetObject", "s3:PutObject"],
+                                "Resource": "arn:aws:s3:::my-bucket/few_shot/snapshot.json",
+                            }
+                        )
+                    ]
+                )
+            }
+        },
+    )
+
+
+def test_few_shot_in_split_mode_requires_the_snapshot():
+    # The execute function stores the pairs that the generate function reads
+    with pytest.raises(ValueError):
+        synth_template(few_shot_enabled="true", split_action_group_functions="true")
+
+
+def test_database_routes():
+    template = synth_template(
+        database_routes={
+            "analytics": {
+                "database": "analytics",
+                "cluster_arn": "arn:aws:rds:eu-west-1:123456789012:cluster:analytics",
+            }
+        },
+        database_cache_max_entries=4,
+    )
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Environment": {
+                "Variables": Match.object_like(
+                    {
+                        "DATABASE_ROUTES": Match.string_like_regexp('"analytics"'),
+                        "DATABASE_CACHE_MAX_ENTRIES": "4",
+                    }
+                )
+            },
+        },
+    )
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": Match.array_with(
+                    [
+                        Match.object_like(
+                            {
+                                "Action": "rds-data:ExecuteStatement",
+                                "Resource": "arn:aws:rds:eu-west-1:123456789012:cluster:analytics",
+                            }
+                        )
+                    ]
+                )
+            }
+        },
+    )
+
+
+def test_reader_endpoint():
+    template = synth_template(
+        reader_endpoint="cluster-ro.example.eu-west-1.rds.amazonaws.com",
+        reader_max_lag_ms=500,
+        reader_driver_layer_arn="arn:aws:lambda:eu-west-1:123456789012:layer:psycopg2:1",
+    )
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Environment": {
+                "Variables": Match.object_like(
+                    {
+                        "READER_ENDPOINT": "cluster-ro.example.eu-west-1.rds.amazonaws.com",
+                        "READER_MAX_LAG_MS": "500",
+                    }
+                )
+            },
+            "Layers": ["arn:aws:lambda:eu-west-1:123456789012:layer:psycopg2:1"],
+        },
+    )
+
+
+def test_lambda_outside_vpc_by_default():
+    template = synth_template()
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function", {"Handler": "index.handler", "VpcConfig": Match.absent()}
+    )
+
+
+def test_lambda_in_vpc():
+    template = synth_template(
+        lambda_vpc_id="vpc-0123456789abcdef0",
+        lambda_subnet_ids="subnet-0123456789abcdef0,subnet-0123456789abcdef1",
+        lambda_security_group_ids=["sg-0123456789abcdef0"],
+    )
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Handler": "index.handler",
+            "VpcConfig": {
+                "SubnetIds": ["subnet-0123456789abcdef0", "subnet-0123456789abcdef1"],
+                "SecurityGroupIds": ["sg-0123456789abcdef0"],
+            },
+        },
+    )
+
+
+def test_warmer_schedule():
+    template = synth_template(
+        warmer_enabled="true",
+        warmer_schedule="cron(0/10 8-17 ? * MON-FRI *)",
+        warmer_concurrency=3,
+        split_action_group_functions=True,
+    )
+
+    template.resource_count_is("AWS::Events::Rule", 2)
+    template.has_resource_properties(
+        "AWS::Events::Rule",
+        {
+            "ScheduleExpression": "cron(0/10 8-17 ? * MON-FRI *)",
+            "Targets": [
+                Match.object_like({"Input": '{"warmup":true,"concurrency":3}'})
+            ],
+        },
+    )
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": [Match.object_like({"Action": "lambda:InvokeFunction"})]
+            }
+        },
+    )
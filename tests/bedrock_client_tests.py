@@ -0,0 +1,138 @@
+import sys
+import os
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from bedrock_client import (
+    BedrockThrottledError,
+    CircuitBreaker,
+    ResilientBedrockClient,
+    TokenBucket,
+)
+
+EU_PROFILE = "eu.anthropic.claude-3-5-sonnet-20240620-v1:0"
+IN_REGION_MODEL = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeBedrockClient:
+    """bedrock-runtime stand-in that throttles the first N calls per model id"""
+
+    def __init__(self, throttles=None, error_code="ThrottlingException"):
+        self.throttles = dict(throttles or {})
+        self.error_code = error_code
+        self.calls = []
+
+    def invoke_model(self, body, modelId):
+        self.calls.append(modelId)
+        if self.throttles.get(modelId, 0) > 0:
+            self.throttles[modelId] -= 1
+            raise ClientError({"Error": {"Code": self.error_code, "Message": ""}}, "InvokeModel")
+        return {"modelId": modelId}
+
+
+def resilient_client(fake, clock, **kwargs):
+    return ResilientBedrockClient(
+        fake,
+        [EU_PROFILE, IN_REGION_MODEL],
+        sleep=clock.sleep,
+        jitter=lambda low, high: high,
+        clock=clock,
+        **kwargs,
+    )
+
+
+def test_retries_with_capped_exponential_backoff():
+    clock = FakeClock()
+    fake = FakeBedrockClient({EU_PROFILE: 2})
+    client = resilient_client(fake, clock, base_delay=0.5, max_delay=0.8)
+
+    assert client.invoke_model(body="{}", modelId=EU_PROFILE) == {"modelId": EU_PROFILE}
+    assert fake.calls == [EU_PROFILE] * 3
+    assert clock.now == pytest.approx(0.5 + 0.8)
+    assert client.counters["retries"] == 2
+    assert client.counters["throttles"] == 2
+    assert client.counters["failovers"] == 0
+
+
+def test_fails_over_on_sustained_throttling():
+    clock = FakeClock()
+    fake = FakeBedrockClient({EU_PROFILE: 100})
+    client = resilient_client(fake, clock, max_retries=2)
+
+    assert client.invoke_model(body="{}", modelId=EU_PROFILE) == {"modelId": IN_REGION_MODEL}
+    assert fake.calls == [EU_PROFILE] * 3 + [IN_REGION_MODEL]
+    assert client.counters["failovers"] == 1
+
+
+def test_open_circuit_skips_model_until_reset():
+    clock = FakeClock()
+    fake = FakeBedrockClient({EU_PROFILE: 100})
+    client = resilient_client(fake, clock, max_retries=1, breaker_threshold=2, breaker_reset_timeout=30)
+
+    client.invoke_model(body="{}", modelId=EU_PROFILE)
+    fake.calls.clear()
+    client.invoke_model(body="{}", modelId=EU_PROFILE)
+
+    assert fake.calls == [IN_REGION_MODEL]
+    assert client.counters["circuit_open_skips"] == 1
+
+    # After the reset timeout a trial call goes to the preferred model again
+    fake.throttles[EU_PROFILE] = 0
+    clock.now += 30
+    assert client.invoke_model(body="{}", modelId=EU_PROFILE) == {"modelId": EU_PROFILE}
+    assert client.breakers[EU_PROFILE].state == "closed"
+
+
+def test_raises_when_all_models_throttled():
+    clock = FakeClock()
+    fake = FakeBedrockClient({EU_PROFILE: 100, IN_REGION_MODEL: 100})
+    client = resilient_client(fake, clock, max_retries=1)
+
+    with pytest.raises(BedrockThrottledError):
+        client.invoke_model(body="{}", modelId=EU_PROFILE)
+
+
+def test_non_retryable_errors_are_raised():
+    clock = FakeClock()
+    fake = FakeBedrockClient({EU_PROFILE: 1}, error_code="ValidationException")
+    client = resilient_client(fake, clock)
+
+    with pytest.raises(ClientError):
+        client.invoke_model(body="{}", modelId=EU_PROFILE)
+    assert fake.calls == [EU_PROFILE]
+
+
+def test_token_bucket_limits_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_second=2, capacity=2, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.1)
+    assert bucket.acquire(timeout=1)
+    assert clock.now == pytest.approx(0.5)
+
+
+def test_circuit_breaker_half_open_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert not breaker.allow_request()
+    clock.now = 10
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from column_values import ColumnValueDictionary
+from schema_render import render_schema
+
+
+def column(schema, table, name, data_type="character varying", constraint_type=None):
+    return {
+        "table_schema": schema,
+        "table_name": table,
+        "column_name": name,
+        "data_type": data_type,
+        "constraint_type": constraint_type,
+    }
+
+
+SCHEMA = [
+    column("staff", "employees", "employee_id", "integer", "PRIMARY KEY"),
+    column("staff", "employees", "email", constraint_type="UNIQUE"),
+    column("staff", "employees", "position"),
+    column("facilities", "rooms", "room_type"),
+    column("academics", "enrollments", "semester"),
+    column("academics", "enrollments", "year", "integer"),
+]
+
+STATS = [
+    {"table_schema": "staff", "table_name": "employees", "column_name": "email", "distinct_estimate": 10},
+    {"table_schema": "academics", "table_name": "enrollments", "column_name": "year", "distinct_estimate": 5},
+    {
+        "table_schema": "staff",
+        "table_name": "employees",
+        "column_name": "position",
+        "distinct_estimate": 3,
+        "most_common_values": json.dumps(["Professor", "Lecturer", "Administrator"]),
+    },
+    {
+        "table_schema": "facilities",
+        "table_name": "rooms",
+        "column_name": "room_type",
+        "distinct_estimate": 4,
+        "most_common_values": json.dumps(["Lecture Hall"]),
+    },
+    {"table_schema": "academics", "table_name": "enrollments", "column_name": "semester", "distinct_estimate": 5000},
+]
+
+
+def fake_fetch(queries):
+    def fetch(sql):
+        queries.append(sql)
+        if "pg_stats" in sql:
+            return STATS
+        return [{"value": v, "frequency": 1} for v in ("Lab", "Lecture Hall", "Office", "Seminar")]
+
+    return fetch
+
+
+def test_refresh_picks_low_cardinality_text_columns():
+    queries = []
+    dictionary = ColumnValueDictionary(fake_fetch(queries), SCHEMA)
+    dictionary.refresh()
+
+    assert dictionary.values == {
+        ("staff.employees", "position"): ["Professor", "Lecturer", "Administrator"],
+        ("facilities.rooms", "room_type"): ["Lab", "Lecture Hall", "Office", "Seminar"],
+    }
+    # Complete most-common-values statistics avoid a query
+    assert len(queries) == 2
+    assert 'FROM "facilities"."rooms"' in queries[1]
+
+
+def test_refresh_cost_and_size_are_capped():
+    queries = []
+    dictionary = ColumnValueDictionary(fake_fetch(queries), SCHEMA, max_values=2, max_queries=0)
+    dictionary.refresh()
+
+    assert dictionary.values == {("staff.employees", "position"): ["Professor", "Lecturer"]}
+    assert len(queries) == 1
+
+
+def test_required_columns_are_always_loaded():
+    queries = []
+    dictionary = ColumnValueDictionary(
+        fake_fetch(queries), SCHEMA, max_columns=0, columns=[("academics.enrollments", "semester")]
+    )
+    dictionary.refresh()
+
+    assert dictionary.values == {("academics.enrollments", "semester"): ["Lab", "Lecture Hall", "Office", "Seminar"]}
+    # No statistics query, and one more value than kept to detect truncation
+    assert len(queries) == 1 and queries[0].endswith("LIMIT 21")
+
+    dictionary = ColumnValueDictionary(fake_fetch([]), SCHEMA, max_values=3, columns=[("facilities.rooms", "room_type")])
+    dictionary.refresh()
+    assert ("facilities.rooms", "room_type") not in dictionary.values
+
+
+def test_values_are_rendered_for_kept_tables_only():
+    values = {("staff.employees", "position"): ["Professor", "Dean's office"]}
+
+    rendered = json.loads(render_schema(SCHEMA, column_values=values))
+    assert "position character varying in ('Professor','Dean''s office')" in rendered["staff.employees"]
+
+    pruned = json.loads(render_schema(SCHEMA, tables={"facilities.rooms"}, column_values=values))
+    assert list(pruned) == ["facilities.rooms"]
@@ -0,0 +1,119 @@
+import sys
+import os
+import threading
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+# The script creates its rds-data client on import
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+import create_schema
+from create_schema import load_data, parameter_batches, table_dependencies
+from migrations import MIGRATIONS
+
+
+class FakeRdsData:
+    """Records the transactions of the batched load, failing the inserts into failing_table"""
+
+    def __init__(self, failing_table=None):
+        self.failing_table = failing_table
+        self.transactions = {}
+        self.committed = []
+        self.rolled_back = []
+        self._lock = threading.Lock()
+
+    def begin_transaction(self, **kwargs):
+        with self._lock:
+            transaction_id = f"tx-{len(self.transactions)}"
+            self.transactions[transaction_id] = []
+        return {"transactionId": transaction_id}
+
+    def batch_execute_statement(self, sql, parameterSets, transactionId, **kwargs):
+        table = create_schema.INSERT_PATTERN.search(sql).group(1)
+        if table == self.failing_table:
+            raise Exception(f"insert into {table} failed")
+        with self._lock:
+            self.transactions[transactionId].append((table, len(parameterSets)))
+
+    def commit_transaction(self, transactionId, **kwargs):
+        with self._lock:
+            self.committed.append(self.transactions[transactionId][0][0])
+
+    def rollback_transaction(self, transactionId, **kwargs):
+        with self._lock:
+            self.rolled_back.append(transactionId)
+
+
+@pytest.fixture
+def rds_data(monkeypatch):
+    client = FakeRdsData()
+    monkeypatch.setattr(create_schema, "rds_data", client)
+    return client
+
+
+def insert(table, rows):
+    return f"INSERT INTO {table} (id) VALUES (:id)", [[{"name": "id", "value": {"longValue": i}}] for i in range(rows)]
+
+
+def test_batches_are_bounded_by_rows_and_bytes():
+    parameter_sets = [[{"name": "id", "value": {"stringValue": "x" * 100}}] for _ in range(25)]
+
+    assert [len(b) for b in parameter_batches(parameter_sets, max_rows=10)] == [10, 10, 5]
+    # About 150 bytes of JSON per row
+    assert [len(b) for b in parameter_batches(parameter_sets, max_bytes=1000)] == [6, 6, 6, 6, 1]
+    # A row above max_bytes still gets a batch of its own
+    assert [len(b) for b in parameter_batches(parameter_sets[:2], max_bytes=10)] == [1, 1]
+    assert list(parameter_batches([])) == []
+
+
+def test_dependencies_from_the_migrations():
+    dependencies = table_dependencies([s for m in MIGRATIONS for s in m.statements])
+
+    assert dependencies["academics.departments"] == set()
+    assert dependencies["academics.enrollments"] == {"academics.students", "academics.courses"}
+    assert dependencies["research.project_members"] == {"research.projects", "staff.employees"}
+
+
+def test_tables_load_after_the_tables_they_reference(rds_data):
+    dependencies = {
+        "academics.courses": {"academics.departments"},
+        "academics.enrollments": {"academics.courses", "academics.students"},
+        "academics.students": {"academics.departments"},
+        # Not loaded, so not waited for
+        "staff.salaries": {"staff.employees"},
+    }
+    data = [
+        insert("academics.enrollments", 1200),
+        insert("academics.departments", 3),
+        insert("academics.students", 10),
+        insert("academics.courses", 5),
+        insert("staff.salaries", 2),
+    ]
+
+    assert load_data(data, dependencies, workers=4) == 1220
+
+    order = rds_data.committed
+    assert order.index("academics.departments") < order.index("academics.courses") < order.index("academics.enrollments")
+    assert order.index("academics.students") < order.index("academics.enrollments")
+    # One transaction per table, the 1200 enrollments in batches of at most 500 rows
+    enrollments = next(batches for batches in rds_data.transactions.values() if batches[0][0] == "academics.enrollments")
+    assert [rows for _, rows in enrollments] == [500, 500, 200]
+
+
+def test_circular_references_are_rejected(rds_data):
+    dependencies = {"a.first": {"a.second"}, "a.second": {"a.first"}}
+
+    with pytest.raises(ValueError, match="Circular"):
+        load_data([insert("a.first", 1), insert("a.second", 1), insert("a.other", 1)], dependencies)
+    assert rds_data.committed == ["a.other"]
+
+
+def test_failed_batch_rolls_back_its_table(rds_data):
+    rds_data.failing_table = "academics.courses"
+
+    data = [insert("academics.departments", 3), insert("academics.courses", 5)]
+
+    with pytest.raises(Exception, match="insert into academics.courses failed"):
+        load_data(data, {"academics.courses": {"academics.departments"}})
+    assert rds_data.committed == ["academics.departments"]
+    assert len(rds_data.rolled_back) == 1
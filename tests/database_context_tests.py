@@ -0,0 +1,93 @@
+import sys
+import os
+
+import pytest
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from database_context import (
+    DatabaseCache,
+    DatabaseContext,
+    DatabaseRouter,
+    DatabaseTarget,
+    GeneratedQueryCache,
+    UnknownDatabaseError,
+)
+from few_shot import FewShotRetriever, FewShotStore
+from schema_model import CompactSchema
+
+CLUSTER_ARN = "arn:aws:rds:eu-west-1:123456789012:cluster:university"
+DEFAULT = DatabaseTarget("default", CLUSTER_ARN, "arn:secret", "postgres")
+ANALYTICS = DatabaseTarget("analytics", CLUSTER_ARN, "arn:secret", "analytics")
+ROW = {"table_schema": "academics", "table_name": "departments", "column_name": "name"}
+
+
+def load(target, rows=1):
+    context = DatabaseContext(target, rds_data=None)
+    context.schema = CompactSchema.from_rows(
+        [dict(ROW, column_name=f"column_{i}") for i in range(rows)]
+    )
+    return context
+
+
+def test_router_resolves_session_attributes():
+    router = DatabaseRouter(DEFAULT, {"analytics": ANALYTICS})
+
+    assert router.resolve({}) is DEFAULT
+    assert router.resolve({"sessionAttributes": {"database": "analytics"}}) is ANALYTICS
+    assert router.resolve({"promptSessionAttributes": {"database": "analytics"}}) is ANALYTICS
+    with pytest.raises(UnknownDatabaseError):
+        router.resolve({"sessionAttributes": {"database": "payroll"}})
+
+
+def test_target_region_from_cluster_arn():
+    assert DEFAULT.region == "eu-west-1"
+    assert DatabaseTarget("local", "cluster", "secret", "postgres").region is None
+
+
+def test_cache_evicts_least_recently_used_database():
+    loaded = []
+
+    def counting_load(target):
+        loaded.append(target.name)
+        return load(target)
+
+    reporting = DatabaseTarget("reporting", CLUSTER_ARN, "arn:secret", "reporting")
+    cache = DatabaseCache(counting_load, max_entries=2)
+    cache.get(DEFAULT)
+    cache.get(ANALYTICS)
+    cache.get(DEFAULT)
+    cache.get(reporting)
+
+    assert loaded == ["default", "analytics", "reporting"]
+    assert list(cache.entries) == [DEFAULT.key, reporting.key]
+
+
+def test_cache_evicts_by_size_but_keeps_the_database_in_use():
+    cache = DatabaseCache(lambda target: load(target, rows=100), max_bytes=1)
+    cache.get(DEFAULT)
+    cache.get(ANALYTICS)
+
+    assert list(cache.entries) == [ANALYTICS.key]
+    assert cache.total_bytes() > 1
+
+
+def test_size_includes_the_caches():
+    context = load(DEFAULT)
+    empty = context.size_bytes()
+    context.few_shot = FewShotRetriever(FewShotStore())
+    for i in range(100):
+        context.few_shot.record_success(f"How many students are in department {i}?", f"SELECT {i}")
+
+    assert context.size_bytes() > empty + 100 * len("How many students are in department 0?")
+
+
+def test_generated_query_cache():
+    cache = GeneratedQueryCache(max_entries=1)
+    cache.put("How many departments?", "SELECT 1")
+
+    assert cache.get("how many   DEPARTMENTS?") == "SELECT 1"
+    cache.put("How many courses?", "SELECT 2")
+    assert cache.get("How many departments?") is None
+    assert GeneratedQueryCache().get("How many courses?") is None
@@ -0,0 +1,110 @@
+import sys
+import os
+import json
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+import few_shot
+from few_shot import FewShotStore, FewShotRetriever, SnapshotSync, question_features
+
+PAIRS = [
+    ("How many students are enrolled in each department?", "SELECT 1"),
+    ("Which buildings were constructed after 2000?", "SELECT 2"),
+    ("What is the average funding amount for research projects?", "SELECT 3"),
+    ("Count the number of employees by position", "SELECT 4"),
+]
+
+
+def filled_store(**kwargs):
+    store = FewShotStore(**kwargs)
+    for question, sql in PAIRS:
+        store.add(question, sql)
+    return store
+
+
+def test_lookup_returns_most_similar_pairs_first():
+    store = filled_store()
+
+    matches = store.lookup("How many students are enrolled in the physics department?", k=2)
+
+    assert matches[0][:2] == PAIRS[0]
+    assert 0 < matches[0][2] <= 1
+    assert store.lookup("weather forecast for tomorrow") == []
+
+
+def test_pure_python_scoring_matches_numpy(monkeypatch):
+    question = "average funding of research projects per building"
+    expected = filled_store().lookup(question, k=3, min_score=0)
+
+    monkeypatch.setattr(few_shot, "np", None)
+    actual = filled_store().lookup(question, k=3, min_score=0)
+
+    assert [m[:2] for m in actual] == [m[:2] for m in expected]
+    for (_, _, a), (_, _, b) in zip(actual, expected):
+        assert abs(a - b) < 1e-5
+
+
+def test_duplicate_question_updates_sql():
+    store = filled_store()
+
+    assert not store.add("how many students are enrolled in each department", "SELECT 5")
+    assert len(store) == len(PAIRS)
+    assert store.lookup(PAIRS[0][0], k=1)[0][1] == "SELECT 5"
+
+
+def test_oldest_pairs_are_evicted():
+    store = FewShotStore(max_pairs=10)
+    for i in range(25):
+        store.add(f"question number {i} about course{i}", f"SELECT {i}")
+
+    assert len(store) <= 10
+    assert store.lookup("question about course0", min_score=0.5) == []
+    assert store.lookup("question about course24", k=1)[0][1] == "SELECT 24"
+
+
+def test_eviction_bounds_the_vocabulary():
+    store = FewShotStore(max_pairs=10)
+    for i in range(1000):
+        store.add(f"question number {i} about course{i}", f"SELECT {i}")
+
+    # Features of the stored pairs only, each with postings
+    assert len(store.vocab) == len(store.postings) <= 10 * len(question_features("question number 1 about course1"))
+    assert all(len(p) for p in store.postings)
+    assert store.lookup("question about course999", k=1)[0][1] == "SELECT 999"
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        if Key not in self.objects:
+            raise Exception("NoSuchKey")
+        body = self.objects[Key]
+
+        class Body:
+            def read(self):
+                return body
+
+        return {"ETag": str(hash(body)), "Body": Body()}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+        return {"ETag": str(hash(Body))}
+
+
+def test_snapshot_is_shared_through_s3():
+    s3 = FakeS3()
+    writer = FewShotRetriever(
+        FewShotStore(), sync=SnapshotSync(FewShotStore(), s3, "bucket", "key", save_every=2)
+    )
+    writer.sync.store = writer.store
+    for question, sql in PAIRS[:2]:
+        writer.record_success(question, sql)
+
+    assert len(json.loads(s3.objects["key"])["pairs"]) == 2
+
+    reader_store = FewShotStore()
+    reader = FewShotRetriever(reader_store, sync=SnapshotSync(reader_store, s3, "bucket", "key"))
+    assert reader.examples("buildings constructed after 2010") == [PAIRS[1]]
@@ -0,0 +1,64 @@
+import sys
+import os
+import threading
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from generate_data import TABLES, generate
+
+# (table, column) -> referenced (table, id column)
+FOREIGN_KEYS = {
+    ("academics.courses", "department_id"): ("academics.departments", "department_id"),
+    ("academics.students", "major_department_id"): ("academics.departments", "department_id"),
+    ("academics.enrollments", "student_id"): ("academics.students", "student_id"),
+    ("academics.enrollments", "course_id"): ("academics.courses", "course_id"),
+    ("staff.salaries", "employee_id"): ("staff.employees", "employee_id"),
+    ("facilities.rooms", "building_id"): ("facilities.buildings", "building_id"),
+    ("facilities.equipment", "room_id"): ("facilities.rooms", "room_id"),
+    ("research.project_members", "project_id"): ("research.projects", "project_id"),
+    ("research.project_members", "employee_id"): ("staff.employees", "employee_id"),
+}
+
+
+class FakeTarget:
+    """Empty tables in memory, loaded concurrently by the workers"""
+
+    def __init__(self):
+        self.rows = {spec.table: [] for spec in TABLES}
+        self._lock = threading.Lock()
+
+    def query(self, sql):
+        if "information_schema.tables" in sql:
+            return [table.split(".") for table in self.rows]
+        if "MAX(" in sql and "setval" not in sql:
+            return [[0]]
+        return []
+
+    def load(self, table, columns, rows):
+        with self._lock:
+            self.rows[table].extend(dict(zip(columns, row)) for row in rows)
+
+
+def generated(workers):
+    target = FakeTarget()
+    total = generate(target, TABLES, scale=0.005, seed=7, workers=workers, chunk_rows=100, truncate=False)
+    assert total == sum(len(rows) for rows in target.rows.values())
+    return target.rows
+
+
+def test_rows_do_not_depend_on_the_number_of_workers():
+    serial = generated(workers=1)
+    parallel = generated(workers=4)
+
+    for table, rows in serial.items():
+        assert rows, table
+        as_tuples = Counter(tuple(row.values()) for row in rows)
+        assert as_tuples == Counter(tuple(row.values()) for row in parallel[table]), table
+
+
+def test_references_point_to_generated_rows():
+    rows = generated(workers=4)
+
+    for (table, column), (parent, id_column) in FOREIGN_KEYS.items():
+        ids = {row[id_column] for row in rows[parent]}
+        assert {row[column] for row in rows[table]} <= ids, (table, column)
@@ -0,0 +1,92 @@
+import sys
+import os
+import time
+
+import pytest
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from bedrock_client import BedrockThrottledError
+from hedging import HedgedInvoker, LatencyTracker
+
+
+def slow_then_fast(slow_model, delay):
+    calls = []
+
+    def fn(model_id):
+        calls.append(model_id)
+        if model_id == slow_model and calls.count(slow_model) == 1:
+            time.sleep(delay)
+        return {"model": model_id}
+
+    return fn, calls
+
+
+def test_fast_primary_is_not_hedged():
+    invoker = HedgedInvoker(default_delay=0.5, max_hedge_rate=1.0)
+    fn, calls = slow_then_fast("other", 0)
+
+    assert invoker.invoke(fn, "primary") == {"model": "primary"}
+    assert calls == ["primary"]
+    assert invoker.hedges == 0
+
+
+def test_slow_primary_is_hedged_to_alternate_model():
+    invoker = HedgedInvoker(default_delay=0.05, max_hedge_rate=1.0, hedge_model_id="alternate")
+    fn, calls = slow_then_fast("primary", 0.5)
+
+    started = time.monotonic()
+    assert invoker.invoke(fn, "primary") == {"model": "alternate"}
+    assert time.monotonic() - started < 0.4
+    assert calls == ["primary", "alternate"]
+
+
+def test_invalid_hedge_result_falls_back_to_primary():
+    invoker = HedgedInvoker(default_delay=0.05, max_hedge_rate=1.0, hedge_model_id="alternate")
+    fn, _ = slow_then_fast("primary", 0.2)
+
+    result = invoker.invoke(fn, "primary", is_valid=lambda r: r["model"] == "primary")
+    assert result == {"model": "primary"}
+
+
+def test_invalid_results_are_returned_like_unhedged_calls():
+    invoker = HedgedInvoker(default_delay=0.05, max_hedge_rate=1.0, hedge_model_id="alternate")
+    fn, _ = slow_then_fast("primary", 0.2)
+
+    assert invoker.invoke(fn, "primary", is_valid=lambda r: False) == {"model": "alternate"}
+
+
+def test_throttling_is_raised_in_preference_to_other_errors():
+    invoker = HedgedInvoker(default_delay=0.05, max_hedge_rate=1.0, hedge_model_id="alternate")
+
+    def fn(model_id):
+        if model_id == "primary":
+            time.sleep(0.1)
+            raise ValueError("model error")
+        raise BedrockThrottledError("throttled")
+
+    with pytest.raises(BedrockThrottledError):
+        invoker.invoke(fn, "primary")
+
+
+def test_hedge_rate_is_capped():
+    invoker = HedgedInvoker(default_delay=0.01, max_hedge_rate=0.25)
+
+    def fn(model_id):
+        time.sleep(0.03)
+        return model_id
+
+    for _ in range(8):
+        invoker.invoke(fn, "primary")
+    assert invoker.hedges == 2
+
+
+def test_delay_uses_percentile_once_enough_samples():
+    tracker = LatencyTracker()
+    invoker = HedgedInvoker(percentile=90, default_delay=2.0, min_samples=10, tracker=tracker)
+    assert invoker.hedge_delay() == 2.0
+
+    for latency in range(1, 11):
+        tracker.record(latency / 10)
+    assert invoker.hedge_delay() == 0.9
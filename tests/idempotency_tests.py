@@ -0,0 +1,150 @@
+import sys
+import os
+import threading
+import time
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from idempotency import (
+    DynamoDBIdempotencyStore,
+    IdempotencyInProgressError,
+    IdempotencyLayer,
+    InMemoryIdempotencyStore,
+    idempotency_key,
+)
+
+
+class FakeDynamoDBClient:
+    """Minimal stand-in for the DynamoDB client calls used by DynamoDBIdempotencyStore"""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None):
+        with self.lock:
+            key = Item["idempotency_key"]["S"]
+            existing = self.items.get(key)
+            if ConditionExpression and existing:
+                now = float(ExpressionAttributeValues[":now"]["N"])
+                if float(existing["expires_at"]["N"]) >= now:
+                    raise ClientError(
+                        {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+                        "PutItem",
+                    )
+            self.items[key] = Item
+
+    def get_item(self, TableName, Key, ConsistentRead=False):
+        item = self.items.get(Key["idempotency_key"]["S"])
+        return {"Item": item} if item else {}
+
+    def delete_item(self, TableName, Key):
+        self.items.pop(Key["idempotency_key"]["S"], None)
+
+
+def success_response(body):
+    return {"response": {"httpStatusCode": 200, "responseBody": {"application/json": body}}}
+
+
+def event(session_id="session-1", prompt="How many students?"):
+    return {
+        "sessionId": session_id,
+        "apiPath": "/generate",
+        "actionGroup": "generate-query",
+        "requestBody": {
+            "content": {"application/json": {"properties": [{"name": "prompt", "value": prompt}]}}
+        },
+    }
+
+
+def test_key_depends_on_session_and_request():
+    assert idempotency_key(event()) == idempotency_key(event())
+    assert idempotency_key(event()) != idempotency_key(event(session_id="session-2"))
+    assert idempotency_key(event()) != idempotency_key(event(prompt="How many courses?"))
+    assert idempotency_key(event()).startswith("session-1#/generate#")
+
+
+@pytest.fixture(params=["memory", "dynamodb"])
+def store(request):
+    if request.param == "memory":
+        return InMemoryIdempotencyStore()
+    return DynamoDBIdempotencyStore("idempotency", FakeDynamoDBClient())
+
+
+def test_duplicate_returns_stored_response(store):
+    layer = IdempotencyLayer(store)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return success_response({"query": "SELECT 1"})
+
+    first = layer.run("key", fn)
+    second = layer.run("key", fn)
+
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_server_errors_are_not_stored(store):
+    layer = IdempotencyLayer(store)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return {"response": {"httpStatusCode": 500}}
+
+    layer.run("key", fn)
+    layer.run("key", fn)
+
+    assert len(calls) == 2
+
+
+def test_throttled_call_is_retried(store):
+    layer = IdempotencyLayer(store)
+    responses = [{"response": {"httpStatusCode": 429}}, success_response({"query": "SELECT 1"})]
+
+    assert layer.run("key", lambda: responses.pop(0))["response"]["httpStatusCode"] == 429
+    assert layer.run("key", lambda: responses.pop(0)) == success_response({"query": "SELECT 1"})
+    # The successful retry is stored
+    assert layer.run("key", pytest.fail) == success_response({"query": "SELECT 1"})
+
+
+def test_duplicate_waits_for_in_flight_call(store):
+    layer = IdempotencyLayer(store, poll_interval=0.01)
+    started = threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        time.sleep(0.2)
+        return success_response({"query": "SELECT 1"})
+
+    thread = threading.Thread(target=lambda: results.append(layer.run("key", slow)))
+    thread.start()
+    started.wait()
+
+    duplicate = layer.run("key", lambda: pytest.fail("duplicate must not run"))
+    thread.join()
+
+    assert duplicate == results[0]
+
+
+def test_duplicate_gives_up_at_deadline(store):
+    layer = IdempotencyLayer(store, poll_interval=0.01)
+    store.try_acquire("key", time.time() + 60)
+
+    with pytest.raises(IdempotencyInProgressError):
+        layer.run("key", lambda: success_response({}), deadline=time.time() + 0.05)
+
+
+def test_expired_record_is_taken_over(store):
+    layer = IdempotencyLayer(store)
+    store.try_acquire("key", time.time() - 1)
+
+    response = layer.run("key", lambda: success_response({"query": "SELECT 2"}))
+
+    assert response == success_response({"query": "SELECT 2"})
@@ -0,0 +1,100 @@
+import sys
+import os
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from column_values import ColumnValueDictionary
+from intent_templates import TEMPLATES, IntentEngine, normalize_question, slot_columns
+
+COLUMN_VALUES = {
+    "academics.departments": ["Computer Science", "Physics", "Mathematics"],
+    "staff.employees": ["Professor", "Lecturer", "Administrator"],
+}
+
+
+def fake_fetch(queries):
+    def fetch(sql):
+        queries.append(sql)
+        table = sql.split(" FROM ")[1].split(" ")[0].replace('"', "")
+        return [{"value": v, "frequency": 1} for v in COLUMN_VALUES[table]]
+
+    return fetch
+
+
+def engine(queries=None, **kwargs):
+    values = ColumnValueDictionary(
+        fake_fetch([] if queries is None else queries), [], max_columns=0, columns=slot_columns(TEMPLATES), **kwargs
+    )
+    values.refresh()
+    # As after a background refresh, the dictionary is not stale
+    values.refreshed_at = time.time()
+    return IntentEngine(TEMPLATES, values)
+
+
+def test_normalize_question():
+    assert normalize_question("  How many students are in 'Physics'? ") == "how many students are in physics"
+
+
+def test_questions_without_slots():
+    intents = engine()
+
+    assert intents.match("What is the total number of departments?").name == "department_count"
+    assert intents.match("How many students are enrolled in each department?").name == "students_per_department"
+    assert intents.match("Count the number of employees by position").name == "employees_by_position"
+    assert intents.match("Show me the active research projects").name == "active_research_projects"
+
+
+def test_slot_values_come_from_the_column_dictionary():
+    queries = []
+    intents = engine(queries)
+
+    found = intents.match("List all courses in the physics department with their credits")
+    assert found.name == "courses_in_department"
+    assert found.values == {"department": "Physics"}
+    assert "WHERE d.name = 'Physics'" in found.sql
+
+    found = intents.match("How many students are enrolled in the Computer Science department?")
+    assert found.name == "students_in_department"
+    assert "WHERE d.name = 'Computer Science'" in found.sql
+
+    # One query per slot column, the dictionary is cached
+    assert len(queries) == 2
+
+
+def test_unknown_slot_values_fall_back_to_the_model():
+    intents = engine()
+
+    assert intents.match("List all courses in the Astrology department") is None
+    assert intents.match("How many students are in Physics' OR 1=1") is None
+    assert intents.match("Which students have a GPA above 3.5?") is None
+
+
+def test_high_cardinality_columns_never_match():
+    intents = engine(max_values=2)
+
+    assert intents.match("List the courses of Physics") is None
+
+
+def test_answer_reports_latency_saved(capsys):
+    intents = engine()
+    intents.record_generation(2.0)
+
+    assert intents.answer("Show me the employees with position Professor").endswith("ORDER BY last_name, first_name")
+    assert '"IntentHits": 1' in capsys.readouterr().out
+    assert intents.answer("Which buildings were constructed after 2000?") is None
+
+
+def test_count_questions_count_rows():
+    intents = engine()
+
+    found = intents.match("How many professors are there?")
+    assert found.name == "employee_count_with_position"
+    assert found.sql == "SELECT COUNT(*) AS employee_count FROM staff.employees WHERE position = 'Professor'"
+
+    found = intents.match("How many research projects are currently active?")
+    assert found.name == "active_research_project_count"
+    assert found.sql.startswith("SELECT COUNT(*) AS project_count FROM research.projects")
+    assert intents.match("How many active projects are there?").name == "active_research_project_count"
+    assert intents.match("What are the ongoing research projects?").name == "active_research_projects"
@@ -0,0 +1,69 @@
+import re
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from migrations import (
+    MIGRATIONS,
+    Migration,
+    MigrationChecksumError,
+    apply_migrations,
+    migration_sql,
+)
+
+
+class FakeDatabase:
+    """Records the migrations inserted by the DO blocks, like agent_meta.schema_migrations"""
+
+    def __init__(self):
+        self.applied = None
+        self.calls = []
+
+    def execute(self, sql):
+        self.calls.append(sql)
+        if sql.startswith("SELECT"):
+            if self.applied is None:
+                raise Exception('relation "agent_meta.schema_migrations" does not exist')
+            return {
+                "records": [
+                    [{"stringValue": i}, {"stringValue": c}] for i, c in self.applied.items()
+                ]
+            }
+        self.applied = self.applied or {}
+        migration_id, checksum = re.search(r"VALUES \('([^']+)', '([^']+)'\)", sql).groups()
+        self.applied[migration_id] = checksum
+        return {}
+
+
+def test_migrations_are_applied_once_in_one_call_each():
+    database = FakeDatabase()
+
+    assert apply_migrations(database.execute) == [m.id for m in MIGRATIONS]
+    assert len(database.calls) == 1 + len(MIGRATIONS)
+
+    database.calls = []
+    assert apply_migrations(database.execute) == []
+    assert len(database.calls) == 1
+
+
+def test_migration_runs_statements_in_one_do_block():
+    sql = migration_sql(MIGRATIONS[-1])
+
+    assert sql.startswith("DO $block$") and sql.endswith("$block$")
+    # Bootstrap of the metadata table, the statements and the record of the migration
+    assert sql.count("EXECUTE $statement$") == len(MIGRATIONS[-1].statements) + 3
+    assert "CREATE EVENT TRIGGER" in sql
+
+
+def test_changed_migrations():
+    database = FakeDatabase()
+    apply_migrations(database.execute, [Migration("0001", ["CREATE SCHEMA a"]), Migration("0002", ["SELECT 1"], True)])
+
+    # Repeatable migrations are applied again, whitespace does not change the checksum
+    changed = [Migration("0001", ["CREATE  SCHEMA a"]), Migration("0002", ["SELECT 2"], True)]
+    assert apply_migrations(database.execute, changed) == ["0002"]
+
+    with pytest.raises(MigrationChecksumError):
+        apply_migrations(database.execute, [Migration("0001", ["CREATE SCHEMA b"])])
@@ -0,0 +1,70 @@
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from model_router import ModelRouter
+from schema_index import SchemaIndex
+
+
+def column(table_schema, table_name, column_name):
+    return {"table_schema": table_schema, "table_name": table_name, "column_name": column_name}
+
+
+SCHEMA_INDEX = SchemaIndex(
+    [
+        column("academics", "departments", "department_id"),
+        column("academics", "departments", "name"),
+        column("academics", "students", "student_id"),
+        column("academics", "students", "major_department_id"),
+        column("academics", "enrollments", "semester"),
+        column("staff", "employees", "position"),
+        column("research", "projects", "funding_amount"),
+    ]
+)
+
+ROUTER = ModelRouter("simple-model", "complex-model")
+
+
+def test_schema_index_finds_referenced_tables():
+    assert SCHEMA_INDEX.referenced_tables("What is the total number of departments?") == [
+        "academics.departments"
+    ]
+    assert set(SCHEMA_INDEX.referenced_tables("Show me all students and their department")) == {
+        "academics.students",
+        "academics.departments",
+    }
+    assert SCHEMA_INDEX.related_tables("Count the employees by position") == {"staff.employees"}
+
+
+def test_simple_question_goes_to_simple_model():
+    decision = ROUTER.route("What is the total number of departments?", SCHEMA_INDEX)
+
+    assert decision.tier == "simple"
+    assert decision.model_id == "simple-model"
+    assert decision.features.table_count == 1
+
+
+def test_multi_table_question_goes_to_complex_model_with_more_tokens():
+    simple = ROUTER.route("What is the total number of departments?", SCHEMA_INDEX)
+    complex_ = ROUTER.route(
+        "How many students are enrolled in each department per semester since 2022?",
+        SCHEMA_INDEX,
+    )
+
+    assert complex_.tier == "complex"
+    assert complex_.model_id == "complex-model"
+    assert complex_.max_tokens > simple.max_tokens
+    assert complex_.max_tokens <= ROUTER.max_tokens
+
+
+def test_summary_reports_validation_failure_rate():
+    router = ModelRouter("simple-model", "complex-model")
+    decision = router.route("List all departments", SCHEMA_INDEX)
+    router.record(decision, 0.5, True)
+    router.record(decision, 1.5, False)
+
+    assert router.summary() == {
+        "simple-model": {"requests": 2, "avg_latency_ms": 1000.0, "validation_failure_rate": 0.5}
+    }
@@ -0,0 +1,86 @@
+import sys
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "custom_resource")
+)
+from provisioning import (
+    call_with_resume_retry,
+    do_block,
+    is_resuming_error,
+    readonly_user_statements,
+)
+
+
+def client_error(code, message="error"):
+    return ClientError({"Error": {"Code": code, "Message": message}}, "ExecuteStatement")
+
+
+def test_do_block_executes_every_statement_once():
+    statements = readonly_user_statements("readonly_user", "secret", "postgres")
+    sql = do_block(statements)
+    assert sql.startswith("DO $block$") and sql.endswith("$block$")
+    assert sql.count("EXECUTE $statement$") == len(statements)
+
+
+def test_do_block_rejects_its_own_quote_tags():
+    with pytest.raises(ValueError):
+        do_block(["SELECT $block$x$block$"])
+
+
+def test_readonly_user_statements_are_idempotent():
+    statements = readonly_user_statements("readonly_user", "it's", "postgres")
+    assert "IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'readonly_user')" in statements[0]
+    assert "ALTER USER readonly_user WITH PASSWORD 'it''s'" in statements[0]
+    assert not any(s.lstrip().startswith("CREATE") for s in statements)
+
+
+def test_is_resuming_error():
+    assert is_resuming_error(client_error("DatabaseResumingException"))
+    assert is_resuming_error(client_error("BadRequestException", "The database is resuming"))
+    assert not is_resuming_error(client_error("BadRequestException", "syntax error"))
+    assert not is_resuming_error(ValueError("resuming"))
+
+
+def test_retry_until_the_cluster_resumed():
+    errors = [client_error("DatabaseResumingException")] * 3
+    delays = []
+
+    def call():
+        if errors:
+            raise errors.pop()
+        return {"numberOfRecordsUpdated": 0}
+
+    assert call_with_resume_retry(call, sleep=delays.append) == {"numberOfRecordsUpdated": 0}
+    assert len(delays) == 3
+    # Jittered exponential backoff
+    assert 0.5 <= delays[0] <= 1 and 2 <= delays[2] <= 4
+
+
+def test_retry_gives_up_before_the_timeout():
+    delays = []
+
+    def call():
+        raise client_error("DatabaseResumingException")
+
+    with pytest.raises(ClientError):
+        call_with_resume_retry(call, remaining_seconds=lambda: 10.5, sleep=delays.append)
+    assert delays == []
+
+
+def test_other_errors_are_not_retried():
+    def call():
+        raise client_error("BadRequestException", "syntax error")
+
+    with pytest.raises(ClientError):
+        call_with_resume_retry(call, sleep=pytest.fail)
+
+
+def test_statement_timeout_is_set_on_the_user():
+    statements = readonly_user_statements("readonly_user", "secret", "postgres", "30s")
+    assert "ALTER USER readonly_user SET statement_timeout = '30s'" in statements
+    with pytest.raises(ValueError):
+        readonly_user_statements("readonly_user", "secret", "postgres", "30s'; DROP")
@@ -0,0 +1,105 @@
+import sys
+import os
+from aws_cdk import App
+from aws_cdk.assertions import Match, Template
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stacks.rds_aurora_stack import RDSAuroraStack
+
+
+def synth_template(**context):
+    app = App(context={"pg_engine_version": "16.4", "min_acu": 0.5, "max_acu": 4, **context})
+    stack = RDSAuroraStack(app, "RDSAuroraStack")
+    return Template.from_stack(stack)
+
+
+def test_single_writer_by_default():
+    template = synth_template()
+
+    template.resource_count_is("AWS::RDS::DBInstance", 1)
+    assert "READERENDPOINT" not in template.find_outputs("*")
+
+
+def test_reader_instances():
+    template = synth_template(reader_instances=2)
+
+    template.resource_count_is("AWS::RDS::DBInstance", 3)
+    template.has_resource_properties(
+        "AWS::RDS::DBInstance",
+        {
+            "DBInstanceIdentifier": "serverless-db-reader-2",
+            "DBInstanceClass": "db.serverless",
+            "PromotionTier": 2,
+        },
+    )
+    template.has_output(
+        "READERENDPOINT",
+        {"Value": {"Fn::GetAtt": ["RDSCluster", "ReadEndpoint.Address"]}},
+    )
+
+
+def test_no_proxy_by_default():
+    template = synth_template()
+
+    template.resource_count_is("AWS::RDS::DBProxy", 0)
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 0)
+
+
+def test_rds_proxy():
+    template = synth_template(rds_proxy=True, reader_instances=1, proxy_max_connections_percent=80)
+
+    template.has_resource_properties(
+        "AWS::RDS::DBProxy",
+        {
+            "EngineFamily": "POSTGRESQL",
+            "RequireTLS": True,
+            "Auth": [Match.object_like({"AuthScheme": "SECRETS", "SecretArn": {"Fn::GetAtt": ["ReadOnlyUserCredentials", "Id"]}})],
+        },
+    )
+    template.has_resource_properties(
+        "AWS::RDS::DBProxyTargetGroup",
+        {
+            "DBClusterIdentifiers": [{"Ref": "RDSCluster"}],
+            "ConnectionPoolConfigurationInfo": {"MaxConnectionsPercent": 80},
+        },
+    )
+    template.has_resource_properties("AWS::RDS::DBProxyEndpoint", {"TargetRole": "READ_ONLY"})
+    # Secrets Manager, Data API, Bedrock runtime and Lambda, S3 and DynamoDB
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 6)
+    outputs = template.find_outputs("*")
+    for name in ("PROXYENDPOINT", "PROXYREADERENDPOINT", "PRIVATESUBNETIDS", "PROXYCLIENTSECURITYGROUPID"):
+        assert name in outputs
+
+
+def test_default_cluster_parameter_group():
+    template = synth_template()
+
+    template.resource_count_is("AWS::RDS::DBClusterParameterGroup", 0)
+    # "false" as passed with -c
+    template = synth_template(tuned_parameters="false")
+    template.resource_count_is("AWS::RDS::DBClusterParameterGroup", 0)
+
+
+def test_cluster_parameter_group():
+    template = synth_template(
+        tuned_parameters="true", auto_explain_min_duration_ms=500, db_cluster_parameters={"log_lock_waits": 1}
+    )
+
+    template.has_resource_properties(
+        "AWS::RDS::DBClusterParameterGroup",
+        {
+            "Family": "aurora-postgresql16",
+            "Parameters": Match.object_like(
+                {
+                    "shared_preload_libraries": "pg_stat_statements,auto_explain",
+                    "auto_explain.log_min_duration": "500",
+                    "track_io_timing": "1",
+                    "log_lock_waits": "1",
+                }
+            ),
+        },
+    )
+    template.has_resource_properties(
+        "AWS::RDS::DBCluster",
+        {"DBClusterParameterGroupName": {"Ref": "AuroraClusterParameterGroup"}},
+    )
@@ -0,0 +1,127 @@
+import sys
+import os
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group"))
+from read_routing import REPLICA_LAG_QUERY, ReaderExecutor, ResultTooLargeError, data_api_field
+
+
+class ReplicationConflict(Exception):
+    pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise ConnectionError("server closed the connection unexpectedly")
+        if self.connection.conflict and sql != REPLICA_LAG_QUERY:
+            raise ReplicationConflict("canceling statement due to conflict with recovery")
+        self.connection.queries.append(sql)
+        self.rows = [(self.connection.lag_ms,)] if sql == REPLICA_LAG_QUERY else list(self.connection.rows)
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, lag_ms=0):
+        self.lag_ms = lag_ms
+        self.broken = False
+        self.conflict = False
+        self.rows = [(1, "Alice")]
+        self.closed = False
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+def executor(connection, **kwargs):
+    return ReaderExecutor(
+        lambda: connection, connection_errors=(ConnectionError,), conflict_errors=(ReplicationConflict,), **kwargs
+    )
+
+
+def test_data_api_fields():
+    assert data_api_field(None) == {"isNull": True}
+    assert data_api_field(True) == {"booleanValue": True}
+    assert data_api_field(3) == {"longValue": 3}
+    assert data_api_field(Decimal("1.50")) == {"stringValue": "1.50"}
+    assert data_api_field(date(2024, 9, 1)) == {"stringValue": "2024-09-01"}
+
+
+def test_query_runs_on_the_reader():
+    connection = FakeConnection(lag_ms=20)
+    reader = executor(connection, lag_check_seconds=60)
+
+    assert reader.execute("SELECT 1") == {
+        "records": [[{"longValue": 1}, {"stringValue": "Alice"}]],
+        "numberOfRecordsUpdated": 0,
+    }
+    reader.execute("SELECT 2")
+    # The lag is checked once per lag_check_seconds
+    assert connection.queries == [REPLICA_LAG_QUERY, "SELECT 1", "SELECT 2"]
+
+
+def test_writer_fallback_when_the_replica_lags():
+    connection = FakeConnection(lag_ms=5000)
+    reader = executor(connection, max_lag_ms=1000)
+
+    assert reader.execute("SELECT 1") is None
+    assert "SELECT 1" not in connection.queries
+
+
+def test_writer_fallback_while_the_reader_is_unavailable():
+    connection = FakeConnection()
+    connection.broken = True
+    reader = executor(connection, retry_seconds=60)
+
+    assert reader.execute("SELECT 1") is None
+    assert connection.closed
+    connection.broken = False
+    # Not retried before retry_seconds
+    assert reader.execute("SELECT 1") is None
+    assert connection.queries == []
+
+
+def test_replication_conflicts_run_on_the_writer():
+    connection = FakeConnection()
+    connection.conflict = True
+    reader = executor(connection)
+
+    assert reader.execute("SELECT 1") is None
+    # The reader stays in use for the next queries
+    connection.conflict = False
+    assert reader.execute("SELECT 2") is not None
+    assert not connection.closed
+
+
+def test_results_are_capped_like_the_data_api():
+    connection = FakeConnection()
+    connection.rows = [(i, "x" * 100) for i in range(2000)]
+    reader = executor(connection, max_result_bytes=100_000)
+
+    with pytest.raises(ResultTooLargeError):
+        reader.execute("SELECT * FROM academics.students")
+    # Fetched in batches up to the 1 MB default
+    assert len(executor(connection).execute("SELECT 1")["records"]) == 2000
@@ -0,0 +1,79 @@
+import json
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from schema_index import SchemaIndex
+from schema_model import FOREIGN_KEY, NOT_NULL, PRIMARY_KEY, CompactSchema
+from schema_render import render_schema
+
+
+def row(table, column, data_type="integer", constraint_type=None, **extra):
+    return {
+        "table_schema": "academics",
+        "table_name": table,
+        "column_name": column,
+        "data_type": data_type,
+        "is_nullable": "NO",
+        "column_default": None,
+        "constraint_type": constraint_type,
+        **extra,
+    }
+
+
+ROWS = [
+    row("departments", "department_id", constraint_type="PRIMARY KEY", column_default="nextval('seq')"),
+    row("departments", "name", "character varying"),
+    row("courses", "course_id", constraint_type="PRIMARY KEY"),
+    row("courses", "department_id", constraint_type="FOREIGN KEY", constraint_name="courses_department_fkey"),
+    row("courses", "department_id", constraint_type="UNIQUE"),
+    {"table_schema": "academics", "table_name": "empty_view", "column_name": None},
+]
+
+
+def test_rows_collapse_into_one_table_per_relation():
+    schema = CompactSchema.from_rows(ROWS)
+
+    assert [table.key for table in schema] == [
+        "academics.departments", "academics.courses", "academics.empty_view"
+    ]
+    courses = schema.tables["academics.courses"]
+    assert list(courses.column_names()) == ["course_id", "department_id"]
+    department_id = list(courses.columns())[1]
+    assert department_id.flags & FOREIGN_KEY and department_id.flags & NOT_NULL
+    assert department_id.constraint_types == ["FOREIGN KEY", "UNIQUE"]
+    assert schema.strings[courses.foreign_keys[1]] == "courses_department_fkey"
+    # Names and types shared by tables are stored once
+    assert schema.tables["academics.departments"].names[0] == courses.names[1]
+    assert not list(schema.tables["academics.departments"].columns())[1].flags & PRIMARY_KEY
+
+
+def test_render_and_index_from_compact_model_match_rows():
+    schema = CompactSchema.from_rows(ROWS)
+
+    assert render_schema(schema) == render_schema(ROWS)
+    rendered = json.loads(render_schema(schema, include_defaults=False, tables={"academics.courses"}))
+    assert rendered == {
+        "academics.courses": [
+            "course_id integer not null PRIMARY KEY",
+            "department_id integer not null FOREIGN KEY UNIQUE",
+        ]
+    }
+    assert SchemaIndex(schema).related_tables("courses per department") == {
+        "academics.courses", "academics.departments"
+    }
+
+
+def test_compact_model_is_smaller_than_rows():
+    rows = [
+        row(f"table_{t}", f"column_{c}", "character varying")
+        for t in range(200)
+        for c in range(10)
+    ]
+    schema = CompactSchema.from_rows(rows)
+    rows_bytes = sum(
+        sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) for r in rows
+    )
+    assert schema.size_bytes() < rows_bytes / 3
@@ -0,0 +1,84 @@
+import sys
+import os
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from schema_model import CompactSchema
+from schema_watcher import SchemaWatcher
+
+
+class FakeMetadata:
+    def __init__(self):
+        self.version = 7
+        self.pruned_below = 0
+        self.changes = []
+        self.queries = []
+
+    def fetch(self, sql):
+        self.queries.append(sql)
+        if "schema_version" in sql:
+            return [{"version": self.version, "pruned_below": self.pruned_below}]
+        since = int(sql.split("version > ")[1].split(" ")[0])
+        return [{"relation": r} for v, r in self.changes if v > since]
+
+
+def test_changed_relations_since_last_check():
+    metadata = FakeMetadata()
+    watcher = SchemaWatcher(metadata.fetch, check_seconds=0)
+    watcher.start()
+
+    assert watcher.check() is None
+
+    metadata.version = 9
+    metadata.changes = [(8, "academics.courses"), (9, "research.grants")]
+    change = watcher.check()
+    assert not change.full
+    assert change.relations == {"academics.courses", "research.grants"}
+    assert watcher.check() is None
+
+
+def test_full_reload_when_the_change_log_was_pruned():
+    metadata = FakeMetadata()
+    watcher = SchemaWatcher(metadata.fetch, check_seconds=0)
+    watcher.start()
+
+    metadata.version = 2000
+    metadata.pruned_below = 1000
+    assert watcher.check().full
+
+
+def test_version_is_read_at_most_every_check_seconds():
+    metadata = FakeMetadata()
+    watcher = SchemaWatcher(metadata.fetch, check_seconds=60)
+    watcher.start()
+    metadata.version = 8
+
+    assert watcher.check() is None
+    assert len(metadata.queries) == 1
+
+
+def test_watcher_is_disabled_without_triggers():
+    def fetch(sql):
+        raise Exception('relation "agent_meta.schema_version" does not exist')
+
+    watcher = SchemaWatcher(fetch, check_seconds=0)
+    watcher.start()
+
+    assert not watcher.enabled
+    assert watcher.check() is None
+
+
+def test_merge_replaces_changed_relations():
+    def row(table, column):
+        return {"table_schema": "academics", "table_name": table, "column_name": column}
+
+    schema = [row("courses", "course_id"), row("courses", "title"), row("students", "student_id")]
+    changed = [row("courses", "course_id"), row("courses", "title"), row("courses", "level")]
+
+    merged = CompactSchema.from_rows(schema).replace(
+        {"academics.courses", "academics.enrollments"}, changed
+    )
+    assert [name for table in merged for name in table.column_names()] == [
+        "course_id", "title", "level", "student_id"
+    ]
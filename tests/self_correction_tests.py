@@ -0,0 +1,132 @@
+import sys
+import os
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from self_correction import SelfCorrector, normalize_sql, referenced_tables
+
+KNOWN_TABLES = ["academics.departments", "academics.courses", "staff.employees"]
+MESSAGES = [{"role": "user", "content": [{"type": "text", "text": "question"}]}]
+
+
+def explain_rejecting(*bad_columns):
+    explained = []
+
+    def explain(sql):
+        explained.append(sql)
+        for column in bad_columns:
+            if column in sql:
+                raise Exception(f'ERROR: column "{column}" does not exist')
+
+    return explain, explained
+
+
+def test_referenced_tables():
+    sql = (
+        "SELECT d.name, COUNT(*) FROM academics.departments d "
+        "JOIN courses c ON c.department_id = d.department_id GROUP BY d.name"
+    )
+    assert referenced_tables(sql, KNOWN_TABLES) == {"academics.departments", "academics.courses"}
+
+
+def test_valid_sql_is_not_regenerated():
+    explain, explained = explain_rejecting()
+    corrector = SelfCorrector(explain, max_attempts=2)
+
+    sql, attempts, valid = corrector.run(
+        "SELECT name FROM academics.departments;", MESSAGES, lambda m: "unused", lambda s: "{}"
+    )
+
+    assert (sql, attempts, valid) == ("SELECT name FROM academics.departments;", 0, True)
+    assert explained == ["EXPLAIN SELECT name FROM academics.departments"]
+
+
+def test_error_is_fed_back_to_the_model():
+    explain, _ = explain_rejecting("dept_name")
+    corrector = SelfCorrector(explain, max_attempts=2)
+    prompts = []
+
+    def regenerate(messages):
+        prompts.append(messages)
+        return "SELECT name FROM academics.departments"
+
+    sql, attempts, valid = corrector.run(
+        "SELECT dept_name FROM academics.departments",
+        MESSAGES,
+        regenerate,
+        lambda s: '{"academics.departments":["name character varying"]}',
+    )
+
+    assert (sql, attempts, valid) == ("SELECT name FROM academics.departments", 1, True)
+    assert [m["role"] for m in prompts[0]] == ["user", "assistant", "user"]
+    correction = prompts[0][-1]["content"][0]["text"]
+    assert 'column "dept_name" does not exist' in correction
+    assert "name character varying" in correction
+
+
+def test_attempts_are_bounded():
+    explain, _ = explain_rejecting("bad")
+    corrector = SelfCorrector(explain, max_attempts=2)
+
+    sql, attempts, valid = corrector.run("SELECT bad FROM x", MESSAGES, lambda m: "SELECT bad FROM y", lambda s: "{}")
+
+    assert attempts == 2
+    assert not valid
+
+
+def test_no_attempt_past_the_deadline():
+    explain, _ = explain_rejecting("bad")
+    corrector = SelfCorrector(explain, max_attempts=2)
+
+    _, attempts, valid = corrector.run(
+        "SELECT bad FROM x",
+        MESSAGES,
+        lambda m: "SELECT 1",
+        lambda s: "{}",
+        deadline=time.time() + 1,
+        generation_seconds=5,
+    )
+
+    assert attempts == 0
+    assert not valid
+
+
+def test_multiple_statements_are_rejected_without_explain():
+    explain, explained = explain_rejecting()
+    corrector = SelfCorrector(explain)
+
+    assert corrector.check("SELECT 1; SELECT 2") is not None
+    assert explained == []
+
+
+def test_explain_analyze_is_never_sent():
+    explain, explained = explain_rejecting()
+    corrector = SelfCorrector(explain)
+
+    for sql in ("ANALYZE SELECT 1", "(ANALYZE) SELECT pg_sleep(600)", "analyze verbose select 1"):
+        assert corrector.check(sql) is not None
+    assert explained == []
+
+
+def test_validation_runs_before_explain():
+    explain, explained = explain_rejecting()
+
+    def validate(sql):
+        if "delete" in sql.lower():
+            raise ValueError("Unauthorized SQL operation detected: delete")
+        return True
+
+    corrector = SelfCorrector(explain, validate=validate)
+
+    assert "delete" in corrector.check("WITH d AS (DELETE FROM staff.salaries RETURNING *) SELECT * FROM d")
+    assert corrector.check("```sql\nSELECT 1\n```") is None
+    assert explained == ["EXPLAIN SELECT 1"]
+
+
+def test_normalize_sql():
+    expected = "SELECT COUNT(*) FROM academics.students"
+    assert normalize_sql(f"  {expected}\n") == expected
+    assert normalize_sql(f"```sql\n{expected}\n```") == expected
+    assert normalize_sql(f"-- Count the students\n/* all of them */ {expected}") == expected
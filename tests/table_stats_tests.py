@@ -0,0 +1,97 @@
+import sys
+import os
+import json
+
+import pytest
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from background_refresh import BackgroundRefresher
+from schema_render import render_schema
+from table_stats import TableStatistics, TableStats, render_table_stats
+
+
+class FakeCatalog:
+    def __init__(self):
+        self.queries = []
+        self.enrollment_indexes = "11"
+        self.enrollment_rows = 1_250_000
+
+    def fetch(self, sql):
+        self.queries.append(sql)
+        if "FROM pg_class c" in sql:
+            return [
+                {"table_oid": 1, "table_schema": "academics", "table_name": "departments",
+                 "row_estimate": 10, "index_signature": "10"},
+                {"table_oid": 2, "table_schema": "academics", "table_name": "enrollments",
+                 "row_estimate": self.enrollment_rows, "index_signature": self.enrollment_indexes},
+                {"table_oid": 3, "table_schema": "research", "table_name": "project_members",
+                 "row_estimate": -1, "index_signature": "12"},
+            ]
+        rows = [
+            {"table_oid": 1, "is_primary": True, "is_unique": True, "method": "btree",
+             "index_columns": json.dumps(["department_id"])},
+            {"table_oid": 2, "is_primary": True, "is_unique": True, "method": "btree",
+             "index_columns": json.dumps(["enrollment_id"])},
+            {"table_oid": 3, "is_primary": True, "is_unique": True, "method": "btree",
+             "index_columns": json.dumps(["project_id", "employee_id"])},
+        ]
+        if "," in self.enrollment_indexes:
+            rows.append({"table_oid": 2, "is_primary": False, "is_unique": False, "method": "btree",
+                         "index_columns": json.dumps(["student_id", "year"])})
+        table_oids = sql.split("IN (")[1].split(")")[0].split(",")
+        return [row for row in rows if str(row["table_oid"]) in table_oids]
+
+
+def test_notes_show_rows_primary_key_and_indexes():
+    catalog = FakeCatalog()
+    statistics = TableStatistics(catalog.fetch)
+    statistics.refresh()
+
+    assert statistics.rendered == {
+        "academics.departments": "-- ~10 rows; pk (department_id)",
+        "academics.enrollments": "-- ~1.2M rows; pk (enrollment_id)",
+        "research.project_members": "-- pk (project_id, employee_id)",
+    }
+
+
+def test_refresh_reloads_indexes_of_changed_tables_only():
+    catalog = FakeCatalog()
+    statistics = TableStatistics(catalog.fetch)
+    statistics.refresh()
+
+    catalog.queries.clear()
+    catalog.enrollment_rows = 2_000_000
+    statistics.refresh()
+    assert len(catalog.queries) == 1
+    assert statistics.rendered["academics.enrollments"] == "-- ~2.0M rows; pk (enrollment_id)"
+
+    catalog.queries.clear()
+    catalog.enrollment_indexes = "11,13"
+    statistics.refresh()
+    assert len(catalog.queries) == 2
+    assert "IN (2)" in catalog.queries[1]
+    assert statistics.rendered["academics.enrollments"] == (
+        "-- ~2.0M rows; pk (enrollment_id); indexed (student_id, year)"
+    )
+    assert statistics.rendered["academics.departments"] == "-- ~10 rows; pk (department_id)"
+
+
+def test_no_note_without_statistics():
+    # Never analyzed and without any index
+    assert render_table_stats(TableStats(-1)) is None
+    assert render_table_stats(TableStats(0)) == "-- ~0 rows"
+
+
+def test_notes_are_the_first_entry_of_their_table():
+    rows = [{"table_schema": "academics", "table_name": "departments", "column_name": "name",
+             "data_type": "character varying"}]
+
+    rendered = json.loads(render_schema(rows, table_notes={"academics.departments": "-- ~10 rows"}))
+    assert rendered == {"academics.departments": ["-- ~10 rows", "name character varying"]}
+
+
+def test_refreshers_must_implement_refresh():
+    with pytest.raises(TypeError):
+        BackgroundRefresher(60)
@@ -0,0 +1,75 @@
+import sys
+import os
+import json
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group")
+)
+from schema_index import SchemaIndex
+from schema_render import render_schema
+from token_budget import TokenEstimator, fit_prompt
+
+SCHEMA = [
+    {
+        "table_schema": "academics",
+        "table_name": "departments",
+        "column_name": "department_id",
+        "data_type": "integer",
+        "is_nullable": "NO",
+        "column_default": "nextval('academics.departments_department_id_seq'::regclass)",
+        "constraint_type": "PRIMARY KEY",
+    },
+    {
+        "table_schema": "academics",
+        "table_name": "departments",
+        "column_name": "name",
+        "data_type": "character varying",
+        "is_nullable": "NO",
+        "column_default": None,
+        "constraint_type": None,
+    },
+    {
+        "table_schema": "staff",
+        "table_name": "employees",
+        "column_name": "position",
+        "data_type": "character varying",
+        "is_nullable": "YES",
+        "column_default": None,
+        "constraint_type": None,
+    },
+]
+
+
+def test_render_schema_levels():
+    full = json.loads(render_schema(SCHEMA))
+    assert full["academics.departments"][0] == (
+        "department_id integer not null "
+        "default nextval('academics.departments_department_id_seq'::regclass) PRIMARY KEY"
+    )
+
+    trimmed = json.loads(
+        render_schema(SCHEMA, include_defaults=False, include_nullability=False, tables={"staff.employees"})
+    )
+    assert trimmed == {"staff.employees": ["position character varying"]}
+
+
+def test_estimator_calibrates_towards_observed_ratio():
+    estimator = TokenEstimator(chars_per_token=3.5)
+    estimator.calibrate("x" * 400, 100)
+    assert estimator.chars_per_token == 4.0
+    assert estimator.estimate("x" * 400) == 101
+
+
+def test_fit_prompt_trims_until_budget_is_met():
+    estimator = TokenEstimator(chars_per_token=1)
+    question = "How many departments are there?"
+    index = SchemaIndex(SCHEMA)
+
+    prompt, level, estimated = fit_prompt(SCHEMA, question, lambda text: text, estimator, None, index)
+    assert level == "full"
+
+    related_size = len(render_schema(SCHEMA, False, False, {"academics.departments"}))
+    prompt, level, estimated = fit_prompt(SCHEMA, question, lambda text: text, estimator, related_size + 1, index)
+    assert level == "related_tables"
+    assert "staff.employees" not in prompt
+    assert estimated <= related_size + 1
@@ -0,0 +1,33 @@
+import json
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda", "action_group"))
+import warmer
+
+
+class FakeLambda:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.payloads = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.payloads.append(json.loads(Payload))
+        if len(self.payloads) <= self.fail:
+            return {"StatusCode": 200, "FunctionError": "Unhandled"}
+        return {"StatusCode": 200}
+
+
+def test_is_warmup_event():
+    assert warmer.is_warmup_event({"warmup": True, "concurrency": 2})
+    assert not warmer.is_warmup_event({"apiPath": "/generate"})
+
+
+def test_fan_out_invokes_single_warmups(monkeypatch):
+    client = FakeLambda(fail=1)
+    monkeypatch.setattr(warmer, "lambda_client", client)
+
+    assert warmer.fan_out("arn:aws:lambda:eu-west-1:123456789012:function:f", 3, hold_ms=50) == 2
+    # Fanned out invocations do not fan out again
+    assert client.payloads == [{"warmup": True, "concurrency": 1, "holdMs": 50}] * 3
+    assert warmer.fan_out("arn:aws:lambda:eu-west-1:123456789012:function:f", 0) == 0